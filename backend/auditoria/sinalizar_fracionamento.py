@@ -11,6 +11,7 @@ Versão corrigida:
 """
 
 import os
+import sys
 import time
 import argparse
 import pandas as pd
@@ -21,6 +22,11 @@ from tqdm import tqdm
 from datetime import datetime
 from joblib import Parallel, delayed
 
+# permite importar o pacote routes/ do backend
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from routes.versao_dados import incrementar_versao
+from routes.resumo_fracionamento import atualizar_resumo_fracionamento
+
 # ==============================
 # Parser de argumentos
 # ==============================
@@ -219,18 +225,29 @@ print(f"[INFO] Linhas exportadas no Parquet: {len(df_suspeitas)}")
 # ==============================
 # Salva também no banco
 # ==============================
-if not df_suspeitas.empty:
-    print("[INFO] Gravando clusters no banco de dados...")
-    df_suspeitas.to_sql(
-        "clusters_fracionamento",
-        engine,
-        if_exists="append",
-        index=False,
-        method="multi",
-        chunksize=5000
-    )
-    print(f"[INFO] {len(df_suspeitas)} linhas inseridas na tabela clusters_fracionamento")
-else:
-    print("[INFO] Nenhum cluster encontrado, nada a gravar no banco.")
+# reprocessar um ano substitui os clusters anteriores (cluster_id recomeça em 1).
+# DELETE, INSERT, resumo e versão numa única transação: uma falha no meio não
+# deixa o ano sem clusters nem com resumo velho; sem achados, o ano fica vazio.
+print("[INFO] Gravando clusters no banco de dados...")
+with engine.begin() as conn:
+    existe = conn.execute(text("SELECT to_regclass('clusters_fracionamento')")).scalar()
+    if existe is not None:
+        conn.execute(text("DELETE FROM clusters_fracionamento WHERE ano = :ano"), {"ano": int(args.ano)})
+    if not df_suspeitas.empty:
+        df_suspeitas.to_sql(
+            "clusters_fracionamento",
+            con=conn,
+            if_exists="append",
+            index=False,
+            method="multi",
+            chunksize=5000
+        )
+        print(f"[INFO] {len(df_suspeitas)} linhas inseridas na tabela clusters_fracionamento")
+    else:
+        print("[INFO] Nenhum cluster encontrado; clusters anteriores do ano removidos.")
+    if existe is not None or not df_suspeitas.empty:
+        atualizar_resumo_fracionamento(conn, int(args.ano))
+        incrementar_versao(conn, "sinalizar_fracionamento")
+        print("[INFO] Resumo por cluster atualizado (resumo_clusters_fracionamento)")
 
 print(f"[INFO] Tempo total de execução: {time.time() - start_time:.2f} segundos")
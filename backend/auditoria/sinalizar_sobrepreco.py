@@ -18,35 +18,39 @@ python auditoria/sinalizar_sobrepreco.py \
 
 import argparse
 import os
-from dotenv import load_dotenv
+import sys
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from scipy.stats import percentileofscore
 import numpy as np
 
+# permite importar o pacote routes/ do backend
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 # ======================================================
-# 1. Conexão com banco
+# 1. Conexão com banco (engine compartilhado, com adaptador pgvector)
 # ======================================================
-load_dotenv()
-DB_USER = os.getenv("POSTGRES_USER")
-DB_PASS = os.getenv("POSTGRES_PASSWORD")
-DB_HOST = os.getenv("POSTGRES_HOST")
-DB_PORT = os.getenv("POSTGRES_PORT")
-DB_NAME = os.getenv("POSTGRES_DB")
-engine = create_engine(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+from routes.db import engine
+from routes.pgvector_adapter import (
+    vetor_param, para_numpy, normalizar_vetores, ordem_vetorial, distancia_vetorial,
+)
+from routes.busca_texto import filtro_texto, MODOS
 
 # ======================================================
 # 2. Função principal
 # ======================================================
 def comparar_grupo(ano, descricao=None, elem=None, ente=None,
-                   max_dist=0.3, limite=500, minimo_grupo=10):
+                   max_dist=0.3, limite=500, minimo_grupo=10, modo_texto=None):
     # --- Buscar grupo de interesse
-    conds = ["e.ano = :ano"]
+    # emb.ano: poda para a partição do ano em empenho_embeddings
+    conds = ["emb.ano = :ano"]
     params = {"ano": ano}
 
     if descricao:
-        conds.append("e.historico ILIKE :descricao")
-        params["descricao"] = f"%{descricao}%"
+        # filtro textual indexado (GIN trigramas ou full-text), ver routes/busca_texto.py
+        cond_texto, params_texto = filtro_texto(descricao, modo_texto, param="descricao")
+        conds.append(cond_texto)
+        params.update(params_texto)
     if elem:
         conds.append("e.elemdespesatce = :elem")
         params["elem"] = elem
@@ -56,7 +60,7 @@ def comparar_grupo(ano, descricao=None, elem=None, ente=None,
 
     query_grupo = text(f"""
         SELECT e.idempenho, e.ano, e.ente, e.historico, e.vlr_empenhado,
-               e.elemdespesatce, emb.embedding_array
+               e.elemdespesatce, emb.embedding
         FROM empenhos e
         JOIN empenho_embeddings emb USING (idempenho)
         WHERE {" AND ".join(conds)}
@@ -68,37 +72,44 @@ def comparar_grupo(ano, descricao=None, elem=None, ente=None,
         return None, None, None
 
     # --- Criar embedding médio do grupo como "pivot"
-    embeddings = np.vstack([np.array(vec, dtype=np.float32) for vec in grupo["embedding_array"]])
-    embedding_pivot = embeddings.mean(axis=0)
-
-    # Converter embedding médio em string no formato pgvector
-    embedding_str = "[" + ",".join(str(x) for x in embedding_pivot.tolist()) + "]"
+    embeddings = np.vstack([para_numpy(vec) for vec in grupo["embedding"]])
+    # média de vetores unitários não é unitária: renormaliza para o produto interno
+    embedding_pivot = normalizar_vetores(embeddings.mean(axis=0))
+    # mesma coluna embedding_array de antes no CSV do grupo
+    grupo["embedding_array"] = [e.tolist() for e in embeddings]
+    grupo = grupo.drop(columns="embedding")
 
     # --- Buscar vizinhos no estado (exceto mesmo ente, se ente foi passado)
-    cond_ente = "AND e.ente <> :ente" if ente else ""
+    # ano/ente gravados com o vetor: busca só na partição do ano
+    cond_ente = "AND emb.ente <> :ente" if ente else ""
     query_vizinhos = text(f"""
         SELECT e.idempenho, e.ente, e.historico, e.vlr_empenhado,
                e.elemdespesatce,
-               emb.embedding <=> :embedding_pivot AS distancia
-        FROM empenhos e
-        JOIN empenho_embeddings emb USING (idempenho)
-        WHERE e.ano = :ano
+               {distancia_vetorial("emb.embedding", ":embedding_pivot")} AS distancia
+        FROM empenho_embeddings emb
+        JOIN empenhos e USING (idempenho)
+        WHERE emb.ano = :ano
           {cond_ente}
-          AND (emb.embedding <=> :embedding_pivot) <= :max_dist
-        ORDER BY distancia
+          AND {ordem_vetorial("emb.embedding", ":embedding_pivot")} <= :max_ip
+        ORDER BY {ordem_vetorial("emb.embedding", ":embedding_pivot")}
         LIMIT :limite;
     """)
 
     params_viz = {
         "ano": ano,
-        "embedding_pivot": embedding_str,
-        "max_dist": max_dist,
+        "embedding_pivot": vetor_param(embedding_pivot),
+        # distância cosseno = 1 + (a <#> b) para vetores normalizados
+        "max_ip": max_dist - 1,
         "limite": limite
     }
     if ente:
         params_viz["ente"] = ente
 
-    df = pd.read_sql(query_vizinhos, engine, params=params_viz)
+    with engine.begin() as conn:
+        # índice HNSW devolve no máximo ef_search linhas: acompanha o limite pedido.
+        # SET LOCAL vale só nesta transação e não vaza para a conexão do pool
+        conn.execute(text(f"SET LOCAL hnsw.ef_search = {min(max(int(limite), 40), 1000)}"))
+        df = pd.read_sql(query_vizinhos, conn, params=params_viz)
 
     if len(df) < minimo_grupo:
         print(f"Grupo de comparação insuficiente ({len(df)} vizinhos encontrados).")
@@ -159,6 +170,8 @@ if __name__ == "__main__":
     parser.add_argument("--max_dist", type=float, default=0.3)
     parser.add_argument("--limite", type=int, default=500)
     parser.add_argument("--saida", type=str, help="Prefixo para salvar resultados em CSV")
+    parser.add_argument("--modo_texto", choices=MODOS,
+                        help="Busca da descrição: trgm (substring, padrão) ou fts (full-text em português)")
     args = parser.parse_args()
 
     resultado, vizinhos, grupo_individual = comparar_grupo(
@@ -167,7 +180,8 @@ if __name__ == "__main__":
         elem=args.elemdespesatce,
         ente=args.ente,
         max_dist=args.max_dist,
-        limite=args.limite
+        limite=args.limite,
+        modo_texto=args.modo_texto
     )
 
     if resultado:
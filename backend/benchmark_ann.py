@@ -0,0 +1,248 @@
+"""
+Benchmark dos índices ANN do pgvector (ivfflat x HNSW) para a busca semântica.
+
+Para cada tipo de índice e combinação de parâmetros (lists/probes no ivfflat,
+m/ef_construction/ef_search no HNSW) mede:
+  - recall@k em relação à busca exata (força bruta em numpy, distância cosseno)
+  - latência p50/p99 por consulta no PostgreSQL
+  - tempo de construção e tamanho do índice
+
+Ao final recomenda a configuração mais rápida (p99) que atinge o recall alvo
+e imprime o trecho correspondente de config.yaml (busca_vetorial) e o
+CREATE INDEX para empenho_embeddings.
+
+A tabela de teste usa o mesmo armazenamento da base (armazenamento_embeddings:
+halfvec ou vector, vetores normalizados) e as consultas o mesmo operador das
+rotas (<#>, produto interno, índice *_ip_ops).
+
+Os testes rodam numa tabela temporária (ann_benchmark), com uma amostra de
+empenho_embeddings ou com dados sintéticos (mistura de gaussianas normalizadas).
+
+Uso:
+python benchmark_ann.py --fonte banco --amostra 200000 --consultas 200 --k 10
+python benchmark_ann.py --fonte sintetico --amostra 100000 --dim 384
+python benchmark_ann.py --tipos hnsw --m 16 32 --ef_search 40 64 100 200 --saida data/benchmark_ann.json
+"""
+
+import argparse
+import json
+import math
+import time
+import numpy as np
+from sqlalchemy import text
+
+from routes.db import engine
+from pgvector import HalfVector
+from routes.pgvector_adapter import para_numpy, TIPO_VETOR
+
+TABELA = "ann_benchmark"
+OPERADORES = f"{TIPO_VETOR}_ip_ops"
+
+# ==============================
+# Parser de argumentos
+# ==============================
+parser = argparse.ArgumentParser(description="Benchmark ivfflat x HNSW (recall@k, p50/p99)")
+parser.add_argument("--fonte", choices=["banco", "sintetico"], default="banco",
+                    help="Amostra de empenho_embeddings ou dados sintéticos")
+parser.add_argument("--amostra", type=int, default=100000, help="Nº de vetores indexados")
+parser.add_argument("--dim", type=int, default=384, help="Dimensão (apenas dados sintéticos)")
+parser.add_argument("--consultas", type=int, default=200, help="Nº de consultas (fora dos indexados)")
+parser.add_argument("--k", type=int, default=10, help="Vizinhos por consulta (recall@k)")
+parser.add_argument("--recall_alvo", type=float, default=0.95)
+parser.add_argument("--tipos", nargs="+", choices=["ivfflat", "hnsw"], default=["ivfflat", "hnsw"])
+parser.add_argument("--lists", type=int, nargs="+", default=None,
+                    help="Valores de lists (default: regra do pgvector e vizinhos)")
+parser.add_argument("--probes", type=int, nargs="+", default=None,
+                    help="Valores de ivfflat.probes (default: 1..√lists)")
+parser.add_argument("--m", type=int, nargs="+", default=[16])
+parser.add_argument("--ef_construction", type=int, default=64)
+parser.add_argument("--ef_search", type=int, nargs="+", default=[20, 40, 64, 100, 200, 400])
+parser.add_argument("--maintenance_work_mem", default="1GB", help="Memória para construir os índices")
+parser.add_argument("--saida", type=str, default=None, help="Arquivo JSON com todos os resultados")
+parser.add_argument("--manter_tabela", action="store_true", help="Não apaga ann_benchmark ao final")
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+rng = np.random.default_rng(args.seed)
+
+
+# ==============================
+# Dados
+# ==============================
+def dados_sinteticos(n, dim):
+    # embeddings de texto formam aglomerados: mistura de gaussianas normalizada
+    n_centros = max(16, int(math.sqrt(n) / 2))
+    centros = rng.standard_normal((n_centros, dim)).astype(np.float32)
+    rotulos = rng.integers(0, n_centros, n)
+    x = centros[rotulos] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def dados_banco(n):
+    with engine.connect() as conn:
+        linhas = conn.execute(
+            text("SELECT embedding FROM empenho_embeddings ORDER BY random() LIMIT :n"), {"n": n}
+        ).fetchall()
+    if not linhas:
+        raise SystemExit("[ERRO] empenho_embeddings está vazia; use --fonte sintetico")
+    return np.vstack([para_numpy(l[0]) for l in linhas]).astype(np.float32)
+
+
+total = args.amostra + args.consultas
+print(f"[INFO] Carregando {total} vetores ({args.fonte})...")
+vetores = dados_banco(total) if args.fonte == "banco" else dados_sinteticos(total, args.dim)
+rng.shuffle(vetores)
+# mesmo armazenamento da base: norma 1 (cosseno = produto interno)
+vetores /= np.maximum(np.linalg.norm(vetores, axis=1, keepdims=True), 1e-12)
+consultas, base = vetores[:args.consultas], vetores[args.consultas:]
+n, dim = base.shape
+print(f"[INFO] {n} vetores indexados, {len(consultas)} consultas, dim {dim}")
+
+
+# ==============================
+# Verdade de referência (busca exata)
+# ==============================
+def normalizar(x):
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+inicio = time.time()
+base_n, consultas_n = normalizar(base), normalizar(consultas)
+verdade = []
+for i in range(0, len(consultas_n), 64):
+    sims = consultas_n[i:i + 64] @ base_n.T
+    top = np.argpartition(-sims, args.k, axis=1)[:, :args.k]
+    verdade.extend(set(t.tolist()) for t in top)
+print(f"[INFO] Vizinhos exatos calculados em {time.time() - inicio:.1f}s")
+
+
+# ==============================
+# Tabela de teste
+# ==============================
+raw = engine.raw_connection()
+pg = raw.driver_connection
+pg.autocommit = True
+
+with pg.cursor() as cur:
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    cur.execute(f"DROP TABLE IF EXISTS {TABELA}")
+    cur.execute(f"CREATE TABLE {TABELA} (id BIGINT PRIMARY KEY, embedding {TIPO_VETOR}({dim}))")
+    inicio = time.time()
+    with cur.copy(f"COPY {TABELA} (id, embedding) FROM STDIN WITH (FORMAT BINARY)") as copy:
+        copy.set_types(["int8", TIPO_VETOR])
+        for i, v in enumerate(base):
+            copy.write_row((i, HalfVector(v) if TIPO_VETOR == "halfvec" else v))
+    cur.execute(f"ANALYZE {TABELA}")
+    cur.execute(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'")
+print(f"[INFO] Tabela {TABELA} carregada em {time.time() - inicio:.1f}s")
+
+CONSULTA = f"SELECT id FROM {TABELA} ORDER BY embedding <#> CAST(%s AS {TIPO_VETOR}) LIMIT %s"
+
+
+def criar_indice(tipo, opcoes):
+    with pg.cursor() as cur:
+        cur.execute(f"DROP INDEX IF EXISTS idx_{TABELA}")
+        inicio = time.time()
+        cur.execute(
+            f"CREATE INDEX idx_{TABELA} ON {TABELA} USING {tipo} (embedding {OPERADORES}) "
+            f"WITH ({', '.join(f'{k} = {v}' for k, v in opcoes.items())})"
+        )
+        construcao = time.time() - inicio
+        cur.execute(f"SELECT pg_relation_size('idx_{TABELA}')")
+        tamanho = cur.fetchone()[0] / 1e6
+    return construcao, tamanho
+
+
+def medir(ajuste):
+    """Roda todas as consultas com `SET <ajuste>`; retorna recall@k, p50 e p99 (ms)."""
+    with pg.cursor() as cur:
+        cur.execute(f"SET {ajuste}")
+        cur.execute("EXPLAIN " + CONSULTA, (consultas[0], args.k))
+        usa_indice = any(f"idx_{TABELA}" in linha[0] for linha in cur.fetchall())
+        for q in consultas[:5]:  # aquecimento (cache de páginas)
+            cur.execute(CONSULTA, (q, args.k))
+            cur.fetchall()
+
+        latencias, acertos = [], 0
+        for q, esperado in zip(consultas, verdade):
+            inicio = time.perf_counter()
+            cur.execute(CONSULTA, (q, args.k))
+            ids = [r[0] for r in cur.fetchall()]
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            acertos += len(esperado.intersection(ids))
+    return {
+        "recall": acertos / (len(consultas) * args.k),
+        "p50_ms": float(np.percentile(latencias, 50)),
+        "p99_ms": float(np.percentile(latencias, 99)),
+        "usa_indice": usa_indice,
+    }
+
+
+# ==============================
+# Benchmark
+# ==============================
+resultados = []
+
+if "ivfflat" in args.tipos:
+    # regra do pgvector: lists = linhas/1000 até 1M linhas, √linhas acima disso
+    sugerido = max(1, n // 1000) if n <= 1_000_000 else int(math.sqrt(n))
+    for lists in args.lists or sorted({max(1, sugerido // 2), sugerido, sugerido * 2}):
+        construcao, tamanho = criar_indice("ivfflat", {"lists": lists})
+        probes = args.probes or sorted({1, 5, 10, 20, 40, int(math.sqrt(lists))})
+        for p in [p for p in probes if p <= lists]:
+            r = medir(f"ivfflat.probes = {p}")
+            resultados.append({"tipo": "ivfflat", "lists": lists, "probes": p,
+                               "construcao_s": construcao, "tamanho_mb": tamanho, **r})
+            print(f"ivfflat lists={lists:<5} probes={p:<4} recall={r['recall']:.3f} "
+                  f"p50={r['p50_ms']:.2f}ms p99={r['p99_ms']:.2f}ms")
+
+if "hnsw" in args.tipos:
+    for m in args.m:
+        construcao, tamanho = criar_indice("hnsw", {"m": m, "ef_construction": args.ef_construction})
+        for ef in [ef for ef in args.ef_search if ef >= args.k]:
+            r = medir(f"hnsw.ef_search = {ef}")
+            resultados.append({"tipo": "hnsw", "m": m, "ef_construction": args.ef_construction,
+                               "ef_search": ef, "construcao_s": construcao, "tamanho_mb": tamanho, **r})
+            print(f"hnsw    m={m:<3} ef_search={ef:<4} recall={r['recall']:.3f} "
+                  f"p50={r['p50_ms']:.2f}ms p99={r['p99_ms']:.2f}ms")
+
+if not args.manter_tabela:
+    with pg.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {TABELA}")
+raw.close()
+
+# ==============================
+# Recomendação
+# ==============================
+aptos = [r for r in resultados if r["recall"] >= args.recall_alvo and r["usa_indice"]]
+if not aptos:
+    melhor = max(resultados, key=lambda r: r["recall"])
+    print(f"\n[AVISO] Nenhuma configuração atingiu recall {args.recall_alvo}; "
+          f"maior recall: {melhor['recall']:.3f}")
+else:
+    melhor = min(aptos, key=lambda r: (r["p99_ms"], r["p50_ms"]))
+    print(f"\nRecomendado (recall ≥ {args.recall_alvo}, menor p99):")
+
+if melhor["tipo"] == "ivfflat":
+    # lists escala com o tamanho real da tabela, não com a amostra
+    print(f"  {melhor['tipo']} lists={melhor['lists']} probes={melhor['probes']} "
+          f"recall={melhor['recall']:.3f} p50={melhor['p50_ms']:.2f}ms p99={melhor['p99_ms']:.2f}ms")
+    print("\nCREATE INDEX (ajuste lists proporcionalmente ao total de linhas de empenho_embeddings):")
+    print("  CREATE INDEX idx_empenho_embeddings_cosine ON empenho_embeddings\n"
+          f"  USING ivfflat (embedding {OPERADORES}) WITH (lists = {melhor['lists']});")
+    print(f"\nconfig.yaml:\nbusca_vetorial:\n  ivfflat_probes: {melhor['probes']}")
+else:
+    print(f"  {melhor['tipo']} m={melhor['m']} ef_construction={melhor['ef_construction']} "
+          f"ef_search={melhor['ef_search']} recall={melhor['recall']:.3f} "
+          f"p50={melhor['p50_ms']:.2f}ms p99={melhor['p99_ms']:.2f}ms")
+    print("\nCREATE INDEX:")
+    print("  CREATE INDEX idx_empenho_embeddings_cosine ON empenho_embeddings\n"
+          f"  USING hnsw (embedding {OPERADORES}) WITH (m = {melhor['m']}, "
+          f"ef_construction = {melhor['ef_construction']});")
+    print(f"\nconfig.yaml:\nbusca_vetorial:\n  hnsw_ef_search: {melhor['ef_search']}")
+
+if args.saida:
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({"parametros": vars(args), "n": n, "dim": dim,
+                   "resultados": resultados, "recomendado": melhor}, f, indent=2, ensure_ascii=False)
+    print(f"\n[INFO] Resultados salvos em {args.saida}")
@@ -0,0 +1,109 @@
+"""
+Constrói (ou atualiza) o índice ANN local usado pela API quando
+busca_vetorial.backend = 'local' (routes/indice_local.py).
+
+Um grafo HNSW (hnswlib, distância cosseno) por ano, lido de empenho_embeddings
+partição a partição, salvo em disco junto do mapa rótulo → idempenho e da
+marca d'água (max criado_em). A API carrega os arquivos na inicialização e
+adiciona em memória as linhas mais novas que a marca (relendo uma janela antes
+dela e descartando o que já está no índice).
+
+As linhas de cada ano são lidas em ordem de idempenho (COLLATE "C", a mesma
+ordem de np.searchsorted): o mapa rótulo → idempenho sai ordenado e a
+checagem de duplicatas da atualização é uma busca binária.
+
+Uso:
+python construir_indice_local.py
+python construir_indice_local.py --anos 2023 2024 --m 32 --ef_construction 128
+python construir_indice_local.py --incremental   # só as linhas novas desde a última construção
+"""
+
+import argparse
+import time
+import numpy as np
+from sqlalchemy import text
+
+from routes.config import config
+from routes.db import engine
+from routes.indice_local import IndiceLocal, novo_indice, IndiceAno
+from routes.pgvector_adapter import para_numpy
+
+_indice_config = config.get("busca_vetorial", {})
+
+# ==============================
+# Parser de argumentos
+# ==============================
+parser = argparse.ArgumentParser(description="Constrói o índice hnswlib local por ano")
+parser.add_argument("--diretorio", default=_indice_config.get("indice_local_dir", "data/indice_ann"))
+parser.add_argument("--anos", type=int, nargs="+", default=None, help="Anos a (re)construir (default: todos)")
+parser.add_argument("--m", type=int, default=16)
+parser.add_argument("--ef_construction", type=int, default=64)
+parser.add_argument("--threads", type=int, default=-1, help="Threads do hnswlib (-1 = todos os núcleos)")
+parser.add_argument("--lote", type=int, default=10000, help="Linhas lidas por vez do banco")
+parser.add_argument("--incremental", action="store_true",
+                    help="Carrega o índice salvo e adiciona só as linhas com criado_em posterior à marca")
+args = parser.parse_args()
+
+indice = IndiceLocal(args.diretorio)
+inicio = time.time()
+
+if args.incremental:
+    indice.carregar()
+    novos = indice.atualizar_incremental(lote=args.lote)
+    print(f"[INFO] {novos} vetores adicionados")
+else:
+    indice.m, indice.ef_construction = args.m, args.ef_construction
+
+    with engine.connect() as conn:
+        anos = args.anos or [r[0] for r in conn.execute(
+            text("SELECT DISTINCT ano FROM empenho_embeddings ORDER BY ano")
+        )]
+        if args.anos:
+            # reconstrução parcial: preserva os demais anos já salvos, atualizados até agora
+            try:
+                indice.carregar()
+                indice.atualizar_incremental(lote=args.lote)
+                indice.m, indice.ef_construction = args.m, args.ef_construction
+            except FileNotFoundError:
+                pass
+        # a marca vale para todos os anos: a varredura para nela e o resto fica para o incremental
+        marca = indice.marca or conn.execute(text("SELECT max(criado_em) FROM empenho_embeddings")).scalar()
+
+        for ano in anos:
+            n = conn.execute(
+                text("SELECT count(*) FROM empenho_embeddings WHERE ano = :ano AND criado_em <= CAST(:marca AS timestamp)"),
+                {"ano": ano, "marca": marca},
+            ).scalar()
+            if not n:
+                continue
+
+            ids = []
+            resultado = conn.execution_options(stream_results=True, max_row_buffer=args.lote).execute(
+                text("""
+                    SELECT idempenho, embedding FROM empenho_embeddings
+                    WHERE ano = :ano AND criado_em <= CAST(:marca AS timestamp)
+                    ORDER BY idempenho COLLATE "C"
+                """),
+                {"ano": ano, "marca": marca},
+            )
+            grafo = None
+            while True:
+                linhas = resultado.fetchmany(args.lote)
+                if not linhas:
+                    break
+                vetores = np.vstack([para_numpy(l[1]) for l in linhas]).astype(np.float32)
+                if grafo is None:
+                    indice.dim = vetores.shape[1]
+                    grafo = novo_indice(indice.dim, n, args.m, args.ef_construction)
+                    grafo.set_num_threads(args.threads)
+                grafo.add_items(vetores, np.arange(len(ids), len(ids) + len(linhas)))
+                ids.extend(str(l[0]) for l in linhas)
+
+            indice.anos[ano] = IndiceAno(grafo, np.asarray(ids, dtype=str))
+            print(f"[INFO] Ano {ano}: {len(ids)} vetores")
+
+    if marca is not None and not isinstance(marca, str):
+        indice.marca = marca.isoformat()
+
+indice.salvar()
+print(f"[INFO] Índice salvo em {args.diretorio} ({time.time() - inicio:.1f}s)")
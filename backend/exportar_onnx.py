@@ -0,0 +1,97 @@
+"""
+Exporta o modelo de embeddings para ONNX (opcionalmente quantizado em int8)
+e verifica a paridade com os embeddings do PyTorch.
+
+Uso:
+python exportar_onnx.py                       # fp32
+python exportar_onnx.py --quantize            # int8 dinâmico
+python exportar_onnx.py --quantize --amostra 2000 --tolerancia 0.02
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from routes.config import config
+from routes.model_utils import EmbeddingService
+from routes.onnx_backend import exportar_onnx
+
+TEXTOS_EXEMPLO = [
+    "AQUISIÇÃO DE MEDICAMENTOS PARA A REDE MUNICIPAL DE SAÚDE - PARACETAMOL 500MG",
+    "VALOR QUE SE EMPENHA PARA PAGAMENTO DA FOLHA DE PESSOAL DO MÊS DE JANEIRO",
+    "CONTRATAÇÃO DE EMPRESA PARA PRESTAÇÃO DE SERVIÇOS DE LIMPEZA URBANA",
+    "Aquisição de material de expediente para a Secretaria de Educação",
+    "locação de veículos",
+]
+
+# ==============================
+# Parser de argumentos
+# ==============================
+parser = argparse.ArgumentParser(description="Exportação ONNX e verificação de paridade")
+parser.add_argument("--quantize", action="store_true",
+                    help="Gera e verifica a versão com quantização dinâmica int8")
+parser.add_argument("--amostra", type=int, default=0,
+                    help="Nº de históricos do banco usados na verificação (0 = textos de exemplo)")
+parser.add_argument("--tolerancia", type=float, default=None,
+                    help="Distância cosseno máxima aceita (default: 1e-4 fp32, 0.02 int8)")
+parser.add_argument("--threads", type=int, default=None,
+                    help="Threads intra-op (default: valor do config.yaml)")
+args = parser.parse_args()
+
+model_config = dict(config["embedding_model"])
+if args.threads is not None:
+    model_config["intra_op_threads"] = args.threads
+tolerancia = args.tolerancia if args.tolerancia is not None else (0.02 if args.quantize else 1e-4)
+
+# ==============================
+# Exportação
+# ==============================
+path = exportar_onnx(model_config["name"], model_config.get("onnx_dir", "data/onnx"),
+                     quantize=args.quantize)
+print(f"[INFO] Modelo ONNX: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+# ==============================
+# Textos para a verificação
+# ==============================
+if args.amostra > 0:
+    from routes.db import engine
+
+    with engine.connect() as conn:
+        textos = pd.read_sql(
+            text("SELECT historico FROM empenhos TABLESAMPLE SYSTEM (1) WHERE historico IS NOT NULL LIMIT :n"),
+            conn, params={"n": args.amostra},
+        )["historico"].tolist()
+else:
+    textos = TEXTOS_EXEMPLO
+
+# ==============================
+# Paridade torch x onnx
+# ==============================
+def medir(service):
+    inicio = time.perf_counter()
+    emb = service.encode(textos)
+    return emb, time.perf_counter() - inicio
+
+torch_service = EmbeddingService({**model_config, "backend": "torch"})
+onnx_service = EmbeddingService({**model_config, "backend": "onnx", "quantize": args.quantize})
+
+emb_torch, t_torch = medir(torch_service)
+emb_onnx, t_onnx = medir(onnx_service)
+
+norma = np.linalg.norm(emb_torch, axis=1) * np.linalg.norm(emb_onnx, axis=1)
+dist_cos = 1 - (emb_torch * emb_onnx).sum(axis=1) / np.clip(norma, 1e-12, None)
+
+print(f"[INFO] Textos comparados: {len(textos)}")
+print(f"[INFO] Distância cosseno torch x onnx: média {dist_cos.mean():.2e}, máx {dist_cos.max():.2e}")
+print(f"[INFO] Diferença absoluta máxima: {np.abs(emb_torch - emb_onnx).max():.2e}")
+print(f"[INFO] Tempo torch: {t_torch:.2f}s | onnx: {t_onnx:.2f}s | speedup: {t_torch / t_onnx:.2f}x")
+
+if dist_cos.max() > tolerancia:
+    print(f"[ERRO] Paridade fora da tolerância ({tolerancia}).")
+    sys.exit(1)
+
+print(f"[INFO] Paridade OK (tolerância {tolerancia}).")
@@ -1,40 +1,28 @@
 # TODO: Mostrar uma barra de progresso global (para saber quanto falta).
 # TODO: Usar multiprocessamento (aproveitar mais núcleos da sua máquina).
 
-import os
 import pandas as pd
-import numpy as np
-from sqlalchemy import create_engine, text
-from sentence_transformers import SentenceTransformer
-from dotenv import load_dotenv
-import yaml
+from sqlalchemy import text
 from tqdm import tqdm  # For progress bar
+from routes.config import config
+from routes.db import engine
+from routes.model_utils import EmbeddingService
+from routes.pgvector_adapter import vetor_param
+from routes.versao_dados import incrementar_versao
+from routes.embeddings_texto import DDL_EMBEDDINGS_TEXTO, embeddings_deduplicados, registrar_textos
+from routes.projecao_3d import carregar_projecao
+from routes.db_utils import (
+    atualizar_centroides_3d, DDL_CENTROIDES_3D,
+    DDL_EMPENHO_EMBEDDINGS, garantir_particoes_ano, ANO_DESCONHECIDO,
+)
 
 # ==========================
 # Configurações
 # ==========================
 
-with open('config.yaml') as f:
-    config = yaml.safe_load(f)
-
 BATCH_SIZE = 128
-MODEL_NAME = config['embedding_model']
-
-# Carregar variáveis do .env
-load_dotenv()
-
-DB_USER = os.getenv("POSTGRES_USER")
-DB_PASS = os.getenv("POSTGRES_PASSWORD")
-DB_HOST = os.getenv("POSTGRES_HOST")
-DB_PORT = os.getenv("POSTGRES_PORT")
-DB_NAME = os.getenv("POSTGRES_DB")
-
-# ==========================
-# Conexão com PostgreSQL
-# ==========================
-engine = create_engine(
-    f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
+# linhas por ida ao banco: com deduplicação, só os textos novos do lote vão ao modelo
+LOTE_LINHAS = 2048
 
 # ==========================
 # Preparar banco para embeddings
@@ -43,21 +31,24 @@ with engine.begin() as conn:
     # Habilitar extensão pgvector (se ainda não estiver habilitada)
     conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
 
-    # Criar tabela para embeddings (já com a coluna auxiliar float4[])
-    conn.execute(text("""
-        CREATE TABLE IF NOT EXISTS empenho_embeddings (
-            idempenho varchar PRIMARY KEY,
-            embedding vector(384),
-            embedding_reduced vector(3),
-            embedding_array float4[]
-        )
-    """))
+    # Criar tabela para embeddings, particionada por ano, com ano/ente junto do vetor
+    # (bases antigas: migrar com sql/table_empenho_embeddings.sql)
+    conn.execute(text(DDL_EMPENHO_EMBEDDINGS))
+
+    # Embeddings endereçados por conteúdo (historico normalizado → hash)
+    conn.execute(text(DDL_EMBEDDINGS_TEXTO))
+
+    # Rollup dos centroides 3D por (ente, unidade, elemdespesatce)
+    conn.execute(text(DDL_CENTROIDES_3D))
+
+# conexões abertas antes da extensão existir não têm o adaptador do pgvector
+engine.dispose()
 
 # ==========================
 # Carregar dados do banco
 # ==========================
-query = """
-    SELECT idempenho, historico 
+query = f"""
+    SELECT idempenho, historico, COALESCE(ano, {ANO_DESCONHECIDO}) AS ano, ente
     FROM empenhos 
     WHERE idempenho NOT IN (SELECT idempenho FROM empenho_embeddings)
 """
@@ -71,47 +62,70 @@ if len(df) == 0:
 # ==========================
 # Modelo de embeddings
 # ==========================
-model = SentenceTransformer(MODEL_NAME)
+# mesmo serviço (e mesmo pooling) usado pela API
+embedding_service = EmbeddingService(config['embedding_model'])
     
-# Embeddings reduzidos para projeção 3d
-reduced_embeds = np.load("data/reduced_embeds.npy")
+# Projeção 3D ajustada (reprojetar_3d.py): cada lote novo é projetado no INSERT
+projecao = carregar_projecao()
+if projecao is None:
+    print("[AVISO] Projeção 3D não encontrada: embedding_reduced fica nulo. "
+          "Rode reprojetar_3d.py ao final para ajustar e preencher.")
 
 # ==========================
 # Geração em lotes
 # ==========================
-for start in tqdm(range(0, len(df), BATCH_SIZE)):
-    end = min(start + BATCH_SIZE, len(df))
+total_codificados = 0
+for start in tqdm(range(0, len(df), LOTE_LINHAS)):
+    end = min(start + LOTE_LINHAS, len(df))
     batch = df.iloc[start:end]
 
-    embeddings = model.encode(
-        batch["historico"].tolist(),
-        batch_size=BATCH_SIZE,
-        show_progress_bar=True,
-    )
-    
-    # fatia os embeddings reduzidos correspondentes ao batch
-    reduced_batch = reduced_embeds[start:end]
-
     # Inserir embeddings no banco
     with engine.begin() as conn:
-        for idempenho, emb, emb_red in zip(batch["idempenho"], embeddings, reduced_batch):
-            vector_str = "[" + ",".join([f"{x:.6f}" for x in emb]) + "]"
-            vector_red_str = "[" + ",".join([f"{x:.6f}" for x in emb_red]) + "]"
-
-            conn.execute(
+        # só historicos ainda sem embedding (por chave normalizada) passam pelo modelo
+        textos = batch["historico"].fillna("").tolist()
+        embeddings, chaves, codificadas = embeddings_deduplicados(
+            conn, embedding_service, textos, batch_size=BATCH_SIZE,
+        )
+        codificados = len(codificadas)
+        total_codificados += codificados
+        reduced_batch = projecao.projetar(embeddings) if projecao is not None else [None] * len(batch)
+
+        garantir_particoes_ano(conn, batch["ano"].unique())
+        inseridos = []
+        representantes = {}
+        for idempenho, ano, ente, emb, emb_red, chave, texto in zip(batch["idempenho"], batch["ano"], batch["ente"],
+                                                                    embeddings, reduced_batch, chaves, textos):
+            inserido = conn.execute(
                 text("""
-                    INSERT INTO empenho_embeddings (idempenho, embedding, embedding_reduced, embedding_array)
-                    VALUES (:id, :vec, :vec_reduced, :arr)
-                    ON CONFLICT (idempenho) DO NOTHING
+                    INSERT INTO empenho_embeddings (idempenho, ano, ente, embedding, embedding_reduced, chave_texto)
+                    VALUES (:id, :ano, :ente, :vec, :vec_reduced, :chave)
+                    ON CONFLICT (ano, idempenho) DO NOTHING
+                    RETURNING idempenho
                 """),
                 {
                     "id": idempenho,
-                    "vec": vector_str,   # para pgvector
-                    "vec_reduced": vector_red_str,
-                    "arr": emb.tolist()  # para leitura rápida no Python
+                    "ano": int(ano),
+                    "ente": ente,
+                    "vec": vetor_param(emb),   # já normalizado pelo EmbeddingService (binário)
+                    "vec_reduced": vetor_param(emb_red) if emb_red is not None else None,
+                    "chave": chave,
                 }
-            )
+            ).scalar()
+            if inserido is not None:
+                inseridos.append(inserido)
+                # a primeira linha inserida de cada texto novo guarda o vetor da chave
+                if chave in codificadas and chave not in representantes:
+                    representantes[chave] = (ano, idempenho, texto)
+
+        registrar_textos(conn, embedding_service.cache_key, representantes)
+
+        # atualiza incrementalmente os centroides 3D usados por /api/empenhos-3d
+        atualizar_centroides_3d(conn, inseridos)
 
-    print(f"Processado lote {start} - {end}")
+    print(f"Processado lote {start} - {end} ({codificados} textos novos codificados)")
+
+with engine.begin() as conn:
+    incrementar_versao(conn, 'generate_embeddings')
 
+print(f"Textos codificados: {total_codificados} de {len(df)} registros")
 print("Embeddings gerados e armazenados com sucesso!")
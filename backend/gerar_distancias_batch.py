@@ -5,7 +5,7 @@ e salvar na tabela empenho_distancias, processando grupo a grupo
 
 Versão segura:
 - Usa checkpoint automático (pula grupos já processados).
-- Calcula similaridade em blocos (chunked cosine similarity).
+- Calcula similaridade em blocos (produto escalar dos vetores normalizados).
 - Insere pares no banco em batches (default 100k).
 """
 
@@ -14,7 +14,6 @@ import argparse
 import pandas as pd
 import numpy as np
 from sqlalchemy import create_engine, text
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
 from tqdm import tqdm
 
@@ -76,7 +75,8 @@ def grupo_ja_processado(ano, ente, idunid, elem):
 def gerar_pares_em_blocos(X, ids, block_size):
     n = X.shape[0]
     for i in range(0, n, block_size):
-        sims = cosine_similarity(X[i:i+block_size], X)
+        # vetores gravados com norma 1: cosseno = produto escalar
+        sims = X[i:i+block_size] @ X.T
         for ii in range(sims.shape[0]):
             for j in range(n):
                 if (i+ii) < j:  # metade superior da matriz
@@ -87,10 +87,10 @@ def gerar_pares_em_blocos(X, ids, block_size):
 # ==============================
 def processar_grupo(ano, ente, idunid, elem):
     query = text("""
-        SELECT e.idempenho, emb.embedding_array
+        SELECT e.idempenho, emb.embedding::vector::real[] AS embedding
         FROM empenhos e
         JOIN empenho_embeddings emb ON e.idempenho = emb.idempenho
-        WHERE e.ano = :ano
+        WHERE emb.ano = :ano
           AND e.ente = :ente
           AND e.idunid = :idunid
           AND e.elemdespesatce = :elem
@@ -107,7 +107,7 @@ def processar_grupo(ano, ente, idunid, elem):
         df = df.sample(args.limite_grupo, random_state=42)
 
     # converte para float32 para economizar RAM
-    X = np.stack(df["embedding_array"].apply(lambda x: np.array(x, dtype=np.float32)))
+    X = np.stack(df["embedding"].apply(lambda x: np.array(x, dtype=np.float32)))
     ids = df["idempenho"].tolist()
 
     registros = []
@@ -146,7 +146,7 @@ for ano in args.anos:
         SELECT DISTINCT e.ente, e.idunid, e.elemdespesatce
         FROM empenhos e
         JOIN empenho_embeddings emb ON e.idempenho = emb.idempenho
-        WHERE e.ano = :ano
+        WHERE emb.ano = :ano
     """)
     with engine.connect() as conn:
         grupos = pd.read_sql(query_grupos, conn, params={"ano": ano})
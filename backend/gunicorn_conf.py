@@ -0,0 +1,66 @@
+# Configuração do gunicorn para vários workers uvicorn compartilhando o modelo.
+#
+#   cd backend
+#   WEB_CONCURRENCY=8 gunicorn -c gunicorn_conf.py main:app
+#
+# Com preload_app o processo mestre importa a API e carrega os pesos uma vez
+# (on_starting); os workers são criados por fork e herdam essas páginas em
+# copy-on-write. Cada worker soma apenas sua memória de ativações, cache e batcher.
+#
+# PRELOAD_APP=0 desliga a pré-carga (cada worker carrega o próprio modelo),
+# para a medição de referência de medir_memoria.py. A economia de memória ainda
+# não foi medida neste repositório: rode medir_memoria.py nos dois modos antes de
+# dimensionar a máquina.
+#
+# Cada worker abre seus próprios pools de banco: o total de conexões é
+# workers × (banco_async.pool_max + banco_sync.pool_size + banco_sync.max_overflow),
+# 8 × 11 = 88 com os padrões do config.yaml. Mantenha abaixo do max_connections
+# do Postgres (100 por padrão) ao mudar WEB_CONCURRENCY ou os pools.
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "8"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("PRELOAD_APP", "1").lower() not in ("0", "false", "nao")
+# a carga do modelo no mestre pode passar do timeout padrão de 30 s
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def on_starting(server):
+    if not server.cfg.preload_app:
+        return
+
+    from routes.model_utils import pre_carregar_modelo
+
+    # sem coletas de lixo no mestre: cada coleta escreve nos cabeçalhos dos
+    # objetos e quebraria o compartilhamento das páginas
+    gc.disable()
+    pre_carregar_modelo()
+
+
+def pre_fork(server, worker):
+    # objetos já existentes vão para a geração permanente (não são varridos nos workers)
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+    from routes.config import config
+    from routes.model_utils import servico_pre_carregado
+
+    if servico_pre_carregado() is not None:
+        # threads de inferência por worker: núcleos divididos entre os workers
+        import torch
+
+        threads = config["embedding_model"].get("intra_op_threads", 0) or max(1, (os.cpu_count() or 1) // workers)
+        torch.set_num_threads(threads)
+
+
+def child_exit(server, worker):
+    # métricas multiprocesso (routes/metricas.py): descarta os gauges do worker encerrado
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -5,6 +5,8 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 from psycopg2.extras import execute_batch
 from dotenv import load_dotenv
+from routes.versao_dados import incrementar_versao
+from routes.busca_texto import DDL_BUSCA_TEXTO
 
 # Carregar variáveis do .env
 load_dotenv()
@@ -196,5 +198,10 @@ with engine.begin() as conn:
     conn.execute(text('create index if not exists idx_ano on empenhos(ano);'))
     conn.execute(text('create index if not exists idx_cnpj on empenhos(cpfcnpjcredor);'))
     conn.execute(text('create index if not exists idx_nrlicitacao on empenhos(nrlicitacao);'))
+    # busca textual em historico: tsvector (português) + trigramas, ambos GIN
+    print("Criando índices de texto (historico)...")
+    conn.execute(text(DDL_BUSCA_TEXTO))
+    # avisa a API (catálogos/caches) que os dados mudaram
+    incrementar_versao(conn, 'load_empenhos')
 
 print("Setup finalizado")
@@ -1,29 +1,130 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from routes.visualizacao3d import router as visualizacao3d_router
 from routes.consulta_vs import router as consulta_vs_router
 from routes.auto_filling import router as auto_filling
 from routes.fracionamentos import router as fracionamentos
-import yaml
-from transformers import AutoTokenizer, AutoModel
-from routes.db import engine 
+from routes.db_async import criar_pool, fechar_pool, PoolIndisponivel
+from routes.config import config
 from routes.sobrepreco import router as sobrepreco_router
 from routes import sobrepreco_route
+from routes.model_utils import EmbeddingService, servico_pre_carregado
+from routes.embedding_cache import embedding_cache
+from routes.catalogo import catalogo, CatalogoIndisponivel
+from routes.indice_local import indice_local, USAR_INDICE_LOCAL
+from routes.cache_respostas import cache_respostas
+from routes.metricas import router as metricas_router, middleware_metricas
+from routes.saude import router as saude_router
 
-with open('config.yaml') as f:
-    config = yaml.safe_load(f)
-    
-    
-model_name = config['embedding_model']
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModel.from_pretrained(model_name)
-print('modelo carregado!')
+inicializacao_config = config.get('inicializacao', {})
 
 
-app = FastAPI()
-# guardar o modelo e tokenizer no app.state
-app.state.model = model
-app.state.tokenizer = tokenizer
+def criar_embedding_service():
+    # um único modelo por processo, compartilhado por todas as rotas;
+    # com gunicorn --preload os pesos já vêm do processo mestre (gunicorn_conf.py)
+    service = servico_pre_carregado()
+    if service is None:
+        service = EmbeddingService(config['embedding_model'])
+        print('modelo carregado!')
+
+    batching_config = config.get('embedding_batching', {})
+    if batching_config.get('enabled', False):
+        service.iniciar_batcher(
+            max_batch_size=batching_config.get('max_batch_size', 32),
+            max_wait_ms=batching_config.get('max_wait_ms', 5),
+        )
+    if inicializacao_config.get('warmup', True):
+        service.aquecer(inicializacao_config.get('warmup_textos', ["aquecimento do modelo"]))
+        print('modelo aquecido!')
+    return service
+
+
+async def executar_etapa(estado, etapa, funcao):
+    """
+    Executa uma etapa da inicialização, repetindo com espera crescente
+    (inicializacao.tentativas / espera_inicial_s / espera_maxima_s).
+    Esgotadas as tentativas, a exceção sobe para inicializar().
+    """
+    estado.etapa_inicializacao = etapa
+    tentativas = inicializacao_config.get('tentativas', 5)
+    espera = inicializacao_config.get('espera_inicial_s', 2)
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return await funcao()
+        except Exception as exc:
+            if tentativa == tentativas:
+                raise
+            print(f"[WARN] Inicialização ({etapa}) falhou, tentativa {tentativa}/{tentativas}: {exc}; "
+                  f"nova tentativa em {espera}s")
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, inicializacao_config.get('espera_maxima_s', 60))
+
+
+async def inicializar(app):
+    """
+    Pool, catálogo, índice local e modelo; /health/ready só responde 200 ao fim.
+    Cada etapa é repetida com espera crescente; se ainda assim falhar,
+    /health/live passa a responder 503 para o orquestrador reiniciar o processo.
+    """
+    estado = app.state
+    try:
+        # pool asyncpg usado pelas rotas de leitura (routes/db_async.py)
+        await executar_etapa(estado, "pool", criar_pool)
+        # catálogo do autopreenchimento em memória, atualizado em segundo plano
+        await executar_etapa(estado, "catalogo", lambda: asyncio.to_thread(catalogo.iniciar))
+        if USAR_INDICE_LOCAL:
+            # grafos hnswlib (busca_vetorial.backend = 'local'), atualizados em segundo plano
+            await executar_etapa(estado, "indice_local", lambda: asyncio.to_thread(indice_local.iniciar))
+        # carga e warmup fora do event loop: /health/live responde durante a carga
+        estado.embedding_service = await executar_etapa(
+            estado, "modelo", lambda: asyncio.to_thread(criar_embedding_service)
+        )
+        estado.etapa_inicializacao = None
+        estado.pronto = True
+    except Exception as exc:
+        estado.erro_inicializacao = f"{type(exc).__name__}: {exc}"
+        print(f"[ERRO] Falha na inicialização ({estado.etapa_inicializacao}): {exc}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.embedding_service = None
+    app.state.pronto = False
+    app.state.erro_inicializacao = None
+
+    tarefa = asyncio.create_task(inicializar(app))
+    if not inicializacao_config.get('segundo_plano', True):
+        # modo bloqueante: o servidor só aceita conexões depois do warmup
+        await tarefa
+        if app.state.erro_inicializacao is not None:
+            raise RuntimeError(app.state.erro_inicializacao)
+    yield
+
+    if not tarefa.done():
+        tarefa.cancel()
+    catalogo.parar()
+    indice_local.parar()
+    if app.state.embedding_service is not None:
+        app.state.embedding_service.encerrar_batcher()
+    await fechar_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(PoolIndisponivel)
+async def pool_indisponivel(request, exc):
+    # rotas que só dependem do banco respondem 503 enquanto o pool não existe
+    return JSONResponse(status_code=503, content={"detail": "Banco de dados ainda conectando"})
+
+
+@app.exception_handler(CatalogoIndisponivel)
+async def catalogo_indisponivel(request, exc):
+    # /api/auto-filling sem catálogo em memória: o cliente tenta de novo depois
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 
 # Configurar CORS para permitir frontend local
@@ -33,9 +134,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # cursor da próxima página em /api/consulta_vs
+    expose_headers=["X-Next-Cursor"],
 )
 
+# latência por rota para /metrics
+app.middleware("http")(middleware_metricas)
+
 # Incluir rotas
+app.include_router(saude_router)
+app.include_router(metricas_router)
 app.include_router(fracionamentos)
 app.include_router(visualizacao3d_router)
 app.include_router(consulta_vs_router)
@@ -47,3 +155,15 @@ app.include_router(sobrepreco_route.router)
 @app.get("/")
 def root():
     return {"message": "API do NEMESIS ativa"}
+
+
+@app.get("/api/embeddings/stats")
+def embeddings_stats():
+    # fila e lotes do batcher ficam no /metrics (nemesis_embedding_batcher_*)
+    return {"cache": embedding_cache.stats()}
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    # cache de respostas de sobrepreco, empenhos-3d e fracionamentos
+    return await cache_respostas.stats()
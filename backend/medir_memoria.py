@@ -0,0 +1,117 @@
+"""
+Mede a memória de um servidor com vários workers (mestre + filhos).
+
+RSS conta páginas compartilhadas uma vez por processo; PSS divide cada página
+compartilhada entre os processos que a usam, então a soma de PSS é a memória
+real ocupada. Com o modelo pré-carregado (gunicorn_conf.py) o PSS por worker
+deve cair para a parte própria do worker, enquanto o RSS continua alto.
+
+Uso (a partir de backend/, Linux):
+    # sobe o servidor, espera /health/ready e mede
+    python medir_memoria.py --comando "gunicorn -c gunicorn_conf.py main:app"
+    # comparação sem pré-carga (cada worker carrega o próprio modelo)
+    PRELOAD_APP=0 python medir_memoria.py --comando "gunicorn -c gunicorn_conf.py main:app"
+    # servidor já em execução
+    python medir_memoria.py --pid 12345
+"""
+import argparse
+import shlex
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def filhos(pid):
+    caminho = f"/proc/{pid}/task/{pid}/children"
+    try:
+        with open(caminho) as f:
+            return [int(p) for p in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def arvore(pid):
+    pids = [pid]
+    for filho in filhos(pid):
+        pids.extend(arvore(filho))
+    return pids
+
+
+def memoria_kb(pid):
+    # smaps_rollup: Rss, Pss, Shared_* e Private_* já somados por processo
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) == 3 and partes[2] == "kB":
+                valores[partes[0].rstrip(":")] = int(partes[1])
+    return {
+        "rss": valores.get("Rss", 0),
+        "pss": valores.get("Pss", 0),
+        "privada": valores.get("Private_Clean", 0) + valores.get("Private_Dirty", 0),
+        "compartilhada": valores.get("Shared_Clean", 0) + valores.get("Shared_Dirty", 0),
+    }
+
+
+def esperar_pronto(url, espera_max):
+    limite = time.time() + espera_max
+    while time.time() < limite:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                if resp.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(1)
+    return False
+
+
+def relatorio(pid_mestre):
+    print(f"{'pid':>8} {'papel':>8} {'RSS MB':>10} {'PSS MB':>10} {'priv MB':>10} {'compart MB':>11}")
+    total = {"rss": 0, "pss": 0, "privada": 0, "compartilhada": 0}
+    for pid in arvore(pid_mestre):
+        try:
+            mem = memoria_kb(pid)
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        papel = "mestre" if pid == pid_mestre else "worker"
+        print(f"{pid:>8} {papel:>8} {mem['rss'] / 1024:>10.1f} {mem['pss'] / 1024:>10.1f} "
+              f"{mem['privada'] / 1024:>10.1f} {mem['compartilhada'] / 1024:>11.1f}")
+        for chave in total:
+            total[chave] += mem[chave]
+    print(f"{'total':>17} {total['rss'] / 1024:>10.1f} {total['pss'] / 1024:>10.1f} "
+          f"{total['privada'] / 1024:>10.1f} {total['compartilhada'] / 1024:>11.1f}")
+    print("Memória real ocupada ≈ soma do PSS.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS/PSS do mestre e dos workers da API")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--pid", type=int, help="PID do processo mestre já em execução")
+    grupo.add_argument("--comando", help="comando que sobe o servidor (é encerrado ao fim)")
+    parser.add_argument("--url", default="http://localhost:8000/health/ready")
+    parser.add_argument("--espera", type=int, default=180, help="segundos máximos até ficar pronto")
+    parser.add_argument("--assentar", type=int, default=10,
+                        help="segundos extras após pronto, para todos os workers terminarem o warmup")
+    args = parser.parse_args()
+
+    if args.pid:
+        relatorio(args.pid)
+        return
+
+    proc = subprocess.Popen(shlex.split(args.comando))
+    try:
+        if not esperar_pronto(args.url, args.espera):
+            print(f"[ERRO] {args.url} não ficou pronto em {args.espera}s")
+            sys.exit(1)
+        time.sleep(args.assentar)
+        relatorio(proc.pid)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    main()
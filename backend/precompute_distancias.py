@@ -11,7 +11,6 @@ import argparse
 import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
-from sklearn.metrics.pairwise import cosine_similarity
 from dotenv import load_dotenv
 from tqdm import tqdm
 
@@ -78,10 +77,11 @@ print(f"[INFO] Total de grupos encontrados: {len(grupos)}")
 for (ente, idunid, ano, elem) in tqdm(grupos, desc="Grupos processados"):
     # Carrega somente os empenhos deste grupo
     query_empenhos = text("""
-        SELECT idempenho, dtempenho, embedding_array AS embedding
-        FROM empenhos_por_ano
-        WHERE ente = :ente AND idunid = :idunid AND ano = :ano AND elemdespesatce = :elem
-        ORDER BY dtempenho
+        SELECT v.idempenho, v.dtempenho, emb.embedding::vector::real[] AS embedding
+        FROM empenhos_por_ano v
+        JOIN empenho_embeddings emb ON emb.ano = v.ano AND emb.idempenho = v.idempenho
+        WHERE v.ente = :ente AND v.idunid = :idunid AND v.ano = :ano AND v.elemdespesatce = :elem
+        ORDER BY v.dtempenho
     """)
 
     with engine.connect() as conn:
@@ -107,9 +107,8 @@ for (ente, idunid, ano, elem) in tqdm(grupos, desc="Grupos processados"):
             if (dt_j - dt_i).days > args.janela_dias:
                 break  # já que está ordenado por data
 
-            emb_i = registros[i]["embedding"].reshape(1, -1)
-            emb_j = registros[j]["embedding"].reshape(1, -1)
-            sim = cosine_similarity(emb_i, emb_j)[0][0]
+            # vetores gravados com norma 1: cosseno = produto escalar
+            sim = np.dot(registros[i]["embedding"], registros[j]["embedding"])
 
             rows_to_insert.append({
                 "ente": ente,
@@ -0,0 +1,112 @@
+"""
+Ajusta a projeção 3D dos embeddings e regrava embedding_reduced em lote.
+
+1. Ajusta uma PCA com IncrementalPCA lendo empenho_embeddings em partes
+   (toda a base ou uma amostra) e salva em projecao_3d.caminho do config.yaml
+   (média + componentes, .npz). generate_embeddings.py usa esse arquivo para
+   projetar os empenhos novos na hora do INSERT.
+2. Regrava embedding_reduced de todas as linhas (ou só das nulas) com a
+   projeção, em UPDATEs por lote.
+3. Reconstrói o rollup centroides_3d e incrementa versao_dados.
+
+Uso:
+python reprojetar_3d.py                      # ajusta na base inteira e regrava tudo
+python reprojetar_3d.py --amostra 200000     # ajuste numa amostra aleatória
+python reprojetar_3d.py --manter_modelo --somente_nulos   # só preenche o que falta
+"""
+
+import argparse
+import time
+import numpy as np
+from pgvector import Vector
+from sqlalchemy import text
+from tqdm import tqdm
+
+from routes.db import engine
+from routes.db_utils import reconstruir_centroides_3d
+from routes.pgvector_adapter import para_numpy
+from routes.projecao_3d import Projecao3D, CAMINHO_PROJECAO
+from routes.versao_dados import incrementar_versao
+
+# ==============================
+# Parser de argumentos
+# ==============================
+parser = argparse.ArgumentParser(description="Ajusta a projeção 3D (PCA) e regrava embedding_reduced")
+parser.add_argument("--caminho", default=CAMINHO_PROJECAO, help="Arquivo .npz da projeção")
+parser.add_argument("--amostra", type=int, default=None,
+                    help="Ajusta numa amostra aleatória de N linhas (default: base inteira)")
+parser.add_argument("--lote", type=int, default=20000, help="Linhas por lote (ajuste e UPDATE)")
+parser.add_argument("--manter_modelo", action="store_true", help="Usa a projeção salva, sem reajustar")
+parser.add_argument("--somente_nulos", action="store_true", help="Regrava só linhas sem embedding_reduced")
+args = parser.parse_args()
+
+
+def ler_lotes(sql, params=None):
+    """Gera (idempenhos, anos, matriz de embeddings) lendo com cursor no servidor."""
+    with engine.connect() as conn:
+        resultado = conn.execution_options(stream_results=True, max_row_buffer=args.lote).execute(
+            text(sql), params or {}
+        )
+        while True:
+            linhas = resultado.fetchmany(args.lote)
+            if not linhas:
+                break
+            yield ([l[0] for l in linhas], [l[1] for l in linhas],
+                   np.vstack([para_numpy(l[2]) for l in linhas]))
+
+
+# ==============================
+# 1. Ajuste
+# ==============================
+inicio = time.time()
+if args.manter_modelo:
+    projecao = Projecao3D.carregar(args.caminho)
+    print(f"[INFO] Projeção carregada de {args.caminho}")
+else:
+    if args.amostra:
+        sql_ajuste = "SELECT idempenho, ano, embedding FROM empenho_embeddings ORDER BY random() LIMIT :n"
+        params_ajuste = {"n": args.amostra}
+    else:
+        sql_ajuste = "SELECT idempenho, ano, embedding FROM empenho_embeddings"
+        params_ajuste = {}
+    projecao = Projecao3D.ajustar(x for _, _, x in ler_lotes(sql_ajuste, params_ajuste))
+    projecao.salvar(args.caminho)
+    print(f"[INFO] Projeção ajustada em {time.time() - inicio:.1f}s, salva em {args.caminho} "
+          f"(variância explicada: {projecao.variancia_explicada.sum():.3f})")
+
+# ==============================
+# 2. Regravação de embedding_reduced
+# ==============================
+sql_linhas = "SELECT idempenho, ano, embedding FROM empenho_embeddings"
+if args.somente_nulos:
+    sql_linhas += " WHERE embedding_reduced IS NULL"
+
+atualizar = text("""
+    UPDATE empenho_embeddings ee
+    SET embedding_reduced = v.p
+    FROM unnest(CAST(:ids AS varchar[]), CAST(:anos AS int[]), CAST(:pontos AS vector[]))
+         AS v(idempenho, ano, p)
+    WHERE ee.ano = v.ano AND ee.idempenho = v.idempenho
+""")
+
+total = 0
+for ids, anos, embeddings in tqdm(ler_lotes(sql_linhas), desc="Lotes reprojetados"):
+    pontos = projecao.projetar(embeddings)
+    with engine.begin() as conn:
+        conn.execute(atualizar, {
+            "ids": ids,
+            "anos": [int(a) for a in anos],
+            # vector[]: cada ponto embrulhado em Vector (ver vetores_param)
+            "pontos": [Vector(p) for p in pontos],
+        })
+    total += len(ids)
+print(f"[INFO] {total} projeções regravadas")
+
+# ==============================
+# 3. Centroides e versão dos dados
+# ==============================
+with engine.begin() as conn:
+    reconstruir_centroides_3d(conn)
+    incrementar_versao(conn, "reprojetar_3d")
+
+print(f"[INFO] Reprojeção concluída em {time.time() - inicio:.1f}s")
@@ -1,23 +1,7 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from collections import Counter
-from routes.db_utils import get_unidades_uniques, get_elemdespesa_uniques, get_credores_uniques
-
-
-def calculate_score(words_a, words_b):
-    # words_a and words_b are Counters
-    all_words = set(words_a) | set(words_b)
-    min_sum = sum(min(words_a.get(w,0), words_b.get(w,0)) for w in all_words)
-    max_sum = sum(max(words_a.get(w,0), words_b.get(w,0)) for w in all_words)
-    return min_sum / max_sum if max_sum > 0 else 0
-
-
-def count_words(text: str):
-    chars = [char.lower() for char in text if char != ' ']
-    count = Counter(chars)
-    return count
-
+from routes.catalogo import catalogo
 
 
 class ConsultaVSRequest(BaseModel):
@@ -40,46 +24,34 @@ def autofilling(body: ConsultaVSRequest):
     unidade = dados_frontend['unidade']
     
     if tipo_dado == 1:
-        unidades = get_unidades_uniques()
-        print('unidades e entes carregados')
+        unidades = catalogo.unidades_por_ente()
         return JSONResponse(content=unidades)
-        
-    else:    
-        if tipo_dado == 2:
-            df = get_elemdespesa_uniques(unidade)
-        
-        elif tipo_dado == 3:
-            df = get_credores_uniques()
-        df.columns = ['title']
     
     query = dados_frontend['consulta']
     print('dados consultados: ', query)
     
-    
-    word_count_query = count_words(query)
-    
-    scores = []
-    for row in df['title']:
-        words_count = count_words(row)
-        score = calculate_score(words_count, word_count_query)
-        scores.append(score)
-    
-    df = df.assign(scores=scores)
-
-    # Get the top 5 rows by score
-    top_rows = df.nlargest(5, 'scores')
+    # top 5 por similaridade de caracteres (Jaccard de multiconjuntos), via índice em memória
+    if tipo_dado == 2:
+        top_rows = catalogo.sugerir_elementos(query, unidade, k=5)
+    elif tipo_dado == 3:
+        top_rows = catalogo.sugerir_credores(query, k=5)
+    else:
+        top_rows = []
 
     # Build results
-    results = []
-    for _, row in top_rows.iterrows():
-        result = {
-            "best_match": row["title"],
-            "score": row["scores"]
-        } 
-        results.append(result)
+    results = [
+        {
+            "best_match": title,
+            "score": score
+        }
+        for title, score in top_rows
+    ]
 
 
     return JSONResponse(content=results)
 
 
-
+@router.get("/api/catalogo/versao")
+def versao_catalogo():
+    # carimbo barato para o frontend/caches saberem se os dados mudaram
+    return {"versao": catalogo.versao, "carregado_em": catalogo.carregado_em}
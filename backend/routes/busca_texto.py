@@ -0,0 +1,46 @@
+from routes.config import config
+
+# mesma definição de sql/idx_empenhos_historico_texto.sql
+DDL_BUSCA_TEXTO = """
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+    ALTER TABLE empenhos
+    ADD COLUMN IF NOT EXISTS historico_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('portuguese', coalesce(historico, ''))) STORED;
+
+    CREATE INDEX IF NOT EXISTS idx_empenhos_historico_tsv
+    ON empenhos USING gin (historico_tsv);
+
+    CREATE INDEX IF NOT EXISTS idx_empenhos_historico_trgm
+    ON empenhos USING gin (historico gin_trgm_ops);
+"""
+
+MODOS = ("trgm", "fts")
+MODO_PADRAO = config.get("busca_texto", {}).get("modo", "trgm")
+
+
+def _escapar_like(termo):
+    # o termo é procurado literalmente: % e _ digitados não viram curingas
+    return termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filtro_texto(termo, modo=None, alias="e", param="termo"):
+    """
+    Condição SQL (parâmetro :<param>) para filtrar historico por um termo,
+    usando os índices GIN de sql/idx_empenhos_historico_texto.sql.
+
+    - 'trgm': historico ILIKE '%termo%' (substring, mesma semântica de antes)
+    - 'fts': busca textual em português (radicais, sem acentuação relevante,
+      aceita sintaxe de busca web: "frase exata", -exclusão, or)
+
+    Retorna (condicao, params).
+    """
+    modo = modo or MODO_PADRAO
+    if modo == "fts":
+        return (
+            f"{alias}.historico_tsv @@ websearch_to_tsquery('portuguese', :{param})",
+            {param: termo},
+        )
+    if modo == "trgm":
+        return f"{alias}.historico ILIKE :{param}", {param: f"%{_escapar_like(termo)}%"}
+    raise ValueError(f"Modo de busca textual desconhecido: {modo} (use {', '.join(MODOS)})")
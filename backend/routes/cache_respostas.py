@@ -0,0 +1,216 @@
+import asyncio
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import asyncpg
+import orjson
+
+from routes.config import config
+from routes.db_async import fetch_val
+from routes.embedding_cache import normalizar_texto
+from routes.metricas import contar_cache
+
+
+# ======================================================
+# Backends de armazenamento
+# ======================================================
+class BackendMemoria:
+    """LRU com TTL no próprio processo (um cache por worker)."""
+
+    def __init__(self, max_size=256, ttl_seconds=600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    async def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl_seconds)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_size:
+                self._itens.popitem(last=False)
+
+    async def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    async def tamanho(self):
+        return len(self._itens)
+
+
+class BackendRedis:
+    """
+    Redis local compartilhado pelos workers. A expiração é o TTL do próprio
+    Redis; a política LRU vem do maxmemory-policy configurado no servidor.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", ttl_seconds=600, prefixo="nemesis:"):
+        import redis.asyncio as redis  # dependência opcional
+
+        self.ttl_seconds = ttl_seconds
+        self.prefixo = prefixo
+        self._cliente = redis.from_url(url)
+
+    async def get(self, chave):
+        dados = await self._cliente.get(self.prefixo + chave)
+        return pickle.loads(dados) if dados is not None else None
+
+    async def set(self, chave, valor):
+        await self._cliente.set(
+            self.prefixo + chave,
+            pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL),
+            ex=self.ttl_seconds,
+        )
+
+    async def _chaves(self):
+        # SCAN (não bloqueia o servidor como KEYS) só nas chaves deste cache
+        return [c async for c in self._cliente.scan_iter(match=self.prefixo + "*", count=1000)]
+
+    async def clear(self):
+        chaves = await self._chaves()
+        for inicio in range(0, len(chaves), 1000):
+            await self._cliente.delete(*chaves[inicio:inicio + 1000])
+
+    async def tamanho(self):
+        return len(await self._chaves())
+
+
+# ======================================================
+# Cache de respostas com single-flight
+# ======================================================
+def _normalizar(valor):
+    if isinstance(valor, str):
+        return normalizar_texto(valor)
+    return valor
+
+
+def _cancelando(tarefa):
+    # Task.cancelling() existe a partir do Python 3.11
+    cancelling = getattr(tarefa, "cancelling", None)
+    return bool(cancelling and cancelling())
+
+
+async def versao_dados_atual():
+    # lida a cada chave (uma linha por PK): a carga que incrementa a versão
+    # invalida o cache na hora, sem esperar a checagem periódica do catálogo
+    try:
+        return await fetch_val("SELECT versao FROM versao_dados WHERE id = 1", operacao="versao_dados") or 0
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+class CacheRespostas:
+    """
+    Cache dos dados das rotas de leitura pesadas (sobrepreco, empenhos-3d,
+    fracionamentos), indexado por rota + parâmetros normalizados + versão dos
+    dados (versao_dados, lida a cada requisição). Uma carga nova muda a
+    versão e as entradas antigas deixam de ser usadas.
+
+    Requisições idênticas concorrentes no mesmo processo esperam a primeira
+    (single-flight): a consulta roda uma vez só. Se a primeira for cancelada
+    (cliente desconectou), uma das que esperavam assume a consulta.
+    """
+
+    def __init__(self, backend, habilitado=True):
+        self.backend = backend
+        self.habilitado = habilitado
+        self._em_andamento = {}
+        self.hits = 0
+        self.misses = 0
+        self.aguardando = 0
+
+    async def chave(self, rota, params):
+        normalizados = {k: _normalizar(v) for k, v in params.items()}
+        versao = await versao_dados_atual()
+        return f"{rota}:v{versao}:" + orjson.dumps(
+            normalizados, option=orjson.OPT_SORT_KEYS
+        ).decode()
+
+    async def obter(self, rota, params, produzir):
+        """
+        Retorna o valor em cache para (rota, params) ou executa `await produzir()`,
+        guardando o resultado. Exceções não são guardadas.
+        """
+        if not self.habilitado:
+            return await produzir()
+
+        chave = await self.chave(rota, params)
+        valor = await self.backend.get(chave)
+        if valor is not None:
+            self.hits += 1
+            contar_cache(rota, "hit")
+            return valor
+
+        em_andamento = self._em_andamento.get(chave)
+        if em_andamento is not None:
+            self.aguardando += 1
+            contar_cache(rota, "single_flight")
+            try:
+                return await asyncio.shield(em_andamento)
+            except asyncio.CancelledError:
+                # a primeira requisição foi cancelada, não esta: assume a consulta
+                if em_andamento.cancelled() and not _cancelando(asyncio.current_task()):
+                    return await self.obter(rota, params, produzir)
+                raise
+
+        self.misses += 1
+        contar_cache(rota, "miss")
+        futuro = asyncio.get_running_loop().create_future()
+        self._em_andamento[chave] = futuro
+        try:
+            valor = await produzir()
+            await self.backend.set(chave, valor)
+            futuro.set_result(valor)
+            return valor
+        except asyncio.CancelledError:
+            # o cancelamento é só desta requisição: quem espera tenta de novo
+            futuro.cancel()
+            raise
+        except Exception as exc:
+            futuro.set_exception(exc)
+            # evita "Future exception was never retrieved" quando ninguém esperava
+            futuro.exception()
+            raise
+        finally:
+            del self._em_andamento[chave]
+
+    async def clear(self):
+        await self.backend.clear()
+
+    async def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": await self.backend.tamanho(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "single_flight": self.aguardando,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def criar_cache_respostas(cache_config):
+    ttl = cache_config.get("ttl_seconds", 600)
+    if cache_config.get("backend", "memoria") == "redis":
+        backend = BackendRedis(url=cache_config.get("redis_url", "redis://localhost:6379/0"), ttl_seconds=ttl)
+    else:
+        backend = BackendMemoria(max_size=cache_config.get("max_size", 256), ttl_seconds=ttl)
+    return CacheRespostas(backend, habilitado=cache_config.get("enabled", True))
+
+
+# instância única compartilhada pelas rotas
+cache_respostas = criar_cache_respostas(config.get("cache_respostas", {}))
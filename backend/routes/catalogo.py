@@ -0,0 +1,182 @@
+import threading
+import time
+import numpy as np
+from sqlalchemy import text
+
+from routes.config import config
+from routes.db import engine
+from routes.fuzzy_index import IndiceFuzzy
+from routes.versao_dados import obter_versao
+
+
+class CatalogoIndisponivel(RuntimeError):
+    """Catálogo ainda não carregado (banco fora no startup); a API responde 503."""
+
+
+class CatalogoDimensoes:
+    """
+    Catálogo em memória das dimensões usadas no autopreenchimento
+    (entes/unidades, elementos de despesa e credores).
+
+    Carregado uma vez no startup e recarregado em segundo plano quando o
+    carimbo em versao_dados muda, de modo que /api/auto-filling não consulta
+    o Postgres a cada tecla digitada.
+    """
+
+    def __init__(self, intervalo_verificacao_s=60):
+        self.intervalo_verificacao_s = intervalo_verificacao_s
+        self.versao = None
+        self.carregado_em = None
+        self._dados = None
+        self._lock = threading.Lock()
+        # uma carga por vez; requisições não esperam por ela (ver _garantir_carregado)
+        self._lock_carga = threading.Lock()
+        self._proxima_tentativa = 0.0
+        self._espera = 1.0
+        self._parar = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+    def carregar(self):
+        with self._lock_carga:
+            self._carregar()
+
+    def _carregar(self):
+        with engine.connect() as conn:
+            versao = obter_versao(conn)
+            unidades = conn.execute(text("""
+                SELECT DISTINCT ente, unidade, idunid
+                FROM empenhos
+                WHERE ente IS NOT NULL AND unidade IS NOT NULL
+            """)).fetchall()
+            elementos = conn.execute(text("""
+                SELECT DISTINCT unidade, elemdespesatce
+                FROM empenhos
+                WHERE elemdespesatce IS NOT NULL
+            """)).fetchall()
+            credores = conn.execute(text("""
+                SELECT DISTINCT credor
+                FROM empenhos
+                WHERE credor IS NOT NULL
+            """)).fetchall()
+
+        unidades_por_ente = {}
+        for ente, unidade, idunid in unidades:
+            unidades_por_ente.setdefault(str(ente), []).append([str(unidade), str(idunid)])
+
+        elementos_por_unidade = {}
+        todos_elementos = set()
+        for unidade, elem in elementos:
+            elementos_por_unidade.setdefault(unidade, []).append(elem)
+            todos_elementos.add(elem)
+
+        lista_elementos = sorted(todos_elementos)
+        posicao = {elem: i for i, elem in enumerate(lista_elementos)}
+        lista_credores = [c for (c,) in credores]
+
+        dados = {
+            "unidades_por_ente": unidades_por_ente,
+            "elementos_por_unidade": elementos_por_unidade,
+            "elementos": lista_elementos,
+            "credores": lista_credores,
+            # índices de busca aproximada (um por dimensão)
+            "indice_elementos": IndiceFuzzy(lista_elementos),
+            "linhas_elementos_por_unidade": {
+                unidade: np.array([posicao[e] for e in elems], dtype=np.intp)
+                for unidade, elems in elementos_por_unidade.items()
+            },
+            "indice_credores": IndiceFuzzy(lista_credores),
+        }
+
+        # troca atômica: leitores nunca veem um catálogo pela metade
+        with self._lock:
+            self._dados = dados
+            self.versao = versao
+            self.carregado_em = time.time()
+
+        print(f"[INFO] Catálogo carregado (versão {versao}): "
+              f"{len(unidades)} unidades, {len(todos_elementos)} elementos, {len(dados['credores'])} credores")
+
+    def _garantir_carregado(self):
+        """
+        Dados do catálogo ou CatalogoIndisponivel (503). Se a carga do startup
+        falhou, no máximo uma requisição por vez tenta de novo, com espera
+        dobrando entre as tentativas (até intervalo_verificacao_s); as demais
+        não consultam o banco e recebem 503. A thread de verificação também
+        tenta a cada intervalo.
+        """
+        dados = self._dados
+        if dados is not None:
+            return dados
+        if time.monotonic() >= self._proxima_tentativa and self._lock_carga.acquire(blocking=False):
+            try:
+                if self._dados is None:
+                    self._carregar()
+            except Exception as exc:
+                self._proxima_tentativa = time.monotonic() + self._espera
+                self._espera = min(self._espera * 2, self.intervalo_verificacao_s)
+                print(f"[WARN] Falha ao carregar catálogo: {exc}")
+            finally:
+                self._lock_carga.release()
+        if self._dados is None:
+            raise CatalogoIndisponivel("Catálogo de autopreenchimento ainda não carregado")
+        return self._dados
+
+    # ------------------------------------------------------------------
+    # Atualização em segundo plano
+    # ------------------------------------------------------------------
+    def _verificar_versao(self):
+        while not self._parar.wait(self.intervalo_verificacao_s):
+            try:
+                with engine.connect() as conn:
+                    versao = obter_versao(conn)
+                if versao != self.versao:
+                    self.carregar()
+            except Exception as exc:
+                print(f"[WARN] Falha ao atualizar catálogo: {exc}")
+
+    def iniciar(self):
+        try:
+            self.carregar()
+        except Exception as exc:
+            # segue sem catálogo (503); a thread e as consultas, com espera, tentam de novo
+            print(f"[WARN] Falha ao carregar catálogo no startup: {exc}")
+
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._verificar_versao, name="catalogo-versao", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def unidades_por_ente(self):
+        return self._garantir_carregado()["unidades_por_ente"]
+
+    def elementos(self, unidade=""):
+        dados = self._garantir_carregado()
+        if unidade != "":
+            return dados["elementos_por_unidade"].get(unidade, [])
+        return dados["elementos"]
+
+    def credores(self):
+        return self._garantir_carregado()["credores"]
+
+    def sugerir_elementos(self, consulta, unidade="", k=5):
+        dados = self._garantir_carregado()
+        linhas = None
+        if unidade != "":
+            linhas = dados["linhas_elementos_por_unidade"].get(unidade, np.array([], dtype=np.intp))
+        return dados["indice_elementos"].top_k(consulta, k, linhas)
+
+    def sugerir_credores(self, consulta, k=5):
+        return self._garantir_carregado()["indice_credores"].top_k(consulta, k)
+
+
+catalogo = CatalogoDimensoes(
+    intervalo_verificacao_s=config.get("catalogo", {}).get("intervalo_verificacao_s", 60),
+)
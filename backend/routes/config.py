@@ -0,0 +1,7 @@
+import os
+import yaml
+
+CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "config.yaml"))
+
+with open(CONFIG_PATH) as f:
+    config = yaml.safe_load(f)
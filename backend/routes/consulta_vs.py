@@ -1,25 +1,41 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
-from routes.db_utils import search_db
+from routes.db_utils import (
+    search_db, search_db_filtrado, search_db_paginado, stream_search_db, search_db_batch,
+    colunas_resultados, decodificar_cursor, validar_chave,
+)
+from routes.respostas import aceita_arrow, resposta_tabela, resposta_ndjson
+from routes.config import config
+from routes.saude import obter_embedding_service
 from pydantic import BaseModel
-import pandas as pd
-from fastapi import APIRouter, Request
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request
 
 
 router = APIRouter()
 
+consulta_config = config.get("consulta_vs", {})
+LIMITE_PADRAO = consulta_config.get("limite_padrao", 100)
+LIMITE_MAXIMO = consulta_config.get("limite_maximo", 1000)
+PREFETCH_STREAM = consulta_config.get("prefetch_stream", 500)
+BATCH_MAX_CONSULTAS = consulta_config.get("batch_max_consultas", 200)
+
 class ConsultaVSRequest(BaseModel):
     ente: str
     unidade: str
     elementoDespesa: str
     credor: str
     historico: str
+    # "global": top-50 global e filtros depois | "filtrado": filtros dentro da busca ANN, com distâncias
+    modo: str = "global"
+    # paginação por keyset: tamanho da página e cursor devolvido em X-Next-Cursor
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    # stream=True → NDJSON, uma linha por resultado, lida de um cursor no servidor
+    stream: bool = False
 
 @router.post("/api/consulta_vs")
-def get_empenhos_vs(body: ConsultaVSRequest, request: Request):
+async def get_empenhos_vs(body: ConsultaVSRequest, request: Request):
     
-    model = request.app.state.model
-    tokenizer = request.app.state.tokenizer
+    embedding_service = obter_embedding_service(request)
 
     # Aqui você recebe os dados do frontend:
     dados_frontend = body.dict()
@@ -29,7 +45,87 @@ def get_empenhos_vs(body: ConsultaVSRequest, request: Request):
     credor = dados_frontend["credor"]
     elem_despesa = dados_frontend["elementoDespesa"]
     historico = dados_frontend["historico"]
-    
-    results = search_db(model, tokenizer, historico, ente, unidade, credor, elem_despesa)
 
-    return JSONResponse(content=results)
\ No newline at end of file
+    # cursor validado antes de qualquer resposta: no stream, um erro dentro do
+    # gerador só apareceria depois do 200
+    try:
+        chave = decodificar_cursor(body.cursor)
+        validar_chave(chave, historico != "")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if body.stream:
+        return resposta_ndjson(stream_search_db(
+            embedding_service, historico, ente, unidade, credor, elem_despesa,
+            chave=chave, prefetch=PREFETCH_STREAM,
+        ))
+
+    # paginação só quando pedida (limit ou cursor); sem eles a resposta é a de sempre
+    if body.limit is not None or chave is not None:
+        limit = min(max(body.limit or LIMITE_PADRAO, 1), LIMITE_MAXIMO)
+        results, proximo = await search_db_paginado(
+            embedding_service, historico, ente, unidade, credor, elem_despesa, limit, chave,
+        )
+
+        colunas = colunas_resultados(results) if aceita_arrow(request) else None
+        resposta = resposta_tabela(request, colunas, conteudo=results,
+                                   metadados={"next_cursor": proximo})
+        if proximo is not None:
+            resposta.headers["X-Next-Cursor"] = proximo
+        return resposta
+
+    if dados_frontend["modo"] == "filtrado":
+        results = await search_db_filtrado(embedding_service, historico, ente, unidade, credor, elem_despesa)
+    else:
+        results = await search_db(embedding_service, historico, ente, unidade, credor, elem_despesa)
+
+    colunas = colunas_resultados(results) if aceita_arrow(request) else None
+    return resposta_tabela(request, colunas, conteudo=results)
+
+
+class ConsultaVSItem(BaseModel):
+    historico: str
+    ente: str = ""
+    unidade: str = ""
+    elementoDespesa: str = ""
+    credor: str = ""
+
+class ConsultaVSBatchRequest(BaseModel):
+    consultas: List[ConsultaVSItem]
+    # vizinhos por consulta
+    k: int = 50
+
+@router.post("/api/consulta_vs/batch")
+async def get_empenhos_vs_batch(body: ConsultaVSBatchRequest, request: Request):
+    # várias consultas: um forward do modelo e um único SQL (unnest + LATERAL k-NN)
+    if len(body.consultas) > BATCH_MAX_CONSULTAS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BATCH_MAX_CONSULTAS} consultas por lote.")
+    k = min(max(body.k, 1), LIMITE_MAXIMO)
+
+    embedding_service = obter_embedding_service(request)
+    consultas = [
+        {
+            "historico": c.historico,
+            "ente": c.ente,
+            "unidade": c.unidade,
+            "credor": c.credor,
+            "elem_despesa": c.elementoDespesa,
+        }
+        for c in body.consultas
+    ]
+    resultados = await search_db_batch(embedding_service, consultas, k=k)
+
+    if aceita_arrow(request):
+        # tabela achatada: coluna "consulta" com o índice da consulta de origem
+        colunas = {"consulta": []}
+        for i, grupo in enumerate(resultados):
+            for chave, valores in colunas_resultados(grupo).items():
+                colunas.setdefault(chave, []).extend(valores)
+            colunas["consulta"].extend([i] * len(grupo))
+        return resposta_tabela(request, colunas)
+
+    conteudo = [
+        {"historico": c["historico"], "resultados": grupo}
+        for c, grupo in zip(consultas, resultados)
+    ]
+    return resposta_tabela(request, None, conteudo=conteudo)
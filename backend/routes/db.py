@@ -2,6 +2,8 @@
 import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from routes.config import config
+from routes.pgvector_adapter import registrar_pgvector
 
 load_dotenv()
 
@@ -11,9 +13,14 @@ DB_HOST = os.getenv("POSTGRES_HOST")
 DB_PORT = os.getenv("POSTGRES_PORT")
 DB_NAME = os.getenv("POSTGRES_DB")
 
+# psycopg 3: permite enviar os vetores do pgvector como parâmetros binários.
+# Na API este engine só atende as threads do catálogo e do índice local (as rotas
+# usam o pool asyncpg), então o pool é pequeno: ver banco_sync no config.yaml.
+_pool_config = config.get("banco_sync", {})
 engine = create_engine(
-    f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+    f"postgresql+psycopg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=_pool_config.get("pool_size", 2),
+    max_overflow=_pool_config.get("max_overflow", 3)
 )
+registrar_pgvector(engine)
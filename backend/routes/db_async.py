@@ -0,0 +1,182 @@
+# db_async.py
+import os
+import re
+from contextlib import asynccontextmanager
+import asyncpg
+import pandas as pd
+from dotenv import load_dotenv
+from pgvector.asyncpg import register_vector
+
+from routes.config import config
+from routes.metricas import medir, contar_linhas
+
+load_dotenv()
+
+DB_USER = os.getenv("POSTGRES_USER")
+DB_PASS = os.getenv("POSTGRES_PASSWORD")
+DB_HOST = os.getenv("POSTGRES_HOST")
+DB_PORT = os.getenv("POSTGRES_PORT")
+DB_NAME = os.getenv("POSTGRES_DB")
+
+_pool = None
+
+# ":nome" → "$n" (não confunde com casts "::tipo")
+_PARAM_NOMEADO = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+def converter_parametros(query, params=None):
+    """
+    Converte uma query no estilo do SQLAlchemy (:nome) para o estilo do
+    asyncpg ($1, $2, ...), devolvendo (query, args). Assim as consultas e
+    os montadores de filtro existentes servem aos dois caminhos.
+    """
+    params = params or {}
+    ordem = []
+
+    def _substituir(match):
+        nome = match.group(1)
+        if nome not in ordem:
+            ordem.append(nome)
+        return f"${ordem.index(nome) + 1}"
+
+    query = _PARAM_NOMEADO.sub(_substituir, str(query))
+    return query, [params[nome] for nome in ordem]
+
+
+async def _init_conexao(conn):
+    # codec binário do pgvector (vector/halfvec) em toda conexão do pool
+    await register_vector(conn)
+    # numeric como float, como pd.read_sql (coerce_float) devolvia: asyncpg traz
+    # Decimal, e str(Decimal) muda o texto de vlr_empenho e demais valores
+    await conn.set_type_codec(
+        "numeric", schema="pg_catalog", encoder=str, decoder=float, format="text",
+    )
+
+
+async def criar_pool():
+    global _pool
+    pool_config = config.get("banco_async", {})
+    _pool = await asyncpg.create_pool(
+        user=DB_USER,
+        password=DB_PASS,
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        min_size=pool_config.get("pool_min", 1),
+        max_size=pool_config.get("pool_max", 6),
+        command_timeout=pool_config.get("command_timeout_s", 60),
+        init=_init_conexao,
+    )
+    return _pool
+
+
+async def fechar_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def sql_ajustes_ann(ann_config=None):
+    """
+    SET LOCAL dos parâmetros de busca do pgvector (seção busca_vetorial do
+    config.yaml, valores sugeridos por benchmark_ann.py). Vale só na transação.
+    """
+    ann_config = config.get("busca_vetorial", {}) if ann_config is None else ann_config
+    comandos = [
+        f"SET LOCAL ivfflat.probes = {int(ann_config.get('ivfflat_probes', 10))}",
+        f"SET LOCAL hnsw.ef_search = {int(ann_config.get('hnsw_ef_search', 64))}",
+    ]
+    # busca iterativa (pgvector >= 0.8): completa o top-k quando há filtros
+    if ann_config.get("iterative_scan"):
+        modo = ann_config["iterative_scan"]
+        comandos.append(f"SET LOCAL hnsw.iterative_scan = {modo}")
+        comandos.append(f"SET LOCAL ivfflat.iterative_scan = {modo}")
+    return "; ".join(comandos)
+
+
+SQL_AJUSTES_ANN = sql_ajustes_ann()
+EF_SEARCH_PADRAO = int(config.get("busca_vetorial", {}).get("hnsw_ef_search", 64))
+# teto do hnsw.ef_search no pgvector
+EF_SEARCH_MAXIMO = 1000
+BUSCA_ITERATIVA = bool(config.get("busca_vetorial", {}).get("iterative_scan"))
+
+
+def limite_candidatos_ann(n):
+    """
+    Quantas das n linhas pedidas (LIMIT) o índice HNSW consegue devolver.
+    Sem busca iterativa, no máximo ef_search (teto de 1000); com
+    iterative_scan a varredura continua até completar o LIMIT.
+    """
+    n = int(n)
+    if BUSCA_ITERATIVA:
+        return n
+    return min(n, max(EF_SEARCH_PADRAO, EF_SEARCH_MAXIMO))
+
+
+async def garantir_ef_search(conn, n):
+    """
+    Prepara a transação para um LIMIT de n linhas no índice HNSW e retorna
+    limite_candidatos_ann(n). Com iterative_scan, hnsw.max_scan_tuples sobe
+    junto com n para a varredura não parar antes do LIMIT.
+    """
+    n = int(n)
+    if n > EF_SEARCH_PADRAO:
+        await conn.execute(f"SET LOCAL hnsw.ef_search = {min(n, EF_SEARCH_MAXIMO)}")
+    if BUSCA_ITERATIVA and n > 20000:  # default do pgvector
+        await conn.execute(f"SET LOCAL hnsw.max_scan_tuples = {n}")
+    return limite_candidatos_ann(n)
+
+
+@asynccontextmanager
+async def transacao_ann(conn=None):
+    """Conexão do pool em transação, com os ajustes de busca ANN aplicados."""
+    if conn is not None:
+        async with conn.transaction():
+            await conn.execute(SQL_AJUSTES_ANN)
+            yield conn
+        return
+    async with get_pool().acquire() as c:
+        async with c.transaction():
+            await c.execute(SQL_AJUSTES_ANN)
+            yield c
+
+
+class PoolIndisponivel(RuntimeError):
+    """Pool ainda não criado (startup em andamento ou falhou); a API responde 503."""
+
+
+def get_pool():
+    if _pool is None:
+        raise PoolIndisponivel("Pool asyncpg não inicializado (ver startup em main.py)")
+    return _pool
+
+
+async def fetch_df(query, params=None, conn=None, operacao="consulta"):
+    """
+    Equivalente async de pd.read_sql para consultas com parâmetros :nome.
+    `operacao` identifica a consulta nas métricas de SQL e de linhas retornadas.
+    """
+    sql, args = converter_parametros(query, params)
+
+    async def _executar(c):
+        with medir("sql", operacao):
+            stmt = await c.prepare(sql)
+            rows = await stmt.fetch(*args)
+        contar_linhas(operacao, len(rows))
+        colunas = [a.name for a in stmt.get_attributes()]
+        return pd.DataFrame.from_records([tuple(r) for r in rows], columns=colunas)
+
+    if conn is not None:
+        return await _executar(conn)
+    async with get_pool().acquire() as c:
+        return await _executar(c)
+
+
+async def fetch_val(query, params=None, conn=None, operacao="consulta"):
+    sql, args = converter_parametros(query, params)
+    with medir("sql", operacao):
+        if conn is not None:
+            return await conn.fetchval(sql, *args)
+        async with get_pool().acquire() as c:
+            return await c.fetchval(sql, *args)
@@ -1,33 +1,54 @@
-import os
+import asyncio
+import base64
+import json
 from sqlalchemy import text
-import pandas as pd
-from routes.model_utils import create_embeddings
-from routes.db import engine
-from psycopg2.extensions import AsIs
+from routes.config import config
+from routes.db_async import (
+    get_pool, fetch_df, fetch_val, converter_parametros,
+    transacao_ann, garantir_ef_search, limite_candidatos_ann, SQL_AJUSTES_ANN,
+)
+from routes.pgvector_adapter import (
+    vetor_param, vetores_param, ordem_vetorial, distancia_vetorial, TIPO_VETOR, DIM_EMBEDDING,
+)
+from routes.metricas import medir, contar_linhas
+from routes.indice_local import indice_local, USAR_INDICE_LOCAL
+# reexportado: o SQL do resumo vive num módulo sem dependências da API (job offline)
+from routes.resumo_fracionamento import DDL_RESUMO_FRACIONAMENTO, atualizar_resumo_fracionamento  # noqa: F401
 
-def search_db(model, tokenizer, historico, ente, unidade, credor, elem_despesa):
+# Consultas das rotas: async, via pool asyncpg (routes/db_async.py).
+# Funções de manutenção chamadas pelos scripts (atualizar_*, reconstruir_*)
+# recebem uma conexão síncrona do SQLAlchemy.
+
+async def search_db(embedding_service, historico, ente, unidade, credor, elem_despesa):
     if historico != "":
-        embed_query = create_embeddings(pd.Series(historico), model, tokenizer)[0]
+        embed_query = await embedding_service.encode_query_async(historico)
 
 
     idempenhos = None
     params = {}
 
-    with engine.connect() as conn:
+    # transação com ivfflat.probes / hnsw.ef_search do config (busca_vetorial)
+    async with transacao_ann() as conn:
         # 1) Se tem historico → busca embeddings
-        if historico != "":
-            vec_str = "'[" + ",".join([str(x) for x in embed_query.tolist()]) + "]'::vector"
-            query_embeddings = text("""
+        if historico != "" and USAR_INDICE_LOCAL and indice_local.disponivel():
+            # backend local (hnswlib): k-NN em memória, sem ida ao banco; numa
+            # thread, para a atualização em segundo plano não travar o event loop
+            with medir("ann_local", "search_db"):
+                idempenhos, _ = await asyncio.to_thread(indice_local.buscar, embed_query, 50)
+        elif historico != "":
+            # <#> (produto interno) sobre vetores normalizados, o operador do índice *_ip_ops
+            query_embeddings = f"""
                 SELECT idempenho,
-                    embedding <-> (:query_vec)::vector AS cosine_distance
+                    {distancia_vetorial("embedding", ":query_vec")} AS cosine_distance
                 FROM empenho_embeddings
-                ORDER BY cosine_distance
+                ORDER BY {ordem_vetorial("embedding", ":query_vec")}
                 LIMIT 50
-            """)
-            df_embeddings = pd.read_sql(
+            """
+            df_embeddings = await fetch_df(
                 query_embeddings,
+                {"query_vec": vetor_param(embed_query)},
                 conn,
-                params={"query_vec": AsIs(vec_str)}
+                operacao="search_db.ann",
             )
             idempenhos = df_embeddings["idempenho"].tolist()
 
@@ -50,134 +71,589 @@ def search_db(model, tokenizer, historico, ente, unidade, credor, elem_despesa):
             filters.append("elemdespesatce = :elemdespesa")
             params["elemdespesa"] = elem_despesa
 
-        # 3) Query final em empenhos
+        # 3) Query final em empenhos (colunas explícitas: historico_tsv e demais
+        # colunas internas não vão para a resposta)
         where_clause = " AND ".join(filters) if filters else "TRUE"
-        query_df = text(f"""
-            SELECT *
-            FROM empenhos
+        query_df = f"""
+            SELECT {COLUNAS_CONSULTA}
+            FROM empenhos e
             WHERE {where_clause}
-        """)
-        df_results = pd.read_sql(query_df, conn, params=params)
+        """
+        df_results = await fetch_df(query_df, params, conn, operacao="search_db.empenhos")
 
 
 
     # Colocar no formato aceitável pelo frontend:
-    filtered = [
+    return formatar_resultados(df_results)
+
+
+# colunas de empenhos usadas pelo frontend na consulta semântica
+COLUNAS_CONSULTA = "e.idempenho, e.historico, e.ente, e.unidade, e.elemdespesatce, e.credor, e.vlr_empenho"
+
+
+def montar_filtros(ente, unidade, credor, elem_despesa):
+    filters = []
+    params = {}
+    if ente:
+        filters.append("e.ente = :ente")
+        params["ente"] = ente
+    if unidade:
+        filters.append("e.unidade = :unidade")
+        params["unidade"] = unidade
+    if credor:
+        filters.append("e.credor = :credor")
+        params["credor"] = credor
+    if elem_despesa:
+        filters.append("e.elemdespesatce = :elemdespesa")
+        params["elemdespesa"] = elem_despesa
+    return filters, params
+
+
+def formatar_resultados(df_results):
+    # formato do frontend montado coluna a coluna (sem iterrows); distância cosseno quando houver
+    with medir("pandas", "formatar_resultados"):
+        return _formatar_resultados(df_results)
+
+
+def _formatar_resultados(df_results):
+    n = len(df_results)
+    distancias = df_results["distance"].astype(float).tolist() if "distance" in df_results.columns else [None] * n
+    colunas = zip(
+        df_results["historico"].tolist(),
+        df_results["idempenho"].astype(str).tolist(),
+        df_results["ente"].astype(str).tolist(),
+        df_results["unidade"].astype(str).tolist(),
+        df_results["elemdespesatce"].astype(str).tolist(),
+        df_results["credor"].astype(str).tolist(),
+        df_results["vlr_empenho"].astype(str).tolist(),
+        distancias,
+    )
+    return [
         {
-            "document": row["historico"],  # ou outro campo que você considere "document"
+            "document": historico,
             "metadata": {
-                "idempenho": str(row["idempenho"]),
-                "ente": str(row["ente"]),
-                "unidade": str(row["unidade"]),
-                "elemdespesatce": str(row["elemdespesatce"]),
-                "credor": str(row["credor"]),
-                "vlr_empenho": str(row["vlr_empenho"]),
+                "idempenho": idempenho,
+                "ente": ente,
+                "unidade": unidade,
+                "elemdespesatce": elem,
+                "credor": credor,
+                "vlr_empenho": vlr,
             },
-            "distance": None  # você não tem distância do SQL, mas pode deixar None ou 0
+            "distance": distancia,
         }
-        for _, row in df_results.iterrows()
+        for historico, idempenho, ente, unidade, elem, credor, vlr, distancia in colunas
     ]
 
 
-    return filtered 
+def colunas_resultados(resultados):
+    # versão achatada (colunar) dos resultados, para respostas Arrow
+    metadados = [r["metadata"] for r in resultados]
+    colunas = {"document": [r["document"] for r in resultados]}
+    for chave in ("idempenho", "ente", "unidade", "elemdespesatce", "credor", "vlr_empenho"):
+        colunas[chave] = [m[chave] for m in metadados]
+    colunas["distance"] = [r["distance"] for r in resultados]
+    return colunas
 
 
-def get_unidades_uniques():
-    query_df = text("""
-        SELECT DISTINCT ente, unidade, idunid
-        FROM empenhos
-    """)
+async def search_db_filtrado(embedding_service, historico, ente, unidade, credor, elem_despesa,
+                       k=50, fator_inicial=4, max_candidatos=20000):
+    """
+    Busca semântica com os filtros aplicados junto da busca ANN.
 
-    with engine.connect() as conn:
-        df_unidades = pd.read_sql(query_df, conn)
+    Busca k * fator_inicial vizinhos, aplica os filtros de metadados e, se
+    sobrarem menos de k, repete com 4x mais candidatos (até max_candidatos).
+    Na maioria dos casos é uma única ida ao banco. Retorna os resultados
+    ordenados pela distância cosseno.
 
-    # Force conversion to plain Python lists/strings
-    result = (
-        df_unidades
-        .groupby("ente")[["unidade", "idunid"]]
-        .apply(lambda g: [[str(u), str(i)] for u, i in g.values.tolist()])
-        .to_dict()
-    )
+    Sem busca iterativa (busca_vetorial.iterative_scan) o HNSW não devolve
+    mais que ef_search candidatos: max_candidatos fica limitado a esse teto e
+    filtros muito seletivos podem trazer menos de k resultados.
+    """
+    filters, params = montar_filtros(ente, unidade, credor, elem_despesa)
+    where_clause = " AND ".join(filters) if filters else "TRUE"
 
-    return result
+    # sem histórico → apenas filtros de metadados
+    if historico == "":
+        query_df = f"""
+            SELECT {COLUNAS_CONSULTA}
+            FROM empenhos e
+            WHERE {where_clause}
+            LIMIT :k
+        """
+        df_results = await fetch_df(query_df, {**params, "k": k}, operacao="search_db_filtrado")
+        return formatar_resultados(df_results)
 
-    
-def get_elemdespesa_uniques(unidade):
-    query_df_unidade = text("""
-        SELECT DISTINCT elemdespesatce
-        FROM empenhos
-        WHERE unidade = :unidade
-    """)
-    query_df = text("""
-        SELECT DISTINCT elemdespesatce
-        FROM empenhos
-    """)
-        
-    with engine.connect() as conn:
-        if unidade != "":
-            df_elemdespesa = pd.read_sql(
-                query_df_unidade,
-                conn,
-                params={"unidade": unidade}
-            )
-        else:
-            df_elemdespesa = pd.read_sql(
-                query_df,
-                conn,
+    embed_query = await embedding_service.encode_query_async(historico)
+
+    async with transacao_ann() as conn:
+        params["query_vec"] = vetor_param(embed_query)
+        params["k"] = k
+
+        query_df = f"""
+            WITH candidatos AS (
+                SELECT idempenho,
+                       {distancia_vetorial("embedding", ":query_vec")} AS distance
+                FROM empenho_embeddings
+                ORDER BY {ordem_vetorial("embedding", ":query_vec")}
+                LIMIT :n_candidatos
             )
-        
-    return df_elemdespesa
-
-def get_credores_uniques():
-    query_df = text("""
-        SELECT DISTINCT credor
-        FROM empenhos
-    """)
-        
-    with engine.connect() as conn:
-        df_credores = pd.read_sql(
-            query_df,
-            conn,
+            SELECT {COLUNAS_CONSULTA}, c.distance,
+                   (SELECT COUNT(*) FROM candidatos) AS total_candidatos
+            FROM candidatos c
+            JOIN empenhos e USING (idempenho)
+            WHERE {where_clause}
+            ORDER BY c.distance
+            LIMIT :k
+        """
+
+        # acima do que o índice devolve, um LIMIT maior não traz candidatos novos
+        teto = limite_candidatos_ann(max_candidatos)
+        n_candidatos = min(k * fator_inicial if filters else k, teto)
+        while True:
+            await garantir_ef_search(conn, n_candidatos)
+            df_results = await fetch_df(query_df, {**params, "n_candidatos": n_candidatos}, conn,
+                                        operacao="search_db_filtrado")
+
+            # menos candidatos que o LIMIT (dentro do que o índice entrega): a tabela acabou
+            esgotou = not df_results.empty and df_results["total_candidatos"].iloc[0] < n_candidatos
+            if len(df_results) >= k or esgotou:
+                break
+            if n_candidatos >= teto:
+                if teto < max_candidatos:
+                    print(f"[WARN] search_db_filtrado: {len(df_results)} de {k} resultados com "
+                          f"{teto} candidatos, o teto do HNSW sem busca_vetorial.iterative_scan")
+                break
+            n_candidatos = min(n_candidatos * 4, teto)
+
+    return formatar_resultados(df_results)
+
+
+# ======================================================
+# Paginação por keyset e streaming (consulta_vs)
+# ======================================================
+# teto de candidatos ANN da paginação com histórico (limitado ainda pelo índice,
+# ver limite_candidatos_ann)
+MAX_CANDIDATOS_KEYSET = config.get("consulta_vs", {}).get("max_candidatos_keyset", 20000)
+
+
+def codificar_cursor(chave):
+    # chave = [idempenho] ou [distance, idempenho, n_candidatos] da última linha entregue
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Cursor opaco -> chave do keyset. ValueError se o cursor for inválido."""
+    if not cursor:
+        return None
+    try:
+        chave = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as exc:
+        raise ValueError("cursor inválido") from exc
+    if not isinstance(chave, list) or len(chave) not in (1, 2, 3):
+        raise ValueError("cursor inválido")
+    return chave
+
+
+def validar_chave(chave, com_historico):
+    """ValueError se a chave do cursor não serve para o tipo de consulta."""
+    if chave is None:
+        return
+    if com_historico and (
+        len(chave) not in (2, 3)
+        or not isinstance(chave[0], (int, float))
+        or (len(chave) == 3 and not isinstance(chave[2], int))
+    ):
+        raise ValueError("cursor inválido para consulta com histórico")
+    if not com_historico and len(chave) != 1:
+        raise ValueError("cursor inválido para consulta sem histórico")
+
+
+def montar_consulta_keyset(embed_query, ente, unidade, credor, elem_despesa, chave=None, por_indice=True):
+    """
+    Consulta ordenada por uma chave única, continuando após `chave`:
+    sem histórico ordena por idempenho; com histórico por (distância, idempenho).
+    Os filtros de metadados entram no WHERE, então toda página vem completa.
+
+    Com histórico e `por_indice`, a ordenação sai do índice HNSW: um subselect
+    pega os :n_candidatos vizinhos mais próximos (ORDER BY <#> LIMIT) e a
+    página é recortada dentro deles. Sem `por_indice` (streaming, que lê
+    tudo) a ordenação é exata sobre a tabela inteira.
+    """
+    filters, params = montar_filtros(ente, unidade, credor, elem_despesa)
+    validar_chave(chave, embed_query is not None)
+
+    if embed_query is None:
+        if chave is not None:
+            filters.append("e.idempenho > :apos_id")
+            params["apos_id"] = str(chave[0])
+        where_clause = " AND ".join(filters) if filters else "TRUE"
+        query = f"""
+            SELECT {COLUNAS_CONSULTA}
+            FROM empenhos e
+            WHERE {where_clause}
+            ORDER BY e.idempenho
+        """
+        return query, params
+
+    params["query_vec"] = vetor_param(embed_query)
+    if not por_indice:
+        if chave is not None:
+            filters.append(f"({distancia_vetorial('emb.embedding', ':query_vec')}, e.idempenho) "
+                           "> (:apos_dist::float8, :apos_id::varchar)")
+            params["apos_dist"] = float(chave[0])
+            params["apos_id"] = str(chave[1])
+        where_clause = " AND ".join(filters) if filters else "TRUE"
+        query = f"""
+            SELECT {COLUNAS_CONSULTA}, {distancia_vetorial("emb.embedding", ":query_vec")} AS distance
+            FROM empenho_embeddings emb
+            JOIN empenhos e USING (idempenho)
+            WHERE {where_clause}
+            ORDER BY distance, e.idempenho
+        """
+        return query, params
+
+    if chave is not None:
+        filters.append("(c.distance, e.idempenho) > (:apos_dist::float8, :apos_id::varchar)")
+        params["apos_dist"] = float(chave[0])
+        params["apos_id"] = str(chave[1])
+    where_clause = " AND ".join(filters) if filters else "TRUE"
+    query = f"""
+        WITH candidatos AS (
+            SELECT idempenho,
+                   {distancia_vetorial("emb.embedding", ":query_vec")} AS distance
+            FROM empenho_embeddings emb
+            ORDER BY {ordem_vetorial("emb.embedding", ":query_vec")}
+            LIMIT :n_candidatos
         )
-        
-    return df_credores
+        SELECT {COLUNAS_CONSULTA}, c.distance,
+               (SELECT COUNT(*) FROM candidatos) AS total_candidatos
+        FROM candidatos c
+        JOIN empenhos e USING (idempenho)
+        WHERE {where_clause}
+        ORDER BY c.distance, e.idempenho
+    """
+    return query, params
+
+
+async def search_db_paginado(embedding_service, historico, ente, unidade, credor, elem_despesa,
+                             limit, chave=None):
+    """
+    Uma página da consulta keyset. Retorna (resultados, próximo cursor ou None).
+
+    Com histórico, a página sai dos n_candidatos vizinhos do índice; o cursor
+    leva n_candidatos, e a página seguinte parte dele, crescendo 4x enquanto
+    faltarem linhas (até MAX_CANDIDATOS_KEYSET ou o que o índice devolve).
+    """
+    embed_query = await embedding_service.encode_query_async(historico) if historico != "" else None
+    query, params = montar_consulta_keyset(embed_query, ente, unidade, credor, elem_despesa, chave)
+    # uma linha a mais só para saber se existe próxima página
+    query += " LIMIT :limite"
+    params["limite"] = limit + 1
+
+    async with transacao_ann() as conn:
+        if embed_query is None:
+            df_results = await fetch_df(query, params, conn, operacao="search_db_paginado")
+        else:
+            teto = limite_candidatos_ann(MAX_CANDIDATOS_KEYSET)
+            anterior = int(chave[2]) if chave is not None and len(chave) == 3 else 0
+            n_candidatos = min(max(anterior, (limit + 1) * 4), teto)
+            while True:
+                await garantir_ef_search(conn, n_candidatos)
+                df_results = await fetch_df(query, {**params, "n_candidatos": n_candidatos}, conn,
+                                            operacao="search_db_paginado")
+                esgotou = not df_results.empty and df_results["total_candidatos"].iloc[0] < n_candidatos
+                if len(df_results) > limit or esgotou:
+                    break
+                if n_candidatos >= teto:
+                    print(f"[WARN] search_db_paginado: paginação encerrada no teto de {teto} candidatos")
+                    break
+                n_candidatos = min(n_candidatos * 4, teto)
+
+    proximo = None
+    if len(df_results) > limit:
+        df_results = df_results.iloc[:limit]
+        ultima = df_results.iloc[-1]
+        if embed_query is None:
+            proximo = codificar_cursor([str(ultima["idempenho"])])
+        else:
+            proximo = codificar_cursor([float(ultima["distance"]), str(ultima["idempenho"]), n_candidatos])
+
+    return formatar_resultados(df_results), proximo
+
+
+def formatar_registro(row):
+    # mesmo formato de formatar_resultados, para uma linha do cursor asyncpg
+    return {
+        "document": row["historico"],
+        "metadata": {
+            "idempenho": str(row["idempenho"]),
+            "ente": str(row["ente"]),
+            "unidade": str(row["unidade"]),
+            "elemdespesatce": str(row["elemdespesatce"]),
+            "credor": str(row["credor"]),
+            "vlr_empenho": str(row["vlr_empenho"]),
+        },
+        "distance": row.get("distance"),
+    }
+
+
+async def stream_search_db(embedding_service, historico, ente, unidade, credor, elem_despesa,
+                           chave=None, prefetch=500):
+    """
+    Gera os resultados linha a linha a partir de um cursor no servidor, buscando
+    `prefetch` linhas por vez: a memória da API não cresce com o resultado.
+    O stream lê o resultado inteiro, então a ordenação por distância é exata
+    (uma ordenação por requisição, não por página). Valide a chave com
+    validar_chave antes de devolver a resposta.
+    """
+    embed_query = await embedding_service.encode_query_async(historico) if historico != "" else None
+    query, params = montar_consulta_keyset(embed_query, ente, unidade, credor, elem_despesa, chave,
+                                           por_indice=False)
+    sql, args = converter_parametros(query, params)
+
+    n = 0
+    async with get_pool().acquire() as conn:
+        # cursores do asyncpg só existem dentro de uma transação
+        async with conn.transaction():
+            await conn.execute(SQL_AJUSTES_ANN)
+            async for row in conn.cursor(sql, *args, prefetch=prefetch):
+                n += 1
+                yield formatar_registro(row)
+    contar_linhas("stream_search_db", n)
+
+
+# ======================================================
+# Busca semântica em lote (consulta_vs/batch)
+# ======================================================
+async def search_db_batch(embedding_service, consultas, k=50):
+    """
+    Várias consultas em uma ida ao banco: os textos são codificados juntos e
+    cada vizinhança k-NN sai de um LATERAL sobre o unnest das consultas, com os
+    filtros de cada consulta aplicados dentro da busca.
+
+    `consultas`: lista de dicts com historico, ente, unidade, credor, elem_despesa.
+    Retorna uma lista de resultados (formato de formatar_resultados) por consulta,
+    na ordem de entrada; consultas sem histórico recebem lista vazia.
+    """
+    indices = [i for i, c in enumerate(consultas) if c["historico"] != ""]
+    resultados = [[] for _ in consultas]
+    if not indices:
+        return resultados
 
-def get_embeddings_3d(ente, unidade):
-    query_df = text("""
+    embeddings = await embedding_service.encode_queries_async([consultas[i]["historico"] for i in indices])
+
+    def _filtro(i, campo):
+        return consultas[i][campo] or None
+
+    query_df = f"""
+        SELECT q.idx, r.*
+        FROM unnest(
+            :idx::int[], :vecs::{TIPO_VETOR}[], :entes::text[], :unidades::text[],
+            :credores::text[], :elems::text[]
+        ) AS q(idx, vec, ente, unidade, credor, elemdespesa)
+        CROSS JOIN LATERAL (
+            SELECT {COLUNAS_CONSULTA},
+                   1 + (emb.embedding <#> q.vec) AS distance
+            FROM empenho_embeddings emb
+            JOIN empenhos e USING (idempenho)
+            WHERE (q.ente IS NULL OR e.ente = q.ente)
+              AND (q.unidade IS NULL OR e.unidade = q.unidade)
+              AND (q.credor IS NULL OR e.credor = q.credor)
+              AND (q.elemdespesa IS NULL OR e.elemdespesatce = q.elemdespesa)
+            ORDER BY emb.embedding <#> q.vec
+            LIMIT :k
+        ) r
+        ORDER BY q.idx, r.distance
+    """
+    async with transacao_ann() as conn:
+        await garantir_ef_search(conn, k)
+        df_results = await fetch_df(query_df, {
+            "idx": indices,
+            "vecs": vetores_param(embeddings),
+            "entes": [_filtro(i, "ente") for i in indices],
+            "unidades": [_filtro(i, "unidade") for i in indices],
+            "credores": [_filtro(i, "credor") for i in indices],
+            "elems": [_filtro(i, "elem_despesa") for i in indices],
+            "k": k,
+        }, conn, operacao="search_db_batch")
+
+    for idx, grupo in df_results.groupby("idx", sort=False):
+        resultados[int(idx)] = formatar_resultados(grupo)
+    return resultados
+
+
+async def get_embeddings_3d(ente, unidade):
+    # lê o rollup centroides_3d (sql/table_centroides_3d.sql) em vez de agregar os empenhos
+    query_df = """
         SELECT 
-            e.elemdespesatce,
-            AVG(ee.embedding_reduced) AS avg_embedding
-        FROM empenho_embeddings ee
-        JOIN empenhos e ON e.idempenho = ee.idempenho
-        WHERE e.ente = :ente
-        AND e.unidade = :unidade
-        AND ee.embedding_reduced IS NOT NULL  
-        GROUP BY e.elemdespesatce
-    """)
+            elemdespesatce,
+            ARRAY[soma_x / n, soma_y / n, soma_z / n] AS avg_embedding,
+            n,
+            ARRAY[soma_xx / n - (soma_x / n) ^ 2,
+                  soma_yy / n - (soma_y / n) ^ 2,
+                  soma_zz / n - (soma_z / n) ^ 2] AS variancia
+        FROM centroides_3d
+        WHERE ente = :ente
+        AND unidade = :unidade
+        AND n > 0
+    """
     
-    with engine.connect() as conn:
-        df_embeddings_3d = pd.read_sql(
-            query_df,
-            conn,
-            params={"ente": ente,
-                    "unidade": unidade}
-        )
+    df_embeddings_3d = await fetch_df(
+        query_df,
+        {"ente": ente,
+         "unidade": unidade},
+        operacao="get_embeddings_3d",
+    )
     return df_embeddings_3d
-    
-def get_embeddings_3d_within_elem(elemdespesatce, ente, unidade):
-    query_df = text("""
+
+
+# mesma definição de sql/table_empenho_embeddings.sql
+# Particionada por ano (LIST): consultas com ano = :ano só tocam a partição
+# daquele ano e o índice ANN dela. O índice HNSW criado na tabela-mãe é
+# replicado automaticamente em cada partição nova.
+# Uma cópia de cada vetor, normalizada, em TIPO_VETOR (halfvec ou vector):
+# o índice usa produto interno (*_ip_ops), equivalente ao cosseno.
+DDL_EMPENHO_EMBEDDINGS = f"""
+    CREATE TABLE IF NOT EXISTS empenho_embeddings (
+        idempenho         varchar NOT NULL,
+        ano               integer NOT NULL,
+        ente              text,
+        embedding         {TIPO_VETOR}({DIM_EMBEDDING}),
+        embedding_reduced vector(3),
+        -- marca d'água da atualização incremental do índice local (routes/indice_local.py)
+        criado_em         timestamp NOT NULL DEFAULT now(),
+        PRIMARY KEY (ano, idempenho)
+    ) PARTITION BY LIST (ano);
+
+    CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_cosine
+    ON empenho_embeddings
+    USING hnsw (embedding {TIPO_VETOR}_ip_ops)
+    WITH (m = 16, ef_construction = 64);
+
+    CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_idempenho
+    ON empenho_embeddings (idempenho);
+
+    CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_criado_em
+    ON empenho_embeddings (criado_em);
+"""
+
+# empenhos sem ano ficam na partição 0
+ANO_DESCONHECIDO = 0
+
+
+def garantir_particoes_ano(conn, anos):
+    """Cria (se preciso) a partição de cada ano; os índices vêm da tabela-mãe."""
+    for ano in sorted({int(a) for a in anos}):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS empenho_embeddings_{ano}
+            PARTITION OF empenho_embeddings FOR VALUES IN ({ano})
+        """))
+
+
+# mesma definição de sql/table_centroides_3d.sql
+DDL_CENTROIDES_3D = """
+    CREATE TABLE IF NOT EXISTS centroides_3d (
+        -- nulos gravados como '': a unicidade vale sem NULLS NOT DISTINCT (PostgreSQL 15+)
+        ente            TEXT NOT NULL,
+        unidade         TEXT NOT NULL,
+        elemdespesatce  TEXT NOT NULL,
+        n               BIGINT NOT NULL,
+        soma_x          DOUBLE PRECISION NOT NULL,
+        soma_y          DOUBLE PRECISION NOT NULL,
+        soma_z          DOUBLE PRECISION NOT NULL,
+        soma_xx         DOUBLE PRECISION NOT NULL,
+        soma_yy         DOUBLE PRECISION NOT NULL,
+        soma_zz         DOUBLE PRECISION NOT NULL,
+        CONSTRAINT uq_centroides_3d UNIQUE (ente, unidade, elemdespesatce)
+    )
+"""
+
+# somas das projeções 3D agregadas por (ente, unidade, elemdespesatce)
+_SELECT_SOMAS_CENTROIDES = """
+    SELECT COALESCE(e.ente, ''), COALESCE(e.unidade, ''), COALESCE(e.elemdespesatce, ''), COUNT(*),
+           SUM(p[1]), SUM(p[2]), SUM(p[3]),
+           SUM(p[1] * p[1]), SUM(p[2] * p[2]), SUM(p[3] * p[3])
+    FROM empenho_embeddings ee
+    JOIN empenhos e ON e.idempenho = ee.idempenho
+    CROSS JOIN LATERAL (SELECT ee.embedding_reduced::real[]::float8[] AS p) proj
+    WHERE ee.embedding_reduced IS NOT NULL
+"""
+
+
+def atualizar_centroides_3d(conn, idempenhos):
+    """
+    Soma ao rollup centroides_3d as projeções dos empenhos recém-inseridos.
+    Chamar dentro da mesma transação do INSERT, só com ids realmente inseridos.
+    """
+    if not idempenhos:
+        return
+    conn.execute(text(f"""
+        INSERT INTO centroides_3d (ente, unidade, elemdespesatce, n,
+                                   soma_x, soma_y, soma_z, soma_xx, soma_yy, soma_zz)
+        {_SELECT_SOMAS_CENTROIDES}
+          AND ee.idempenho = ANY(:idempenhos)
+        GROUP BY 1, 2, 3
+        ON CONFLICT ON CONSTRAINT uq_centroides_3d DO UPDATE SET
+            n = centroides_3d.n + EXCLUDED.n,
+            soma_x = centroides_3d.soma_x + EXCLUDED.soma_x,
+            soma_y = centroides_3d.soma_y + EXCLUDED.soma_y,
+            soma_z = centroides_3d.soma_z + EXCLUDED.soma_z,
+            soma_xx = centroides_3d.soma_xx + EXCLUDED.soma_xx,
+            soma_yy = centroides_3d.soma_yy + EXCLUDED.soma_yy,
+            soma_zz = centroides_3d.soma_zz + EXCLUDED.soma_zz
+    """), {"idempenhos": list(idempenhos)})
+
+
+def reconstruir_centroides_3d(conn):
+    # recálculo completo (ex.: depois de reprojetar todos os embeddings)
+    conn.execute(text("TRUNCATE centroides_3d"))
+    conn.execute(text(f"""
+        INSERT INTO centroides_3d (ente, unidade, elemdespesatce, n,
+                                   soma_x, soma_y, soma_z, soma_xx, soma_yy, soma_zz)
+        {_SELECT_SOMAS_CENTROIDES}
+        GROUP BY 1, 2, 3
+    """))
+
+async def get_embeddings_3d_within_elem(elemdespesatce, ente, unidade):
+    query_df = """
         SELECT ee.embedding_reduced, e.idempenho, e.historico, e.elemdespesatce, e.credor, e.dtempenho, e.vlr_empenho
         FROM empenho_embeddings ee
         JOIN empenhos e ON e.idempenho = ee.idempenho
         WHERE e.ente = :ente AND e.unidade = :unidade AND e.elemdespesatce = :elemdespesatce
-    """)
+          AND ee.embedding_reduced IS NOT NULL
+    """
     
-    with engine.connect() as conn:
-        df_embeddings_3d = pd.read_sql(
-            query_df,
-            conn,
-            params={"elemdespesatce": elemdespesatce,
-                    "ente": ente,
-                    "unidade": unidade}  # safely bind parameters
-        )
-    return df_embeddings_3d
\ No newline at end of file
+    df_embeddings_3d = await fetch_df(
+        query_df,
+        {"elemdespesatce": elemdespesatce,
+         "ente": ente,
+         "unidade": unidade},  # safely bind parameters
+        operacao="get_embeddings_3d_within_elem",
+    )
+    return df_embeddings_3d
+
+
+async def get_resumo_fracionamento(ano, idunid):
+    query_df = """
+        SELECT cluster_id, cluster_size, min_sim, max_sim, valor
+        FROM resumo_clusters_fracionamento
+        WHERE ano = :ano AND idunid = :idunid
+        ORDER BY cluster_id
+    """
+    return await fetch_df(query_df, {"ano": ano, "idunid": idunid}, operacao="get_resumo_fracionamento")
+
+
+async def get_cluster_fracionamento(ano, idunid, cluster_id):
+    query_df = """
+        SELECT cluster_size, soma_cluster, min_sim, max_sim, ano, ente, idunid,
+               elemdespesatce, credor, idempenho, data, valor, historico, cluster_id
+        FROM clusters_fracionamento
+        WHERE ano = :ano AND idunid = :idunid AND cluster_id = :cluster_id
+    """
+    return await fetch_df(query_df, {"ano": ano, "idunid": idunid, "cluster_id": cluster_id},
+                          operacao="get_cluster_fracionamento")
+
+
+async def existe_fracionamento_ano(ano):
+    query_df = "SELECT EXISTS (SELECT 1 FROM clusters_fracionamento WHERE ano = :ano)"
+    return await fetch_val(query_df, {"ano": ano}, operacao="existe_fracionamento_ano")
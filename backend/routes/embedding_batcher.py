@@ -0,0 +1,112 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from routes.metricas import registrar_fila_embeddings, registrar_lote_embeddings
+
+
+class EmbeddingBatcher:
+    """
+    Agrupa consultas concorrentes em um único lote para o modelo.
+
+    Cada chamada entra numa fila e recebe um Future. Uma thread dedicada junta
+    os textos que chegarem em até max_wait_ms (ou até max_batch_size itens),
+    roda um único forward com padding e resolve o Future de cada chamador.
+    Funciona tanto a partir das rotas síncronas (threadpool do FastAPI)
+    quanto de rotas async (encode_async). Profundidade da fila e tamanho dos
+    lotes vão para o /metrics (routes/metricas.py).
+    """
+
+    def __init__(self, encode_fn, max_batch_size=32, max_wait_ms=5):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._fila = queue.Queue()
+        self._fechado = False
+        self._lock_fechamento = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self):
+        return self._fila.qsize()
+
+    def submit(self, texto) -> Future:
+        futuro = Future()
+        with self._lock_fechamento:
+            # depois do close() ninguém consumiria a fila: falha na hora
+            if self._fechado:
+                raise RuntimeError("Batcher de embeddings encerrado")
+            self._fila.put((texto, futuro))
+        registrar_fila_embeddings(self.queue_depth)
+        return futuro
+
+    def encode(self, texto):
+        return self.submit(texto).result()
+
+    async def encode_async(self, texto):
+        return await asyncio.wrap_future(self.submit(texto))
+
+    def close(self):
+        """
+        Para a thread e falha os Futures que ficaram na fila: nenhuma chamada
+        pendente (ou posterior) espera para sempre.
+        """
+        with self._lock_fechamento:
+            if self._fechado:
+                return
+            self._fechado = True
+            self._fila.put(None)
+        self._thread.join(timeout=5)
+
+        erro = RuntimeError("Batcher de embeddings encerrado")
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(erro)
+        registrar_fila_embeddings(0)
+
+    def _coletar_lote(self, primeiro):
+        lote = [primeiro]
+        prazo = time.monotonic() + self.max_wait
+        while len(lote) < self.max_batch_size:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                item = self._fila.get(timeout=restante)
+            except queue.Empty:
+                break
+            if item is None:
+                # repõe o sinal de parada para o loop principal
+                self._fila.put(None)
+                break
+            lote.append(item)
+        return lote
+
+    def _loop(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+            lote = self._coletar_lote(item)
+            registrar_fila_embeddings(self.queue_depth)
+            registrar_lote_embeddings(len(lote))
+
+            # textos repetidos no mesmo lote são codificados uma vez só
+            unicos = list(dict.fromkeys(texto for texto, _ in lote))
+            try:
+                embeddings = self.encode_fn(unicos)
+            except Exception as exc:
+                for _, futuro in lote:
+                    futuro.set_exception(exc)
+                continue
+
+            por_texto = dict(zip(unicos, embeddings))
+            for texto, futuro in lote:
+                futuro.set_result(por_texto[texto])
@@ -0,0 +1,89 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from routes.config import config
+from routes.metricas import contar_cache
+
+
+def normalizar_texto(texto: str) -> str:
+    # NFC + espaços colapsados: variações triviais de digitação caem na mesma chave
+    return " ".join(unicodedata.normalize("NFC", texto).split())
+
+
+class EmbeddingCache:
+    """
+    Cache LRU com expiração (TTL) para embeddings de consulta,
+    indexado por (modelo, texto normalizado).
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _chave(self, texto, model_name):
+        return (model_name, normalizar_texto(texto))
+
+    def get(self, texto, model_name):
+        chave = self._chave(texto, model_name)
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                embedding, expira_em = item
+                if expira_em > time.monotonic():
+                    self._itens.move_to_end(chave)
+                    self.hits += 1
+                    contar_cache("embedding", "hit")
+                    return embedding
+                del self._itens[chave]
+            self.misses += 1
+            contar_cache("embedding", "miss")
+            return None
+
+    def put(self, texto, model_name, embedding):
+        chave = self._chave(texto, model_name)
+        with self._lock:
+            self._itens[chave] = (embedding, time.monotonic() + self.ttl_seconds)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_size:
+                self._itens.popitem(last=False)
+
+    def get_or_compute(self, texto, model_name, encode_fn):
+        """
+        Retorna o embedding em cache ou calcula com encode_fn(texto_normalizado).
+        Em caso de hit o modelo não é chamado.
+        """
+        embedding = self.get(texto, model_name)
+        if embedding is None:
+            embedding = encode_fn(normalizar_texto(texto))
+            self.put(texto, model_name, embedding)
+        return embedding
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._itens),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# instância única compartilhada pelas rotas (consulta_vs e sobrepreco)
+_cache_config = config.get("embedding_cache", {})
+embedding_cache = EmbeddingCache(
+    max_size=_cache_config.get("max_size", 1024),
+    ttl_seconds=_cache_config.get("ttl_seconds", 3600),
+)
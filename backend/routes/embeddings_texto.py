@@ -0,0 +1,136 @@
+import hashlib
+import re
+import unicodedata
+import numpy as np
+from sqlalchemy import text
+
+from routes.config import config
+from routes.pgvector_adapter import DIM_EMBEDDING, para_numpy
+
+# Deduplicação endereçada por conteúdo: cada historico é normalizado (regras
+# em deduplicacao_textos no config.yaml) e vira uma chave (hash). Só textos com
+# chave nova são codificados pelo modelo; os demais reaproveitam o vetor já
+# gravado. embeddings_texto não guarda vetores: aponta, por chave, para a linha
+# de empenho_embeddings (ano, idempenho) cujo vetor serve a todos os empenhos
+# com o mesmo texto. Assim cada vetor continua gravado uma vez por empenho,
+# na coluna que os índices ANN por partição usam.
+#
+# O modelo entra na chave primária: trocar de modelo recodifica só os textos
+# únicos, não cada empenho.
+
+# mesma definição de sql/table_embeddings_texto.sql
+DDL_EMBEDDINGS_TEXTO = """
+    CREATE TABLE IF NOT EXISTS embeddings_texto (
+        modelo     text NOT NULL,
+        chave      char(32) NOT NULL,
+        -- empenho cujo vetor representa a chave (primeiro texto codificado)
+        ano        integer NOT NULL,
+        idempenho  varchar NOT NULL,
+        texto      text,
+        criado_em  timestamp NOT NULL DEFAULT now(),
+        PRIMARY KEY (modelo, chave)
+    );
+
+    ALTER TABLE empenho_embeddings
+    ADD COLUMN IF NOT EXISTS chave_texto char(32);
+
+    CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_chave_texto
+    ON empenho_embeddings (chave_texto);
+"""
+
+REGRAS_PADRAO = {
+    "minusculas": True,          # "MATERIAL" == "material"
+    "acentos": True,             # "EMPENHO REFERENTE À" == "EMPENHO REFERENTE A"
+    "espacos": True,             # espaços, tabs e quebras de linha colapsados
+    "pontuacao": False,          # remove pontuação ("R$ 1.000,00" → "r 1 000 00")
+    "digitos": False,            # troca números por 0 (parcelas, datas, processos)
+}
+REGRAS = {**REGRAS_PADRAO, **config.get("deduplicacao_textos", {})}
+
+_PONTUACAO = re.compile(r"[^\w\s]")
+_DIGITOS = re.compile(r"\d+")
+
+
+def normalizar_historico(texto, regras=None):
+    """Forma canônica de um historico para deduplicação (não é o texto codificado)."""
+    regras = regras or REGRAS
+    texto = unicodedata.normalize("NFC", texto or "")
+    if regras.get("acentos"):
+        texto = "".join(c for c in unicodedata.normalize("NFD", texto) if not unicodedata.combining(c))
+    if regras.get("minusculas"):
+        texto = texto.casefold()
+    if regras.get("pontuacao"):
+        texto = _PONTUACAO.sub(" ", texto)
+    if regras.get("digitos"):
+        texto = _DIGITOS.sub("0", texto)
+    if regras.get("espacos"):
+        texto = " ".join(texto.split())
+    return texto
+
+
+def chave_texto(texto, regras=None):
+    # 128 bits de blake2b em hex: colisões irrelevantes na escala da base
+    return hashlib.blake2b(normalizar_historico(texto, regras).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def buscar_embeddings(conn, modelo, chaves):
+    """{chave: embedding} das chaves já codificadas, lidos da linha representante."""
+    if not chaves:
+        return {}
+    linhas = conn.execute(
+        text("""
+            SELECT t.chave, ee.embedding
+            FROM embeddings_texto t
+            JOIN empenho_embeddings ee ON ee.ano = t.ano AND ee.idempenho = t.idempenho
+            WHERE t.modelo = :modelo AND t.chave = ANY(:chaves)
+        """),
+        {"modelo": modelo, "chaves": list(chaves)},
+    ).fetchall()
+    return {chave: para_numpy(embedding) for chave, embedding in linhas}
+
+
+def registrar_textos(conn, modelo, representantes):
+    """
+    Grava chave → empenho representante para as chaves codificadas no lote.
+    `representantes`: {chave: (ano, idempenho, texto)} de linhas já inseridas
+    em empenho_embeddings. Uma chave cujo representante sumiu é reapontada.
+    """
+    if not representantes:
+        return
+    conn.execute(
+        text("""
+            INSERT INTO embeddings_texto (modelo, chave, ano, idempenho, texto)
+            VALUES (:modelo, :chave, :ano, :idempenho, :texto)
+            ON CONFLICT (modelo, chave) DO UPDATE
+            SET ano = EXCLUDED.ano, idempenho = EXCLUDED.idempenho, texto = EXCLUDED.texto
+        """),
+        [
+            {"modelo": modelo, "chave": c, "ano": int(ano), "idempenho": idempenho, "texto": texto}
+            for c, (ano, idempenho, texto) in representantes.items()
+        ],
+    )
+
+
+def embeddings_deduplicados(conn, embedding_service, textos, batch_size=64):
+    """
+    Embeddings alinhados a `textos`, codificando só os textos cuja chave ainda
+    não está em embeddings_texto (e uma vez só cada chave repetida no lote).
+    Retorna (matriz de embeddings, lista de chaves, conjunto das chaves codificadas);
+    depois do INSERT, registrar_textos grava os representantes dessas chaves.
+    """
+    modelo = embedding_service.cache_key
+    chaves = [chave_texto(t) for t in textos]
+
+    por_chave = buscar_embeddings(conn, modelo, set(chaves))
+    novos = {}
+    for chave, texto in zip(chaves, textos):
+        if chave not in por_chave and chave not in novos:
+            novos[chave] = texto
+
+    if novos:
+        embeddings = embedding_service.encode(list(novos.values()), batch_size=batch_size)
+        por_chave.update(zip(novos, embeddings))
+
+    if not chaves:
+        return np.empty((0, DIM_EMBEDDING), dtype=np.float32), chaves, set()
+    return np.vstack([por_chave[c] for c in chaves]), chaves, set(novos)
@@ -1,7 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
+from routes.respostas import resposta_tabela
 from pydantic import BaseModel
-import pandas as pd
+from routes.db_utils import get_resumo_fracionamento, get_cluster_fracionamento, existe_fracionamento_ano
+from routes.cache_respostas import cache_respostas
 
 
 class ConsultaVSRequest(BaseModel):
@@ -13,7 +15,7 @@ class ConsultaVSRequest(BaseModel):
 router = APIRouter()
 
 @router.post("/api/fracionamentos")
-def get_table_fracionamentos(body: ConsultaVSRequest):
+async def get_table_fracionamentos(body: ConsultaVSRequest, request: Request):
     
     # Aqui você recebe os dados do frontend:
     dados_frontend = body.dict()
@@ -25,29 +27,28 @@ def get_table_fracionamentos(body: ConsultaVSRequest):
     print(f'ano requested: {ano}')
     print(f'cluster id requested: {cluster_id}')
     
-    if ano != "":
-        try:
-            table_path = f'data/fracionamento/suspeitas_fracionamento_{ano}.csv'
-            table = pd.read_csv(table_path)
-        except FileNotFoundError:
-            return JSONResponse(content={"error": f"Arquivo para o ano {ano} não encontrado."}, status_code=404)
-
-    # filtrar por id unidade
-    table_filtered = table.loc[table['idunid'].astype(str) == str(idunid)]
-    
-    
-    if cluster_id == "":
-        table_grouped = table_filtered.groupby('cluster_id').agg({
-            'cluster_size': 'first',
-            'min_sim': 'first',
-            'max_sim': 'first',
-            'valor': 'mean',
-        }).reset_index()
-        return JSONResponse(content=table_grouped.to_dict(orient='records'))
-        
-    else:
-        table_filtered = table_filtered.loc[table_filtered['cluster_id'].astype(str) == str(cluster_id)]
-        return JSONResponse(content=table_filtered.to_dict(orient='records'))
-
-
-
+    # lê da tabela clusters_fracionamento (gravada por sinalizar_fracionamento.py),
+    # indexada por (ano, idunid, cluster_id), e do resumo por cluster
+    try:
+        ano = int(ano)
+        idunid = int(idunid)
+        cluster_id = int(cluster_id) if cluster_id != "" else None
+    except ValueError:
+        return JSONResponse(content={"error": "Parâmetros ano/idunid/cluster_id inválidos."}, status_code=400)
+
+    async def consultar():
+        if cluster_id is None:
+            table = await get_resumo_fracionamento(ano, idunid)
+        else:
+            table = await get_cluster_fracionamento(ano, idunid, cluster_id)
+        existe = not table.empty or await existe_fracionamento_ano(ano)
+        return table, existe
+
+    table, existe = await cache_respostas.obter(
+        "fracionamentos", {"ano": ano, "idunid": idunid, "cluster_id": cluster_id}, consultar,
+    )
+
+    if not existe:
+        return JSONResponse(content={"error": f"Resultados para o ano {ano} não encontrados."}, status_code=404)
+
+    return resposta_tabela(request, table)
@@ -0,0 +1,84 @@
+import numpy as np
+
+
+def contar_caracteres(texto):
+    # mesma normalização do autopreenchimento original: minúsculas, sem espaços
+    contagem = {}
+    for char in texto:
+        if char != ' ':
+            c = char.lower()
+            contagem[c] = contagem.get(c, 0) + 1
+    return contagem
+
+
+class IndiceFuzzy:
+    """
+    Índice para o autopreenchimento: histograma de caracteres de cada
+    candidato guardado em uma matriz (linhas = candidatos, colunas = caracteres).
+
+    O score é o Jaccard de multiconjuntos usado antes em auto_filling.py,
+        sum(min(a, q)) / sum(max(a, q)),
+    calculado para todos os candidatos de uma vez com
+    sum(max) = |a| + |q| - sum(min). Só as colunas dos caracteres da
+    consulta são lidas.
+    """
+
+    def __init__(self, titulos):
+        self.titulos = list(titulos)
+        self.vocab = {}
+
+        contagens = [contar_caracteres(t) for t in self.titulos]
+        for contagem in contagens:
+            for c in contagem:
+                self.vocab.setdefault(c, len(self.vocab))
+
+        maximo = max((max(c.values()) for c in contagens if c), default=0)
+        dtype = np.uint8 if maximo <= np.iinfo(np.uint8).max else np.uint16
+
+        # ordem Fortran: cada coluna (caractere) é contígua
+        self.matriz = np.zeros((len(self.titulos), len(self.vocab)), dtype=dtype, order='F')
+        self.totais = np.zeros(len(self.titulos), dtype=np.int32)
+        for i, contagem in enumerate(contagens):
+            for c, n in contagem.items():
+                self.matriz[i, self.vocab[c]] = n
+            self.totais[i] = sum(contagem.values())
+
+    def __len__(self):
+        return len(self.titulos)
+
+    def scores(self, consulta, linhas=None):
+        q = contar_caracteres(consulta)
+        total_q = sum(q.values())
+        totais = self.totais if linhas is None else self.totais[linhas]
+
+        mins = np.zeros(len(totais), dtype=np.int32)
+        for c, n in q.items():
+            coluna = self.vocab.get(c)
+            if coluna is None:
+                continue  # caractere que nenhum candidato tem: só entra no max
+            valores = self.matriz[:, coluna] if linhas is None else self.matriz[linhas, coluna]
+            mins += np.minimum(valores, n)
+
+        maxs = totais + total_q - mins
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(maxs > 0, mins / maxs, 0.0)
+
+    def top_k(self, consulta, k=5, linhas=None):
+        """
+        Retorna [(titulo, score)] dos k melhores, em ordem decrescente de score.
+        Empates ficam na ordem original dos candidatos (como DataFrame.nlargest).
+        """
+        if linhas is not None:
+            linhas = np.asarray(linhas, dtype=np.intp)
+        scores = self.scores(consulta, linhas)
+        n = len(scores)
+        k = min(k, n)
+        if k == 0:
+            return []
+
+        corte = np.partition(scores, n - k)[n - k]
+        candidatos = np.flatnonzero(scores >= corte)
+        melhores = candidatos[np.lexsort((candidatos, -scores[candidatos]))][:k]
+
+        indices = melhores if linhas is None else linhas[melhores]
+        return [(self.titulos[i], float(s)) for i, s in zip(indices, scores[melhores])]
@@ -0,0 +1,318 @@
+import json
+import os
+import threading
+import numpy as np
+from sqlalchemy import text
+
+from routes.config import config
+from routes.db import engine
+from routes.pgvector_adapter import para_numpy
+from routes.versao_dados import obter_versao
+
+# Índice HNSW em processo (hnswlib), alternativa ao pgvector na busca da API.
+#
+# Arquivos em `diretorio` (gerados por construir_indice_local.py):
+#   ano_<ano>.hnsw       grafo HNSW (hnswlib.save_index)
+#   ano_<ano>_ids.npy    idempenho de cada rótulo (rótulo = posição), lido com mmap;
+#                        os primeiros `ordenados[ano]` estão em ordem crescente
+#   meta.json            dimensão, parâmetros e marca d'água (max criado_em)
+#
+# Um índice por ano, como as partições de empenho_embeddings: consultas de um
+# ano só percorrem o grafo daquele ano; sem ano, os resultados são mesclados.
+#
+# criado_em é o início da transação que gravou a linha, não o commit: uma
+# carga concorrente pode ficar visível com criado_em anterior à marca. A
+# atualização incremental relê uma janela antes da marca
+# (indice_local_janela_s) e descarta os idempenhos que o ano já tem.
+#
+# buscar() segura o lock (a atualização também, por pedaços): quem chama de
+# código async usa asyncio.to_thread.
+
+# vetores adicionados por aquisição do lock: limita a espera de buscar()
+# enquanto a atualização em segundo plano insere no grafo
+LOTE_ADICAO = 1000
+
+
+def caminho_indice(diretorio, ano):
+    return os.path.join(diretorio, f"ano_{ano}.hnsw")
+
+
+def caminho_ids(diretorio, ano):
+    return os.path.join(diretorio, f"ano_{ano}_ids.npy")
+
+
+def caminho_meta(diretorio):
+    return os.path.join(diretorio, "meta.json")
+
+
+def novo_indice(dim, capacidade, m=16, ef_construction=64):
+    import hnswlib  # dependência opcional (backend 'local')
+
+    indice = hnswlib.Index(space="cosine", dim=dim)
+    indice.init_index(max_elements=max(capacidade, 1), M=m, ef_construction=ef_construction)
+    return indice
+
+
+class IndiceAno:
+    """Grafo HNSW de um ano + mapa rótulo → idempenho."""
+
+    def __init__(self, indice, ids, n_ordenados=None):
+        self.indice = indice
+        # ids persistidos (mmap, somente leitura) + adicionados depois da carga
+        self.ids = ids
+        self.ids_extra = []
+        # prefixo ordenado de ids (busca binária); o resto fica num set
+        self.n_ordenados = len(ids) if n_ordenados is None else n_ordenados
+        self._avulsos = {str(i) for i in ids[self.n_ordenados:]}
+
+    def __len__(self):
+        return len(self.ids) + len(self.ids_extra)
+
+    def idempenho(self, rotulo):
+        rotulo = int(rotulo)
+        if rotulo < len(self.ids):
+            return str(self.ids[rotulo])
+        return self.ids_extra[rotulo - len(self.ids)]
+
+    def contem(self, idempenho):
+        if idempenho in self._avulsos:
+            return True
+        ordenados = self.ids[:self.n_ordenados]
+        i = int(np.searchsorted(ordenados, idempenho))
+        return i < len(ordenados) and ordenados[i] == idempenho
+
+    def adicionar(self, idempenhos, vetores):
+        n_atual = len(self)
+        necessario = n_atual + len(idempenhos)
+        if necessario > self.indice.get_max_elements():
+            # cresce com folga para não redimensionar a cada lote
+            self.indice.resize_index(max(necessario, int(self.indice.get_max_elements() * 1.5)))
+        self.indice.add_items(vetores, np.arange(n_atual, necessario))
+        self.ids_extra.extend(str(i) for i in idempenhos)
+        self._avulsos.update(str(i) for i in idempenhos)
+
+    def todos_ids(self):
+        return np.concatenate([np.asarray(self.ids), np.asarray(self.ids_extra, dtype=str)]) \
+            if self.ids_extra else np.asarray(self.ids)
+
+
+class IndiceLocal:
+    """
+    Índices HNSW por ano carregados na API. Atualizado em segundo plano quando
+    versao_dados muda: busca em empenho_embeddings as linhas com criado_em
+    posterior à marca d'água menos a janela e adiciona as que faltam (add
+    incremental, em memória).
+    """
+
+    def __init__(self, diretorio, ef_search=64, intervalo_verificacao_s=60, janela_s=600):
+        self.diretorio = diretorio
+        self.ef_search = ef_search
+        self.intervalo_verificacao_s = intervalo_verificacao_s
+        self.janela_s = janela_s
+        self.anos = {}
+        self.dim = None
+        self.m = 16
+        self.ef_construction = 64
+        self.marca = None
+        self.versao = None
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Carga e persistência
+    # ------------------------------------------------------------------
+    def carregar(self):
+        import hnswlib
+
+        with open(caminho_meta(self.diretorio), encoding="utf-8") as f:
+            meta = json.load(f)
+        anos = {}
+        for ano in meta["anos"]:
+            ano = int(ano)
+            indice = hnswlib.Index(space="cosine", dim=meta["dim"])
+            indice.load_index(caminho_indice(self.diretorio, ano))
+            ids = np.load(caminho_ids(self.diretorio, ano), mmap_mode="r")
+            # meta antigo, sem "ordenados": todos os ids vão para o set
+            anos[ano] = IndiceAno(indice, ids, meta.get("ordenados", {}).get(str(ano), 0))
+
+        with self._lock:
+            self.anos = anos
+            self.dim = meta["dim"]
+            self.m = meta.get("m", 16)
+            self.ef_construction = meta.get("ef_construction", 64)
+            self.marca = meta.get("marca")
+        total = sum(len(a) for a in anos.values())
+        print(f"[INFO] Índice local carregado: {len(anos)} anos, {total} vetores")
+
+    def salvar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        with self._lock:
+            for ano, indice_ano in self.anos.items():
+                indice_ano.indice.save_index(caminho_indice(self.diretorio, ano))
+                np.save(caminho_ids(self.diretorio, ano), indice_ano.todos_ids())
+            meta = {
+                "dim": self.dim,
+                "m": self.m,
+                "ef_construction": self.ef_construction,
+                "marca": self.marca,
+                "anos": {str(ano): len(a) for ano, a in sorted(self.anos.items())},
+                "ordenados": {str(ano): a.n_ordenados for ano, a in sorted(self.anos.items())},
+            }
+        with open(caminho_meta(self.diretorio), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+    def adicionar(self, ano, idempenhos, vetores):
+        """Adiciona os idempenhos que o ano ainda não tem; retorna quantos entraram."""
+        vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+        indice_ano = self.anos.get(ano)
+        if indice_ano is not None:
+            # só a thread de atualização escreve: ler fora do lock é seguro
+            faltam = [i for i, idempenho in enumerate(idempenhos) if not indice_ano.contem(str(idempenho))]
+            idempenhos = [idempenhos[i] for i in faltam]
+            vetores = vetores[faltam]
+        for inicio in range(0, len(idempenhos), LOTE_ADICAO):
+            fim = inicio + LOTE_ADICAO
+            with self._lock:
+                if self.dim is None:
+                    self.dim = vetores.shape[1]
+                indice_ano = self.anos.get(ano)
+                if indice_ano is None:
+                    indice = novo_indice(self.dim, len(idempenhos), self.m, self.ef_construction)
+                    indice_ano = self.anos[ano] = IndiceAno(indice, np.empty(0, dtype=str))
+                indice_ano.adicionar(idempenhos[inicio:fim], vetores[inicio:fim])
+        return len(idempenhos)
+
+    def atualizar_incremental(self, lote=10000):
+        """
+        Adiciona as linhas de empenho_embeddings criadas depois da marca d'água,
+        relendo a janela anterior a ela para pegar commits atrasados.
+        """
+        novos = 0
+        with engine.connect() as conn:
+            self.versao = obter_versao(conn)
+            resultado = conn.execution_options(stream_results=True, max_row_buffer=lote).execute(
+                text("""
+                    SELECT idempenho, ano, embedding, criado_em
+                    FROM empenho_embeddings
+                    WHERE (CAST(:marca AS timestamp) IS NULL
+                           OR criado_em > CAST(:marca AS timestamp) - make_interval(secs => :janela))
+                    ORDER BY criado_em
+                """),
+                {"marca": self.marca, "janela": self.janela_s},
+            )
+            while True:
+                linhas = resultado.fetchmany(lote)
+                if not linhas:
+                    break
+                por_ano = {}
+                for idempenho, ano, embedding, _ in linhas:
+                    ids, vetores = por_ano.setdefault(int(ano), ([], []))
+                    ids.append(idempenho)
+                    vetores.append(para_numpy(embedding))
+                for ano, (ids, vetores) in por_ano.items():
+                    novos += self.adicionar(ano, ids, np.vstack(vetores))
+                # a janela relê linhas anteriores: a marca nunca recua
+                ultima = linhas[-1][3].isoformat()
+                if self.marca is None or ultima > self.marca:
+                    self.marca = ultima
+        return novos
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def disponivel(self, ano=None):
+        if ano is None:
+            return bool(self.anos)
+        return ano in self.anos
+
+    def buscar(self, vetor, k, ano=None):
+        """
+        k vizinhos mais próximos (distância cosseno, como o <=> do pgvector).
+        Retorna (lista de idempenho, array de distâncias) em ordem crescente.
+        """
+        vetor = np.ascontiguousarray(vetor, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            alvos = [self.anos[ano]] if ano is not None else list(self.anos.values())
+            ids, distancias = [], []
+            for indice_ano in alvos:
+                n = len(indice_ano)
+                if n == 0:
+                    continue
+                kk = min(k, n)
+                # HNSW devolve no máximo ef vizinhos
+                indice_ano.indice.set_ef(max(self.ef_search, kk))
+                rotulos, dist = indice_ano.indice.knn_query(vetor, k=kk)
+                ids.extend(indice_ano.idempenho(r) for r in rotulos[0])
+                distancias.append(dist[0])
+
+        if not ids:
+            return [], np.empty(0, dtype=np.float32)
+        distancias = np.concatenate(distancias)
+        ordem = np.argsort(distancias, kind="stable")[:k]
+        return [ids[i] for i in ordem], distancias[ordem]
+
+    # ------------------------------------------------------------------
+    # Atualização em segundo plano
+    # ------------------------------------------------------------------
+    def _verificar_versao(self):
+        while not self._parar.wait(self.intervalo_verificacao_s):
+            try:
+                with engine.connect() as conn:
+                    versao = obter_versao(conn)
+                if versao != self.versao:
+                    novos = self.atualizar_incremental()
+                    if novos:
+                        print(f"[INFO] Índice local: {novos} vetores adicionados")
+            except Exception as exc:
+                print(f"[WARN] Falha ao atualizar índice local: {exc}")
+
+    def iniciar(self):
+        """
+        Carrega o índice construído offline (construir_indice_local.py) e só
+        então acompanha as linhas novas. Sem índice salvo (ou sem marca
+        d'água), `anos` fica vazio e as buscas seguem no pgvector: a API nunca
+        varre empenho_embeddings inteira para montar os grafos.
+        """
+        if not os.path.exists(caminho_meta(self.diretorio)):
+            print(f"[WARN] Índice local não encontrado em {self.diretorio}; "
+                  "rode construir_indice_local.py (buscas seguem no pgvector)")
+            return
+        try:
+            self.carregar()
+        except Exception as exc:
+            with self._lock:
+                self.anos = {}
+            print(f"[WARN] Falha ao carregar índice local ({exc}); buscas seguem no pgvector")
+            return
+        if self.marca is None:
+            print("[WARN] Índice local sem marca d'água; reconstrua com construir_indice_local.py "
+                  "(sem atualização incremental)")
+            return
+
+        try:
+            self.atualizar_incremental()
+        except Exception as exc:
+            print(f"[WARN] Falha na atualização incremental do índice local: {exc}")
+
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._verificar_versao, name="indice-local", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+
+_indice_config = config.get("busca_vetorial", {})
+USAR_INDICE_LOCAL = _indice_config.get("backend", "pgvector") == "local"
+
+# instância única da API (carregada no lifespan quando backend = 'local')
+indice_local = IndiceLocal(
+    diretorio=_indice_config.get("indice_local_dir", "data/indice_ann"),
+    ef_search=_indice_config.get("hnsw_ef_search", 64),
+    intervalo_verificacao_s=_indice_config.get("indice_local_intervalo_s", 60),
+    janela_s=_indice_config.get("indice_local_janela_s", 600),
+)
@@ -0,0 +1,111 @@
+import os
+import time
+from contextlib import contextmanager
+
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, REGISTRY,
+)
+
+# Métricas Prometheus da API.
+# Com vários workers (gunicorn), definir PROMETHEUS_MULTIPROC_DIR para agregar
+# as métricas de todos os processos em /metrics.
+
+# buckets de latência: de 1 ms (cache/embedding) a 30 s (consultas sem índice)
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LATENCIA_ROTA = Histogram(
+    "nemesis_http_request_duration_seconds",
+    "Latência total das requisições por rota",
+    ["method", "rota", "status"],
+    buckets=BUCKETS_LATENCIA,
+)
+
+LATENCIA_ETAPA = Histogram(
+    "nemesis_etapa_duration_seconds",
+    "Latência por etapa (embedding, sql, pandas, serializacao) e operação",
+    ["etapa", "operacao"],
+    buckets=BUCKETS_LATENCIA,
+)
+
+LINHAS_RETORNADAS = Counter(
+    "nemesis_linhas_retornadas_total",
+    "Linhas devolvidas pelo banco por operação",
+    ["operacao"],
+)
+
+CACHE_EVENTOS = Counter(
+    "nemesis_cache_total",
+    "Consultas aos caches por resultado (hit, miss, single_flight)",
+    ["cache", "resultado"],
+)
+
+# batcher de embeddings (routes/embedding_batcher.py); com vários workers a
+# fila é somada entre os processos vivos
+FILA_EMBEDDINGS = Gauge(
+    "nemesis_embedding_batcher_fila",
+    "Consultas aguardando na fila do batcher de embeddings",
+    multiprocess_mode="livesum",
+)
+
+TAMANHO_LOTE_EMBEDDINGS = Histogram(
+    "nemesis_embedding_batcher_lote_tamanho",
+    "Consultas por lote enviado ao modelo pelo batcher de embeddings",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+
+@contextmanager
+def medir(etapa, operacao):
+    """Cronometra um trecho: `with medir("sql", "search_db"): ...`"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        LATENCIA_ETAPA.labels(etapa, operacao).observe(time.perf_counter() - inicio)
+
+
+def contar_linhas(operacao, n):
+    LINHAS_RETORNADAS.labels(operacao).inc(n)
+
+
+def contar_cache(cache, resultado):
+    CACHE_EVENTOS.labels(cache, resultado).inc()
+
+
+def registrar_fila_embeddings(n):
+    FILA_EMBEDDINGS.set(n)
+
+
+def registrar_lote_embeddings(n):
+    TAMANHO_LOTE_EMBEDDINGS.observe(n)
+
+
+async def middleware_metricas(request: Request, call_next):
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # template da rota (/api/consulta_vs), não o caminho bruto, para não explodir a cardinalidade
+        rota = request.scope.get("route")
+        nome = rota.path if rota is not None else "nao_encontrada"
+        LATENCIA_ROTA.labels(request.method, nome, str(status)).observe(time.perf_counter() - inicio)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,27 +1,186 @@
-from transformers import AutoTokenizer, AutoModel
-import torch
+import asyncio
+import numpy as np
 
+from routes.config import config
+from routes.embedding_cache import embedding_cache, normalizar_texto
+from routes.metricas import medir
+from routes.pgvector_adapter import normalizar_vetores
 
+# torch e transformers são importados só ao carregar o modelo: importar este
+# módulo (e as rotas que o usam) é barato; o custo fica no lifespan da API.
 
-def create_embeddings(samples, model, tokenizer, batch_size=64):
-    all_embeddings = []
+# mesmo limite de tokens usado pelo SentenceTransformer deste modelo
+MAX_SEQ_LENGTH = 128
 
-    for i in range(0, len(samples), batch_size):
-        batch = samples[i:i+batch_size].tolist()
-        inputs = tokenizer(batch, padding=True, truncation=True, return_tensors='pt')
+
+def mean_pooling(last_hidden_state, attention_mask):
+    # média só sobre tokens reais (ignora padding), como no SentenceTransformer
+    mask = attention_mask.unsqueeze(-1).to(last_hidden_state.dtype)
+    return (last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+
+class TorchEncoder:
+    """Encoder PyTorch fp32 (eager)."""
+
+    def __init__(self, model_name, intra_op_threads=0):
+        import torch
+        from transformers import AutoModel
+
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+        self.dim = self.model.config.hidden_size
+
+    def __call__(self, inputs):
+        import torch
+
+        tensors = {k: torch.from_numpy(v) for k, v in inputs.items()}
         with torch.no_grad():
-            outputs = model(**inputs)
-            embeddings = outputs.last_hidden_state.mean(dim=1)  # Average pooling
-            all_embeddings.append(embeddings)
+            outputs = self.model(**tensors)
+            embeddings = mean_pooling(outputs.last_hidden_state, tensors['attention_mask'])
+        return embeddings.numpy().astype(np.float32)
+
+
+class EmbeddingService:
+    """
+    Serviço único de embeddings: um modelo/tokenizer por processo,
+    usado pela API (app.state.embedding_service) e pelos scripts offline.
+    O backend de inferência (torch ou onnx) vem da seção embedding_model do config.yaml.
+    """
+
+    def __init__(self, model_config=None):
+        model_config = model_config or config['embedding_model']
+        self.model_name = model_config['name']
+        self.backend = model_config.get('backend', 'torch')
+        self.quantize = bool(model_config.get('quantize', False)) and self.backend == 'onnx'
+        self.max_seq_length = model_config.get('max_seq_length', MAX_SEQ_LENGTH)
+        intra_op_threads = model_config.get('intra_op_threads', 0)
+
+        print(f'Carregando modelo {self.model_name} (backend {self.backend})...')
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+
+        if self.backend == 'onnx':
+            from routes.onnx_backend import OnnxEncoder
+            self.encoder = OnnxEncoder(
+                self.model_name,
+                model_config.get('onnx_dir', 'data/onnx'),
+                quantize=self.quantize,
+                intra_op_threads=intra_op_threads,
+            )
+        elif self.backend == 'torch':
+            self.encoder = TorchEncoder(self.model_name, intra_op_threads)
+        else:
+            raise ValueError(f"Backend de embeddings desconhecido: {self.backend}")
+
+        # backends diferentes geram vetores ligeiramente diferentes: não compartilham cache
+        self.cache_key = f"{self.model_name}:{self.backend}{'-int8' if self.quantize else ''}"
+        self.batcher = None
+
+    def aquecer(self, textos=("aquecimento do modelo",)):
+        """
+        Inferência de aquecimento (fora do cache): aloca buffers e compila
+        kernels antes da primeira requisição real.
+        """
+        self.encode(list(textos))
+
+    def iniciar_batcher(self, max_batch_size=32, max_wait_ms=5):
+        # consultas concorrentes passam a ser agrupadas em lotes (ver embedding_batcher.py)
+        from routes.embedding_batcher import EmbeddingBatcher
+        self.batcher = EmbeddingBatcher(self.encode, max_batch_size, max_wait_ms)
+        return self.batcher
+
+    def encerrar_batcher(self):
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+
+    @property
+    def model(self):
+        # modelo torch (apenas backend 'torch')
+        return getattr(self.encoder, 'model', None)
+
+    def encode(self, textos, batch_size=64):
+        all_embeddings = []
+
+        for i in range(0, len(textos), batch_size):
+            batch = list(textos[i:i+batch_size])
+            with medir("embedding", self.backend):
+                inputs = self.tokenizer(batch, padding=True, truncation=True,
+                                        max_length=self.max_seq_length, return_tensors='np')
+                all_embeddings.append(self.encoder(dict(inputs)))
+
+        if not all_embeddings:
+            return np.empty((0, self.encoder.dim), dtype=np.float32)
+        # norma 1: consultas e vetores gravados comparados por produto interno
+        return normalizar_vetores(np.concatenate(all_embeddings, axis=0))
+
+    def _encode_um(self, texto):
+        if self.batcher is not None:
+            return self.batcher.encode(texto)
+        return self.encode([texto])[0]
+
+    def encode_query(self, texto):
+        # embeddings de consulta passam pelo cache compartilhado
+        return embedding_cache.get_or_compute(texto, self.cache_key, self._encode_um)
+
+    async def encode_query_async(self, texto):
+        # versão para rotas async: o forward roda fora do event loop
+        embedding = embedding_cache.get(texto, self.cache_key)
+        if embedding is None:
+            normalizado = normalizar_texto(texto)
+            if self.batcher is not None:
+                embedding = await self.batcher.encode_async(normalizado)
+            else:
+                embedding = (await asyncio.to_thread(self.encode, [normalizado]))[0]
+            embedding_cache.put(texto, self.cache_key, embedding)
+        return embedding
+
+    async def encode_queries_async(self, textos):
+        """
+        Vários textos de consulta de uma vez: hits do cache e um único forward
+        (fora do event loop) para os textos que faltam, sem passar pelo batcher.
+        """
+        embeddings = [embedding_cache.get(texto, self.cache_key) for texto in textos]
+        faltantes = list(dict.fromkeys(
+            normalizar_texto(texto) for texto, emb in zip(textos, embeddings) if emb is None
+        ))
+        if faltantes:
+            novos = await asyncio.to_thread(self.encode, faltantes, len(faltantes))
+            por_texto = dict(zip(faltantes, novos))
+            for i, texto in enumerate(textos):
+                if embeddings[i] is None:
+                    embeddings[i] = por_texto[normalizar_texto(texto)]
+                    embedding_cache.put(texto, self.cache_key, embeddings[i])
+        return embeddings
+
+
+# ======================================================
+# Modelo pré-carregado (gunicorn com preload, ver gunicorn_conf.py)
+# ======================================================
+# Carregado uma vez no processo mestre; os workers herdam os pesos via fork e
+# as páginas ficam compartilhadas (copy-on-write) enquanto ninguém as escreve.
+_servico_pre_carregado = None
+
+
+def pre_carregar_modelo(model_config=None):
+    """
+    Carrega o EmbeddingService no processo atual para ser herdado pelos workers.
+    Não roda inferência aqui: o pool de threads do torch/onnxruntime não
+    sobrevive ao fork, então batcher e warmup ficam para cada worker.
+    """
+    global _servico_pre_carregado
+    model_config = model_config or config['embedding_model']
+    if model_config.get('backend', 'torch') != 'torch':
+        # sessões do onnxruntime não são seguras após fork: cada worker carrega a sua
+        print('[INFO] Pré-carga só se aplica ao backend torch; workers carregam o modelo.')
+        return None
+    # threads do torch são definidas por worker (post_fork), não no mestre
+    _servico_pre_carregado = EmbeddingService({**model_config, 'intra_op_threads': 0})
+    return _servico_pre_carregado
 
-    return torch.cat(all_embeddings, dim=0).numpy()
 
+def servico_pre_carregado():
+    return _servico_pre_carregado
 
-def load_model_tokenizer():
-    # Load a pre-trained transformer model for embeddings
-    print('Loading model..')
-    model_name = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModel.from_pretrained(model_name)
-    
-    return model, tokenizer
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import onnxruntime as ort
+
+
+def mean_pooling_np(last_hidden_state, attention_mask):
+    # mesma média mascarada do backend torch, em numpy
+    mask = attention_mask[..., None].astype(last_hidden_state.dtype)
+    soma = (last_hidden_state * mask).sum(axis=1)
+    return soma / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def caminho_onnx(model_name, onnx_dir, quantize=False):
+    nome = model_name.replace("/", "__")
+    sufixo = "-int8" if quantize else ""
+    return os.path.join(onnx_dir, f"{nome}{sufixo}.onnx")
+
+
+def exportar_onnx(model_name, onnx_dir, quantize=False):
+    """
+    Exporta o modelo HF para ONNX (fp32) e, se pedido, gera a versão
+    com quantização dinâmica int8. Retorna o caminho do arquivo a carregar.
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModel
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    fp32_path = caminho_onnx(model_name, onnx_dir)
+
+    if not os.path.exists(fp32_path):
+        print(f"Exportando {model_name} para ONNX em {fp32_path}...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+
+        exemplo = tokenizer(["nota de empenho"], return_tensors="pt")
+        input_names = list(exemplo.keys())
+        dynamic_axes = {nome: {0: "batch", 1: "seq"} for nome in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dict(exemplo),),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+
+    if not quantize:
+        return fp32_path
+
+    int8_path = caminho_onnx(model_name, onnx_dir, quantize=True)
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        print(f"Quantizando (int8 dinâmico) para {int8_path}...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxEncoder:
+    """
+    Encoder via ONNX Runtime (CPU). Exporta o modelo na primeira execução
+    se o arquivo .onnx ainda não existir.
+    """
+
+    def __init__(self, model_name, onnx_dir, quantize=False, intra_op_threads=0):
+        path = exportar_onnx(model_name, onnx_dir, quantize=quantize)
+
+        opcoes = ort.SessionOptions()
+        opcoes.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            opcoes.intra_op_num_threads = intra_op_threads
+            opcoes.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(path, opcoes, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        # dimensão do embedding: último eixo de last_hidden_state (fixo no grafo exportado)
+        saida = next(o for o in self.session.get_outputs() if o.name == "last_hidden_state")
+        self.dim = saida.shape[-1] if isinstance(saida.shape[-1], int) else None
+        if self.dim is None:
+            from transformers import AutoConfig
+            self.dim = AutoConfig.from_pretrained(model_name).hidden_size
+
+    def __call__(self, inputs):
+        feed = {nome: inputs[nome].astype(np.int64) for nome in self.input_names}
+        last_hidden_state = self.session.run(["last_hidden_state"], feed)[0]
+        return mean_pooling_np(last_hidden_state, inputs["attention_mask"]).astype(np.float32)
@@ -0,0 +1,76 @@
+import json
+import numpy as np
+import psycopg
+from sqlalchemy import event
+from pgvector import Vector, HalfVector
+from pgvector.psycopg import register_vector
+
+from routes.config import config
+
+# Armazenamento dos embeddings (armazenamento_embeddings no config.yaml):
+# uma única coluna empenho_embeddings.embedding, normalizada (norma L2 = 1)
+# na escrita. Com vetores unitários, distância cosseno = 1 + (a <#> b): as
+# consultas usam o produto interno (<#>, índice *_ip_ops) e o numpy um simples
+# produto escalar. 'halfvec' guarda em float16 (metade do espaço de 'vector').
+TIPO_VETOR = config.get("armazenamento_embeddings", {}).get("tipo", "halfvec")
+if TIPO_VETOR not in ("halfvec", "vector"):
+    raise ValueError("armazenamento_embeddings.tipo deve ser 'halfvec' ou 'vector'")
+DIM_EMBEDDING = 384
+
+
+def registrar_pgvector(engine):
+    """
+    Registra os adaptadores do pgvector em cada conexão nova do engine
+    (driver psycopg 3). Arrays numpy passados como parâmetro seguem como
+    vector em formato binário, sem formatação/parse de texto.
+    """
+    @event.listens_for(engine, "connect")
+    def _registrar(dbapi_connection, connection_record):
+        try:
+            register_vector(dbapi_connection)
+        except psycopg.ProgrammingError:
+            # extensão vector ainda não criada (ex.: primeira execução de generate_embeddings.py)
+            dbapi_connection.rollback()
+
+    return engine
+
+
+def normalizar_vetores(embeddings):
+    # norma L2 = 1 por linha (aceita um vetor 1-D ou uma matriz)
+    x = np.asarray(embeddings, dtype=np.float32)
+    normas = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(normas, 1e-12)
+
+
+def ordem_vetorial(coluna, param):
+    """
+    Produto interno negativo entre a coluna e o parâmetro: chave do
+    ORDER BY que usa o índice ANN. Parâmetro convertido para TIPO_VETOR.
+    """
+    return f"({coluna} <#> CAST({param} AS {TIPO_VETOR}))"
+
+
+def distancia_vetorial(coluna, param):
+    # distância cosseno (mesma escala do antigo <=>) para vetores normalizados
+    return f"(1 + {ordem_vetorial(coluna, param)})"
+
+
+def vetor_param(embedding):
+    # parâmetro de consulta: numpy float32 1-D contíguo
+    return np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
+
+
+def vetores_param(embeddings):
+    # parâmetro vector[]/halfvec[]: cada item embrulhado em Vector/HalfVector, senão
+    # o driver trataria o array numpy como mais uma dimensão do array SQL
+    tipo = HalfVector if TIPO_VETOR == "halfvec" else Vector
+    return [tipo(vetor_param(e)) for e in embeddings]
+
+
+def para_numpy(valor):
+    # converte o que vier do banco (Vector, float4[], texto '[...]') em numpy float32
+    if hasattr(valor, "to_numpy"):
+        return valor.to_numpy().astype(np.float32, copy=False)
+    if isinstance(valor, str):
+        valor = json.loads(valor)
+    return np.asarray(valor, dtype=np.float32)
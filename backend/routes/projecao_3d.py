@@ -0,0 +1,72 @@
+import os
+import numpy as np
+
+from routes.config import config
+
+# Projeção 3D dos embeddings (empenho_embeddings.embedding_reduced) usada por
+# /api/empenhos-3d. É uma PCA ajustada em lote por reprojetar_3d.py
+# (IncrementalPCA, lendo a base em partes) e salva como .npz: média e
+# componentes. Aplicar a projeção é só (X - média) @ componentesᵀ, então
+# generate_embeddings.py projeta cada lote novo na hora do INSERT, sem sklearn.
+
+CAMINHO_PROJECAO = config.get("projecao_3d", {}).get("caminho", "data/projecao_3d.npz")
+
+
+class Projecao3D:
+    def __init__(self, media, componentes, variancia_explicada=None):
+        self.media = np.asarray(media, dtype=np.float32)
+        self.componentes = np.asarray(componentes, dtype=np.float32)
+        self.variancia_explicada = (
+            np.asarray(variancia_explicada, dtype=np.float32) if variancia_explicada is not None else None
+        )
+
+    def projetar(self, embeddings):
+        """(n, 384) → (n, 3) float32, vetorizado."""
+        x = np.asarray(embeddings, dtype=np.float32)
+        return (x - self.media) @ self.componentes.T
+
+    def salvar(self, caminho=CAMINHO_PROJECAO):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        dados = {"media": self.media, "componentes": self.componentes}
+        if self.variancia_explicada is not None:
+            dados["variancia_explicada"] = self.variancia_explicada
+        np.savez(caminho, **dados)
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_PROJECAO):
+        with np.load(caminho) as dados:
+            return cls(
+                dados["media"],
+                dados["componentes"],
+                dados["variancia_explicada"] if "variancia_explicada" in dados else None,
+            )
+
+    @classmethod
+    def ajustar(cls, lotes, n_componentes=3):
+        """
+        Ajusta a PCA com IncrementalPCA sobre um iterável de matrizes (n, 384),
+        sem carregar a base inteira em memória. Lotes menores que n_componentes
+        são acumulados com o seguinte.
+        """
+        from sklearn.decomposition import IncrementalPCA  # só no job de ajuste
+
+        ipca = IncrementalPCA(n_components=n_componentes)
+        pendente = None
+        for lote in lotes:
+            lote = np.asarray(lote, dtype=np.float32)
+            if pendente is not None:
+                lote, pendente = np.vstack([pendente, lote]), None
+            if len(lote) < n_componentes:
+                pendente = lote
+                continue
+            ipca.partial_fit(lote)
+        if not hasattr(ipca, "components_"):
+            raise ValueError("dados insuficientes para ajustar a projeção 3D")
+        return cls(ipca.mean_, ipca.components_, ipca.explained_variance_ratio_)
+
+
+def carregar_projecao(caminho=CAMINHO_PROJECAO):
+    """Projeção salva ou None se ainda não foi ajustada (rodar reprojetar_3d.py)."""
+    if not os.path.exists(caminho):
+        return None
+    return Projecao3D.carregar(caminho)
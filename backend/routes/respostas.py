@@ -0,0 +1,104 @@
+import decimal
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import Response, StreamingResponse
+
+from routes.metricas import medir
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+NDJSON_MIME = "application/x-ndjson"
+
+
+def _default(obj):
+    # tipos que o orjson não serializa nativamente
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if hasattr(obj, "to_list"):  # pgvector Vector/HalfVector
+        return obj.to_list()
+    raise TypeError(f"Tipo não serializável: {type(obj)}")
+
+
+class ORJSONResponse(Response):
+    """JSONResponse codificado com orjson (Decimal, numpy e datas incluídos)."""
+
+    media_type = "application/json"
+
+    def render(self, content):
+        with medir("serializacao", "json"):
+            return orjson.dumps(
+                content,
+                default=_default,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            )
+
+
+def colunas_df(df):
+    # DataFrame -> {coluna: lista de valores Python}
+    return {c: df[c].tolist() for c in df.columns}
+
+
+def registros(colunas):
+    """Monta a lista de dicts coluna a coluna (sem iterrows / iloc por linha)."""
+    nomes = list(colunas)
+    valores = [v.tolist() if hasattr(v, "tolist") else list(v) for v in colunas.values()]
+    return [dict(zip(nomes, linha)) for linha in zip(*valores)]
+
+
+def aceita_arrow(request):
+    return ARROW_MIME in request.headers.get("accept", "")
+
+
+def resposta_arrow(colunas, metadados=None):
+    with medir("serializacao", "arrow"):
+        return _resposta_arrow(colunas, metadados)
+
+
+def _resposta_arrow(colunas, metadados):
+    import pyarrow as pa
+
+    if isinstance(colunas, pd.DataFrame):
+        tabela = pa.Table.from_pandas(colunas, preserve_index=False)
+    else:
+        tabela = pa.table({k: v for k, v in colunas.items()})
+    if metadados:
+        tabela = tabela.replace_schema_metadata({
+            k: orjson.dumps(v, default=_default) for k, v in metadados.items()
+        })
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabela.schema) as writer:
+        writer.write_table(tabela)
+    return Response(sink.getvalue().to_pybytes(), media_type=ARROW_MIME)
+
+
+def resposta_tabela(request, colunas, conteudo=None, metadados=None, status_code=200):
+    """
+    Resposta para endpoints tabulares/nuvens de pontos.
+
+    Se o cliente pedir `Accept: application/vnd.apache.arrow.stream`, devolve
+    as colunas em Arrow IPC (metadados vão no schema). Caso contrário devolve
+    JSON via orjson: `conteudo` se informado, ou a lista de registros montada
+    a partir das colunas.
+    """
+    if aceita_arrow(request):
+        return resposta_arrow(colunas, metadados)
+    if conteudo is None:
+        if isinstance(colunas, pd.DataFrame):
+            colunas = colunas_df(colunas)
+        conteudo = registros(colunas)
+    return ORJSONResponse(content=conteudo, status_code=status_code)
+
+
+def resposta_ndjson(itens, headers=None):
+    """Streaming de um gerador async de dicts, um objeto JSON por linha."""
+
+    async def _linhas():
+        async for item in itens:
+            yield orjson.dumps(item, default=_default, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+    return StreamingResponse(_linhas(), media_type=NDJSON_MIME, headers=headers)
@@ -0,0 +1,36 @@
+from sqlalchemy import text
+
+# Resumo por cluster de clusters_fracionamento, lido por /api/fracionamentos.
+# Módulo sem dependências da API (pool asyncpg, métricas): importado pelo job
+# offline auditoria/sinalizar_fracionamento.py e por routes/db_utils.py.
+
+# mesma definição de sql/clusters_fracionamento.sql
+DDL_RESUMO_FRACIONAMENTO = """
+    CREATE INDEX IF NOT EXISTS idx_clusters_fracionamento_ano_unid_cluster
+        ON clusters_fracionamento (ano, idunid, cluster_id);
+    CREATE TABLE IF NOT EXISTS resumo_clusters_fracionamento (
+        ano           INT,
+        idunid        BIGINT,
+        cluster_id    BIGINT,
+        cluster_size  INT,
+        min_sim       FLOAT,
+        max_sim       FLOAT,
+        valor         NUMERIC(18,2),
+        PRIMARY KEY (ano, idunid, cluster_id)
+    );
+"""
+
+
+def atualizar_resumo_fracionamento(conn, ano):
+    # recalcula o resumo por cluster de um ano (chamar dentro de engine.begin())
+    conn.execute(text(DDL_RESUMO_FRACIONAMENTO))
+    conn.execute(text("DELETE FROM resumo_clusters_fracionamento WHERE ano = :ano"), {"ano": ano})
+    conn.execute(text("""
+        INSERT INTO resumo_clusters_fracionamento
+            (ano, idunid, cluster_id, cluster_size, min_sim, max_sim, valor)
+        SELECT ano, idunid, cluster_id,
+               MAX(cluster_size), MAX(min_sim), MAX(max_sim), AVG(valor)
+        FROM clusters_fracionamento
+        WHERE ano = :ano
+        GROUP BY ano, idunid, cluster_id
+    """), {"ano": ano})
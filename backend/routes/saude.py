@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Request
+from routes.respostas import ORJSONResponse
+
+# Probes do balanceador:
+#   /health/live  → o processo responde (não depende de modelo nem banco);
+#                   503 se a inicialização falhou de vez, para o processo ser reiniciado
+#   /health/ready → modelo carregado e aquecido, pool e catálogo prontos
+
+router = APIRouter()
+
+
+@router.get("/health/live")
+def health_live(request: Request):
+    erro = getattr(request.app.state, "erro_inicializacao", None)
+    if erro is not None:
+        return ORJSONResponse(content={"status": "erro", "erro": erro}, status_code=503)
+    return {"status": "ok"}
+
+
+@router.get("/health/ready")
+def health_ready(request: Request):
+    estado = request.app.state
+    if getattr(estado, "pronto", False):
+        return {"status": "pronto"}
+    return ORJSONResponse(
+        content={
+            "status": "carregando" if getattr(estado, "erro_inicializacao", None) is None else "erro",
+            "etapa": getattr(estado, "etapa_inicializacao", None),
+            "erro": getattr(estado, "erro_inicializacao", None),
+        },
+        status_code=503,
+    )
+
+
+def obter_embedding_service(request: Request):
+    # rotas que precisam do modelo respondem 503 enquanto ele carrega
+    embedding_service = getattr(request.app.state, "embedding_service", None)
+    if embedding_service is None:
+        raise HTTPException(status_code=503, detail="Modelo de embeddings ainda carregando")
+    return embedding_service
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from routes.respostas import colunas_df, registros, resposta_tabela
 import pandas as pd
 import os
 
@@ -9,7 +9,7 @@ BASE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "sobrepreco")
 BASE_DIR = os.path.abspath(BASE_DIR)
 
 @router.get("/{prefixo}")
-def get_sobrepreco(prefixo: str):
+def get_sobrepreco(prefixo: str, request: Request):
     """
     Lê arquivos CSV gerados pelo sinalizar_sobrepreco.py
     e retorna em JSON para o frontend.
@@ -28,6 +28,11 @@ def get_sobrepreco(prefixo: str):
     resumo = resumo_df.iloc[0].to_dict()
 
     vizinhos_df = pd.read_csv(vizinhos_path)
-    vizinhos = vizinhos_df.to_dict(orient="records")
+    vizinhos = registros(colunas_df(vizinhos_df))
 
-    return JSONResponse(content={"resumo": resumo, "vizinhos": vizinhos})
+    return resposta_tabela(
+        request,
+        vizinhos_df,
+        conteudo={"resumo": resumo, "vizinhos": vizinhos},
+        metadados={"resumo": resumo},
+    )
@@ -1,108 +1,168 @@
-from fastapi import APIRouter
-from fastapi.encoders import jsonable_encoder
-from typing import Optional
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+import asyncio
 import pandas as pd
-from sentence_transformers import SentenceTransformer
+from fastapi import APIRouter, HTTPException, Request
+from routes.respostas import colunas_df, registros, resposta_tabela
+from typing import Optional
+from routes.db_async import fetch_df, transacao_ann, garantir_ef_search
+from routes.cache_respostas import cache_respostas
+from routes.metricas import medir
+from routes.saude import obter_embedding_service
+from routes.pgvector_adapter import vetor_param, ordem_vetorial, distancia_vetorial
+from routes.busca_texto import filtro_texto
+from routes.indice_local import indice_local, USAR_INDICE_LOCAL
 
 router = APIRouter()
 
+COLUNAS_SOBREPRECO = ["idempenho", "ano", "ente", "historico", "vlr_empenhado", "elemdespesatce", "distancia"]
+
 # ======================================================
-# Conexão com banco
+# Vizinhos semânticos (pgvector ou índice local)
 # ======================================================
-load_dotenv()
-DB_USER = os.getenv("POSTGRES_USER")
-DB_PASS = os.getenv("POSTGRES_PASSWORD")
-DB_HOST = os.getenv("POSTGRES_HOST")
-DB_PORT = os.getenv("POSTGRES_PORT")
-DB_NAME = os.getenv("POSTGRES_DB")
+async def _vizinhos_pgvector(embedding_desc, ano, max_dist, limite, cond_texto, params_texto):
+    # emb.ano → só a partição do ano (e o índice ANN dela) é consultada
+    query = f"""
+        SELECT e.idempenho, e.ano, e.ente, e.historico, 
+               e.vlr_empenhado, e.elemdespesatce,
+               {distancia_vetorial("emb.embedding", ":embedding")} AS distancia
+        FROM empenho_embeddings emb
+        JOIN empenhos e USING (idempenho)
+        WHERE emb.ano = :ano
+          {cond_texto}
+          AND {ordem_vetorial("emb.embedding", ":embedding")} <= :max_ip
+        ORDER BY {ordem_vetorial("emb.embedding", ":embedding")}
+        LIMIT :limite
+    """
 
-engine = create_engine(
-    f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
+    # limite pode passar do ef_search padrão: o HNSW devolveria menos linhas
+    async with transacao_ann() as conn:
+        await garantir_ef_search(conn, limite)
+        df = await fetch_df(query, {
+            "embedding": vetor_param(embedding_desc),
+            "ano": ano,
+            # distância cosseno = 1 + (a <#> b) para vetores normalizados
+            "max_ip": max_dist - 1,
+            "limite": limite,
+            **params_texto,
+        }, conn, operacao="sinalizar_sobrepreco")
+    return df
+
+
+async def _vizinhos_indice_local(embedding_desc, ano, max_dist, limite, cond_texto, params_texto):
+    # k-NN no grafo hnswlib do ano; o banco só devolve os dados dos empenhos.
+    # O termo é aplicado depois do k-NN: com termo, podem vir menos de `limite` linhas.
+    with medir("ann_local", "sinalizar_sobrepreco"):
+        ids, distancias = await asyncio.to_thread(indice_local.buscar, embedding_desc, limite, ano)
+    dentro = distancias <= max_dist
+    ids, distancias = [i for i, ok in zip(ids, dentro) if ok], distancias[dentro]
+    if not ids:
+        return pd.DataFrame(columns=COLUNAS_SOBREPRECO)
+
+    query = f"""
+        SELECT e.idempenho, e.ano, e.ente, e.historico,
+               e.vlr_empenhado, e.elemdespesatce
+        FROM empenhos e
+        WHERE e.idempenho = ANY(:ids)
+          {cond_texto}
+    """
+    df = await fetch_df(query, {"ids": ids, **params_texto}, operacao="sinalizar_sobrepreco")
+
+    # mantém a ordem por distância do índice
+    with medir("pandas", "sobrepreco"):
+        df["distancia"] = df["idempenho"].astype(str).map(dict(zip(ids, distancias.tolist())))
+        df = df.sort_values("distancia", kind="stable").reset_index(drop=True)
+    return df
 
-# ======================================================
-# Modelo de embeddings
-# ======================================================
-print("Carregando modelo de embeddings...")
-model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-print("Modelo carregado!")
 
 # ======================================================
 # Função de negócio
 # ======================================================
-def sinalizar_sobrepreco(
+async def sinalizar_sobrepreco(
+    embedding_service,
     ano: int,
     descricao: str,
     max_dist: float = 0.3,
-    limite: int = 500
+    limite: int = 500,
+    termo: Optional[str] = None,
+    modo_texto: Optional[str] = None
 ):
     # gera embedding da descrição
-    embedding_desc = model.encode([descricao])[0].astype("float32").tolist()
+    embedding_desc = await embedding_service.encode_query_async(descricao)
 
-    # monta vetor SQL no formato ARRAY[...]::vector
-    embedding_sql = "ARRAY[" + ",".join(str(x) for x in embedding_desc) + "]::vector"
+    # consulta no banco usando pgvector (vetor enviado como parâmetro binário)
+    # termo opcional: restringe os vizinhos por palavra-chave (índice GIN em historico)
+    cond_texto, params_texto = "", {}
+    if termo:
+        cond_texto, params_texto = filtro_texto(termo, modo_texto)
+        cond_texto = "AND " + cond_texto
 
-    # consulta no banco usando pgvector
-    query = f"""
-        SELECT e.idempenho, e.ano, e.ente, e.historico, 
-               e.vlr_empenhado, e.elemdespesatce,
-               emb.embedding <=> {embedding_sql} AS distancia
-        FROM empenhos e
-        JOIN empenho_embeddings emb USING (idempenho)
-        WHERE e.ano = {ano}
-          AND (emb.embedding <=> {embedding_sql}) <= {max_dist}
-        ORDER BY distancia
-        LIMIT {limite}
-    """
-
-    df = pd.read_sql(query, engine)
+    if USAR_INDICE_LOCAL and indice_local.disponivel(ano):
+        df = await _vizinhos_indice_local(embedding_desc, ano, max_dist, limite, cond_texto, params_texto)
+    else:
+        df = await _vizinhos_pgvector(embedding_desc, ano, max_dist, limite, cond_texto, params_texto)
 
     if df.empty:
-        return {"erro": "Nenhum empenho semelhante encontrado"}, []
+        return {"erro": "Nenhum empenho semelhante encontrado"}, df
 
     # --- estatísticas completas
-    valores = df["vlr_empenhado"].astype(float)
-    q1, q3 = valores.quantile([0.25, 0.75])
-    iqr = q3 - q1
-    limiar = q3 + 1.5 * iqr
-
-    resumo = {
-        "ano": ano,
-        "descricao": descricao,
-        "n_resultados": len(df),
-        "valor_medio": float(valores.mean()),
-        "valor_mediano": float(valores.median()),
-        "valor_min": float(valores.min()),
-        "valor_max": float(valores.max()),
-        "q1": float(q1),
-        "q3": float(q3),
-        "limiar_iqr": float(limiar)
-    }
-
-    return resumo, df.to_dict(orient="records")
+    with medir("pandas", "sobrepreco"):
+        valores = df["vlr_empenhado"].astype(float)
+        q1, q3 = valores.quantile([0.25, 0.75])
+        iqr = q3 - q1
+        limiar = q3 + 1.5 * iqr
+
+        resumo = {
+            "ano": ano,
+            "descricao": descricao,
+            "n_resultados": len(df),
+            "valor_medio": float(valores.mean()),
+            "valor_mediano": float(valores.median()),
+            "valor_min": float(valores.min()),
+            "valor_max": float(valores.max()),
+            "q1": float(q1),
+            "q3": float(q3),
+            "limiar_iqr": float(limiar)
+        }
+
+    return resumo, df
 
 
 # ======================================================
 # Endpoint FastAPI
 # ======================================================
 @router.get("/api/sobrepreco")
-def api_sobrepreco(
+async def api_sobrepreco(
+    request: Request,
     ano: int,
     descricao: str,
     max_dist: float = 0.7,
-    limite: int = 500
+    limite: int = 500,
+    termo: Optional[str] = None,
+    modo_texto: Optional[str] = None
 ):
-    resumo, empenhos = sinalizar_sobrepreco(
-        ano=ano,
-        descricao=descricao,
-        max_dist=max_dist,
-        limite=limite
+    embedding_service = obter_embedding_service(request)
+    if modo_texto not in (None, "trgm", "fts"):
+        raise HTTPException(status_code=400, detail="modo_texto deve ser 'trgm' ou 'fts'")
+
+    # mesma descrição/ano → mesma resposta até a próxima carga de dados
+    resumo, empenhos = await cache_respostas.obter(
+        "sobrepreco",
+        {"ano": ano, "descricao": descricao, "max_dist": max_dist, "limite": limite,
+         "termo": termo, "modo_texto": modo_texto},
+        lambda: sinalizar_sobrepreco(
+            embedding_service,
+            ano=ano,
+            descricao=descricao,
+            max_dist=max_dist,
+            limite=limite,
+            termo=termo,
+            modo_texto=modo_texto
+        ),
     )
 
-    return {
-        "resumo": jsonable_encoder(resumo),
-        "empenhos": jsonable_encoder(empenhos)
-    }
+    # JSON via orjson ou, se pedido, Arrow com o resumo nos metadados do schema
+    return resposta_tabela(
+        request,
+        empenhos,
+        conteudo={"resumo": resumo, "empenhos": registros(colunas_df(empenhos))},
+        metadados={"resumo": resumo},
+    )
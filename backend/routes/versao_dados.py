@@ -0,0 +1,40 @@
+from sqlalchemy import text
+
+# mesma definição de sql/table_versao_dados.sql
+DDL_VERSAO_DADOS = """
+    CREATE TABLE IF NOT EXISTS versao_dados (
+        id            SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        versao        BIGINT NOT NULL DEFAULT 0,
+        origem        TEXT,
+        atualizado_em TIMESTAMP NOT NULL DEFAULT now()
+    );
+    INSERT INTO versao_dados (id, versao, origem)
+    VALUES (1, 0, 'criacao')
+    ON CONFLICT (id) DO NOTHING;
+"""
+
+
+def obter_versao(conn):
+    # leitura barata (uma linha); 0 se a tabela ainda não existir
+    existe = conn.execute(text("SELECT to_regclass('versao_dados')")).scalar()
+    if existe is None:
+        return 0
+    versao = conn.execute(text("SELECT versao FROM versao_dados WHERE id = 1")).scalar()
+    return versao or 0
+
+
+def incrementar_versao(conn, origem):
+    """
+    Marca que os dados mudaram. Deve ser chamado ao fim de cada etapa de
+    carga, dentro de engine.begin().
+    """
+    conn.execute(text(DDL_VERSAO_DADOS))
+    return conn.execute(
+        text("""
+            UPDATE versao_dados
+            SET versao = versao + 1, origem = :origem, atualizado_em = now()
+            WHERE id = 1
+            RETURNING versao
+        """),
+        {"origem": origem},
+    ).scalar()
@@ -1,14 +1,11 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request
 from pydantic import BaseModel
-import random
 import numpy as np
-import pandas as pd
-import yaml
-import os
-from sklearn.preprocessing import StandardScaler
-import json
+from routes.pgvector_adapter import para_numpy
+from routes.respostas import resposta_tabela
 from routes.db_utils import get_embeddings_3d, get_embeddings_3d_within_elem
+from routes.cache_respostas import cache_respostas
+from routes.metricas import medir
 
 
 class typeEmpenho(BaseModel):
@@ -19,62 +16,91 @@ class typeEmpenho(BaseModel):
 
 router = APIRouter()
 
+def _pontos_centroides(df):
+    from sklearn.preprocessing import StandardScaler  # import adiado: sklearn só quando a rota é usada
+
+    # Convert pgvector values to numpy arrays
+    embeds = np.vstack(df['avg_embedding'].apply(para_numpy).to_numpy())
+    scaler = StandardScaler()
+    embeds_scaled = scaler.fit_transform(embeds)
+    n = len(embeds_scaled)
+    # variância de cada grupo (rollup centroides_3d) na escala dos centroides,
+    # com o mesmo fator da visão por elemento; arredondamento pode dar < 0
+    variancias = np.vstack(df['variancia'].apply(para_numpy).to_numpy())
+    variancias = np.clip(variancias, 0, None) / scaler.scale_ ** 2 * 10
+
+    # payload montado coluna a coluna
+    return {
+        "id": [str(i) for i in range(n)],
+        "descricao": [""] * n,
+        "elemdespesatce": df['elemdespesatce'].astype(str).tolist(),
+        "var_x": variancias[:, 0].astype(float),
+        "var_y": variancias[:, 1].astype(float),
+        "var_z": variancias[:, 2].astype(float),
+        "x": embeds_scaled[:, 0].astype(float),
+        "y": embeds_scaled[:, 1].astype(float),
+        "z": embeds_scaled[:, 2].astype(float),
+        "color": ["#e6194b"] * n,
+    }
+
+
+def _pontos_elemento(df):
+    from sklearn.preprocessing import StandardScaler
+
+    embeds = np.vstack(df['embedding_reduced'].apply(para_numpy).to_numpy())
+    embeds_scaled = StandardScaler().fit_transform(embeds)
+    var_X = embeds_scaled[:,0].var()
+    var_Y = embeds_scaled[:,1].var()
+    var_Z = embeds_scaled[:,2].var()
+    n = len(embeds_scaled)
+    
+    return {
+        "id": df['idempenho'].astype(str).tolist(),
+        "descricao": df['historico'].astype(str).tolist(),
+        "elemdespesatce": df['elemdespesatce'].astype(str).tolist(),
+        "credor": df['credor'].astype(str).tolist(),
+        "dt_empenho": df['dtempenho'].astype(str).tolist(),
+        "vlr_empenho": df['vlr_empenho'].astype(str).tolist(),
+        "var_x": [float(var_X)*10] * n,
+        "var_y": [float(var_Y)*10] * n,
+        "var_z": [float(var_Z)*10] * n,
+        "x": embeds_scaled[:, 0].astype(float) * 2,
+        "y": embeds_scaled[:, 1].astype(float) * 2,
+        "z": embeds_scaled[:, 2].astype(float) * 2,
+        "color": ["#e6194b"] * n,
+    }
+
+
+async def montar_dados_3d(elemdespesatce, ente, unidade):
+    # colunas da nuvem de pontos; {} quando não há empenhos
+    if elemdespesatce == "": # return all average empenhos per elemdespesatce
+        df = await get_embeddings_3d(ente, unidade) # elemdespesatce and avg_embedding
+        if df.empty:
+            return {}
+        with medir("pandas", "empenhos-3d"):
+            return _pontos_centroides(df)
+
+    df = await get_embeddings_3d_within_elem(elemdespesatce, ente, unidade)
+    if df.empty:
+        return {}
+    with medir("pandas", "empenhos-3d.elemento"):
+        return _pontos_elemento(df)
+
+
 @router.post("/api/empenhos-3d")
-def get_empenhos_3d(body: typeEmpenho):
+async def get_empenhos_3d(body: typeEmpenho, request: Request):
         
     dados_frontend = body.dict()
     elemdespesatce = dados_frontend['elemdespesatce']
     ente = dados_frontend['ente']
     unidade = dados_frontend['unidade']
-    
-    
-    scaler = StandardScaler()
-    if elemdespesatce == "": # return all average empenhos per elemdespesatce
-        df = get_embeddings_3d(ente, unidade) # elemdespesatce and avg_embedding
-        # Convert string representations of lists to actual lists
-        embeds = np.vstack(df['avg_embedding'].apply(lambda x: json.loads(x) if isinstance(x, str) else x).to_numpy())
-        embeds_scaled = scaler.fit_transform(embeds)
-
-        dados = [
-            {
-                "id": str(i),
-                "descricao": "",
-                "elemdespesatce": f"{df['elemdespesatce'].iloc[i]}",
-                "var_x": 0.0,
-                "var_y": 0.0,
-                "var_z": 0.0,
-                "x": float(embed[0]),
-                "y": float(embed[1]),
-                "z": float(embed[2]),
-                "color": "#e6194b",
-            }
-            for i, embed in enumerate(embeds_scaled)
-        ]
-    else:
-        df = get_embeddings_3d_within_elem(elemdespesatce, ente, unidade)
-        embeds = np.vstack(df['embedding_reduced'].apply(lambda x: json.loads(x) if isinstance(x, str) else x).to_numpy())
-        embeds_scaled = scaler.fit_transform(embeds)
-        var_X = embeds_scaled[:,0].var()
-        var_Y = embeds_scaled[:,1].var()
-        var_Z = embeds_scaled[:,2].var()
-        
-        dados = [
-            {
-                "id": f"{df.iloc[i]['idempenho']}",
-                "descricao": f"{df.iloc[i]['historico']}",
-                "elemdespesatce": f"{df.iloc[i]['elemdespesatce']}",
-                "credor": f"{df.iloc[i]['credor']}",
-                "dt_empenho": f"{df.iloc[i]['dtempenho']}",
-                "vlr_empenho": f"{df.iloc[i]['vlr_empenho']}",
-                "var_x": float(var_X)*10,
-                "var_y": float(var_Y)*10,
-                "var_z": float(var_Z)*10,
-                "x": float(embed[0])*2,
-                "y": float(embed[1])*2,
-                "z": float(embed[2])*2,
-                "color": "#e6194b"
-            }
-            for i, embed in enumerate(embeds_scaled)
-        ]
-
-    return JSONResponse(content=dados)
+
+    dados = await cache_respostas.obter(
+        "empenhos-3d",
+        {"elemdespesatce": elemdespesatce, "ente": ente, "unidade": unidade},
+        lambda: montar_dados_3d(elemdespesatce, ente, unidade),
+    )
+    if not dados:
+        return resposta_tabela(request, {}, conteudo=[])
+
+    return resposta_tabela(request, dados)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# testes rodam a partir de backend/ (imports "routes.*", como a API)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# routes.db e routes.db_async leem as credenciais no import; nenhum teste abre conexão
+for variavel, valor in {
+    "POSTGRES_USER": "nemesis",
+    "POSTGRES_PASSWORD": "nemesis",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "empenhos",
+}.items():
+    os.environ.setdefault(variavel, valor)
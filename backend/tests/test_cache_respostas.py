@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+import routes.cache_respostas as cache_mod
+from routes.cache_respostas import BackendMemoria, CacheRespostas
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    r = Relogio()
+    monkeypatch.setattr(cache_mod.time, "monotonic", r)
+    return r
+
+
+@pytest.fixture
+def versao(monkeypatch):
+    atual = {"v": 1}
+
+    async def versao_dados_atual():
+        return atual["v"]
+
+    monkeypatch.setattr(cache_mod, "versao_dados_atual", versao_dados_atual)
+    return atual
+
+
+def test_memoria_expira_pelo_ttl(relogio):
+    async def cenario():
+        backend = BackendMemoria(max_size=10, ttl_seconds=60)
+        await backend.set("a", 1)
+        relogio.agora += 59
+        assert await backend.get("a") == 1
+        relogio.agora += 2
+        assert await backend.get("a") is None
+        assert await backend.tamanho() == 0
+
+    asyncio.run(cenario())
+
+
+def test_memoria_descarta_o_menos_usado(relogio):
+    async def cenario():
+        backend = BackendMemoria(max_size=2, ttl_seconds=60)
+        await backend.set("a", 1)
+        await backend.set("b", 2)
+        await backend.get("a")          # "b" passa a ser o menos usado
+        await backend.set("c", 3)
+        assert await backend.get("b") is None
+        assert await backend.get("a") == 1 and await backend.get("c") == 3
+        await backend.clear()
+        assert await backend.tamanho() == 0
+
+    asyncio.run(cenario())
+
+
+def test_chave_muda_com_versao_dados(relogio, versao):
+    async def cenario():
+        cache = CacheRespostas(BackendMemoria())
+        chamadas = []
+
+        async def produzir():
+            chamadas.append(1)
+            return len(chamadas)
+
+        assert await cache.obter("rota", {"ente": "Rio"}, produzir) == 1
+        # parâmetros normalizados: mesma entrada
+        assert await cache.obter("rota", {"ente": "  Rio "}, produzir) == 1
+        versao["v"] = 2
+        assert await cache.obter("rota", {"ente": "Rio"}, produzir) == 2
+
+    asyncio.run(cenario())
+
+
+def test_single_flight_e_cancelamento_do_lider(versao):
+    async def cenario():
+        cache = CacheRespostas(BackendMemoria())
+        chamadas = []
+
+        async def produzir():
+            chamadas.append(1)
+            await asyncio.sleep(0.05)
+            return len(chamadas)
+
+        lider = asyncio.create_task(cache.obter("rota", {}, produzir))
+        await asyncio.sleep(0.01)
+        seguidores = [asyncio.create_task(cache.obter("rota", {}, produzir)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        lider.cancel()
+
+        # um seguidor assume a consulta; os demais esperam por ele
+        assert await asyncio.gather(*seguidores) == [2, 2, 2]
+        assert len(chamadas) == 2
+        with pytest.raises(asyncio.CancelledError):
+            await lider
+
+    asyncio.run(cenario())
+
+
+def test_excecao_nao_fica_em_cache(versao):
+    async def cenario():
+        cache = CacheRespostas(BackendMemoria())
+
+        async def falha():
+            raise ValueError("falhou")
+
+        async def ok():
+            return "ok"
+
+        with pytest.raises(ValueError):
+            await cache.obter("rota", {}, falha)
+        assert await cache.obter("rota", {}, ok) == "ok"
+
+    asyncio.run(cenario())
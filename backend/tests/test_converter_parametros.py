@@ -0,0 +1,23 @@
+from routes.db_async import converter_parametros
+
+
+def test_parametros_em_ordem_de_aparicao():
+    sql, args = converter_parametros("SELECT * FROM t WHERE a = :a AND b = :b", {"b": 2, "a": 1})
+    assert sql == "SELECT * FROM t WHERE a = $1 AND b = $2"
+    assert args == [1, 2]
+
+
+def test_parametro_repetido_usa_o_mesmo_indice():
+    sql, args = converter_parametros("WHERE x > :v OR y < :v AND z = :w", {"v": 5, "w": 6})
+    assert sql == "WHERE x > $1 OR y < $1 AND z = $2"
+    assert args == [5, 6]
+
+
+def test_casts_nao_viram_parametros():
+    sql, args = converter_parametros("SELECT :d::float8, CAST(:id AS varchar), x::text", {"d": 0.5, "id": "7"})
+    assert sql == "SELECT $1::float8, CAST($2 AS varchar), x::text"
+    assert args == [0.5, "7"]
+
+
+def test_sem_parametros():
+    assert converter_parametros("SELECT 1") == ("SELECT 1", [])
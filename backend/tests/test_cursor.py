@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from routes.db_utils import codificar_cursor, decodificar_cursor, validar_chave, montar_consulta_keyset
+
+
+@pytest.mark.parametrize("chave", [["000123"], [0.125, "000123", 400], [0.5, "x"]])
+def test_ida_e_volta(chave):
+    assert decodificar_cursor(codificar_cursor(chave)) == chave
+
+
+def test_cursor_vazio():
+    assert decodificar_cursor(None) is None
+    assert decodificar_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["não é base64!", codificar_cursor({"a": 1}), codificar_cursor([]),
+                                    codificar_cursor([1, 2, 3, 4])])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError):
+        decodificar_cursor(cursor)
+
+
+@pytest.mark.parametrize("chave, com_historico", [
+    (["000123"], True),
+    ([0.1, "x"], False),
+    (["0.1", "x"], True),
+    ([0.1, "x", "400"], True),
+])
+def test_chave_incompativel_com_a_consulta(chave, com_historico):
+    with pytest.raises(ValueError):
+        validar_chave(chave, com_historico)
+
+
+def test_keyset_com_historico_pagina_dentro_do_indice():
+    vetor = np.full(384, 1 / np.sqrt(384), dtype=np.float32)
+    query, params = montar_consulta_keyset(vetor, "", "", "", "", [0.2, "000123", 400])
+    assert "LIMIT :n_candidatos" in query
+    assert "(c.distance, e.idempenho) >" in query
+    assert params["apos_dist"] == 0.2 and params["apos_id"] == "000123"
+
+
+def test_keyset_stream_ordenacao_exata():
+    vetor = np.full(384, 1 / np.sqrt(384), dtype=np.float32)
+    query, _ = montar_consulta_keyset(vetor, "", "", "", "", None, por_indice=False)
+    assert "n_candidatos" not in query
+    assert "ORDER BY distance, e.idempenho" in query
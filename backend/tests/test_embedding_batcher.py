@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from routes.embedding_batcher import EmbeddingBatcher
+
+
+def test_textos_repetidos_codificados_uma_vez():
+    lotes = []
+
+    def encode(textos):
+        lotes.append(list(textos))
+        return [len(t) for t in textos]
+
+    batcher = EmbeddingBatcher(encode, max_batch_size=8, max_wait_ms=50)
+    futuros = [batcher.submit(t) for t in ["a", "bb", "a"]]
+    assert [f.result(timeout=5) for f in futuros] == [1, 2, 1]
+    assert sum(len(lote) for lote in lotes) == 2
+    batcher.close()
+
+
+def test_encode_depois_do_close_falha_na_hora():
+    batcher = EmbeddingBatcher(lambda textos: [0] * len(textos))
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.encode("texto")
+
+
+def test_close_falha_os_pendentes():
+    comecou, liberar = threading.Event(), threading.Event()
+
+    def encode(textos):
+        comecou.set()
+        liberar.wait(5)
+        return [0] * len(textos)
+
+    batcher = EmbeddingBatcher(encode, max_batch_size=1, max_wait_ms=1)
+    batcher._thread.join = lambda timeout=None: None   # close não espera o lote em andamento
+    primeiro = batcher.submit("em andamento")
+    comecou.wait(5)
+    pendente = batcher.submit("na fila")
+    batcher.close()
+    assert isinstance(pendente.exception(timeout=1), RuntimeError)
+    liberar.set()
+    assert primeiro.result(timeout=5) == 0
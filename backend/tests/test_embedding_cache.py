@@ -0,0 +1,36 @@
+import numpy as np
+
+import routes.embedding_cache as cache_mod
+from routes.embedding_cache import EmbeddingCache
+
+
+def test_hit_nao_chama_o_modelo():
+    cache = EmbeddingCache(max_size=10, ttl_seconds=60)
+    chamadas = []
+
+    def encode(texto):
+        chamadas.append(texto)
+        return np.ones(3, dtype=np.float32)
+
+    cache.get_or_compute("material  de consumo", "modelo", encode)
+    cache.get_or_compute("material de consumo", "modelo", encode)
+    assert chamadas == ["material de consumo"]
+    # outro modelo, outra chave
+    cache.get_or_compute("material de consumo", "outro", encode)
+    assert len(chamadas) == 2
+
+
+def test_expira_e_descarta_o_menos_usado(monkeypatch):
+    agora = [0.0]
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: agora[0])
+    cache = EmbeddingCache(max_size=2, ttl_seconds=10)
+
+    cache.put("a", "m", 1)
+    cache.put("b", "m", 2)
+    assert cache.get("a", "m") == 1     # "b" passa a ser o menos usado
+    cache.put("c", "m", 3)
+    assert cache.get("b", "m") is None
+
+    agora[0] = 11
+    assert cache.get("a", "m") is None
+    assert cache.get("c", "m") is None
@@ -0,0 +1,87 @@
+import random
+from collections import Counter
+
+import pytest
+
+from routes.fuzzy_index import IndiceFuzzy
+
+
+# matcher original de auto_filling.py (Counter por candidato, a cada requisição)
+def contar_forca_bruta(texto):
+    return Counter(c.lower() for c in texto if c != ' ')
+
+
+def score_forca_bruta(a, b):
+    todos = set(a) | set(b)
+    soma_min = sum(min(a.get(c, 0), b.get(c, 0)) for c in todos)
+    soma_max = sum(max(a.get(c, 0), b.get(c, 0)) for c in todos)
+    return soma_min / soma_max if soma_max > 0 else 0
+
+
+def top_k_forca_bruta(titulos, consulta, k):
+    q = contar_forca_bruta(consulta)
+    scores = [(t, score_forca_bruta(contar_forca_bruta(t), q)) for t in titulos]
+    # sorted é estável: empates na ordem original, como DataFrame.nlargest
+    return sorted(scores, key=lambda par: -par[1])[:k]
+
+
+TITULOS = [
+    "MATERIAL DE CONSUMO",
+    "Material de Consumo",
+    "OUTROS SERVIÇOS DE TERCEIROS - PESSOA JURÍDICA",
+    "Serviços de Consultoria",
+    "EQUIPAMENTOS E MATERIAL PERMANENTE",
+    "OBRAS E INSTALAÇÕES",
+    "Diárias - Civil",
+    "",
+    "aaaa",
+    "a a a a",
+]
+
+
+def titulos_aleatorios(n, semente=0):
+    rng = random.Random(semente)
+    alfabeto = "abcdeçãé ABCDE0123"
+    return ["".join(rng.choice(alfabeto) for _ in range(rng.randint(0, 30))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("consulta", ["material", "MATERIAL DE", "serviços", "xyz", "", "a", "ção 2023"])
+def test_scores_iguais_forca_bruta(consulta):
+    indice = IndiceFuzzy(TITULOS)
+    q = contar_forca_bruta(consulta)
+    esperado = [score_forca_bruta(contar_forca_bruta(t), q) for t in TITULOS]
+    assert indice.scores(consulta) == pytest.approx(esperado)
+
+
+@pytest.mark.parametrize("k", [1, 3, 5, 50])
+def test_top_k_igual_forca_bruta(k):
+    titulos = titulos_aleatorios(500)
+    indice = IndiceFuzzy(titulos)
+    for consulta in ["abc", "ÇÃO", "a a", "0123", "eeee"]:
+        obtido = indice.top_k(consulta, k)
+        esperado = top_k_forca_bruta(titulos, consulta, k)
+        assert [t for t, _ in obtido] == [t for t, _ in esperado]
+        assert [s for _, s in obtido] == pytest.approx([s for _, s in esperado])
+
+
+def test_top_k_com_linhas():
+    titulos = titulos_aleatorios(200, semente=1)
+    indice = IndiceFuzzy(titulos)
+    linhas = list(range(0, 200, 3))
+    subconjunto = [titulos[i] for i in linhas]
+    obtido = indice.top_k("abcde", 5, linhas=linhas)
+    esperado = top_k_forca_bruta(subconjunto, "abcde", 5)
+    assert [t for t, _ in obtido] == [t for t, _ in esperado]
+
+
+def test_contagens_acima_de_uint8():
+    titulos = ["a" * 300, "a" * 10, "b"]
+    indice = IndiceFuzzy(titulos)
+    obtido = indice.top_k("a" * 300, 3)
+    esperado = top_k_forca_bruta(titulos, "a" * 300, 3)
+    assert [t for t, _ in obtido] == [t for t, _ in esperado]
+    assert [s for _, s in obtido] == pytest.approx([s for _, s in esperado])
+
+
+def test_indice_vazio():
+    assert IndiceFuzzy([]).top_k("qualquer", 5) == []
@@ -15,3 +15,20 @@ CREATE TABLE IF NOT EXISTS clusters_fracionamento (
     historico        TEXT,
     data_processamento TIMESTAMP DEFAULT now()
 );
+
+-- Índice usado por /api/fracionamentos (filtro por ano, jurisdicionado e cluster)
+CREATE INDEX IF NOT EXISTS idx_clusters_fracionamento_ano_unid_cluster
+    ON clusters_fracionamento (ano, idunid, cluster_id);
+
+-- Resumo por cluster (uma linha por cluster), reconstruído por ano
+-- ao final de sinalizar_fracionamento.py
+CREATE TABLE IF NOT EXISTS resumo_clusters_fracionamento (
+    ano           INT,
+    idunid        BIGINT,
+    cluster_id    BIGINT,
+    cluster_size  INT,
+    min_sim       FLOAT,
+    max_sim       FLOAT,
+    valor         NUMERIC(18,2),
+    PRIMARY KEY (ano, idunid, cluster_id)
+);
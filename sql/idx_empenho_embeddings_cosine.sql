@@ -1,8 +1,32 @@
 -- Índice ANN baseado em cosine similarity
+--
+-- Os vetores são gravados normalizados (norma 1) em halfvec: o cosseno é
+-- calculado como produto interno (<#>), daí o operador halfvec_ip_ops
+-- (vector_ip_ops se armazenamento_embeddings.tipo = 'vector').
+--
+-- Com empenho_embeddings particionada por ano (sql/table_empenho_embeddings.sql)
+-- o índice criado na tabela-mãe vira um índice por partição. Partições novas
+-- são preenchidas aos poucos por generate_embeddings.py: por isso o padrão é
+-- HNSW, já que o ivfflat calcula as listas na criação e perde recall em
+-- partições criadas vazias.
+--
+-- Para escolher entre ivfflat e HNSW e calibrar lists/probes/ef_search na
+-- base real, rode (a partir de backend/):
+--   python benchmark_ann.py --fonte banco --amostra 200000
+-- e copie probes/ef_search recomendados para busca_vetorial no config.yaml
+-- (aplicados por consulta com SET LOCAL nas rotas).
 CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_cosine
 ON empenho_embeddings
-USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+USING hnsw (embedding halfvec_ip_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Alternativa ivfflat (construção rápida; recriar após grandes cargas).
+-- lists deve acompanhar o tamanho de cada partição (pgvector: linhas/1000
+-- até 1M linhas, √linhas acima disso):
+-- CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_cosine
+-- ON empenho_embeddings
+-- USING ivfflat (embedding halfvec_ip_ops)
+-- WITH (lists = 100);
 
 -- Atualiza estatísticas
 ANALYZE empenho_embeddings;
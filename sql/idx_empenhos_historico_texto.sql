@@ -0,0 +1,29 @@
+-- ==================================================
+-- Busca textual indexada em empenhos.historico
+--
+-- Substitui os filtros historico ILIKE '%termo%' (varredura sequencial) por:
+--   * pg_trgm + GIN: acelera o próprio ILIKE '%termo%' (mesma semântica)
+--   * full-text em português: coluna tsvector gerada + GIN, para
+--     historico_tsv @@ websearch_to_tsquery('portuguese', 'termo')
+--
+-- load_empenhos.py aplica este mesmo DDL ao fim de cada carga
+-- (ver routes/busca_texto.py). Como a coluna é gerada, inserções
+-- posteriores já chegam indexadas.
+--
+-- Como rodar esse script
+-- psql -h localhost -U nemesis -d empenhos -f sql/idx_empenhos_historico_texto.sql
+-- ==================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE empenhos
+ADD COLUMN IF NOT EXISTS historico_tsv tsvector
+GENERATED ALWAYS AS (to_tsvector('portuguese', coalesce(historico, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_empenhos_historico_tsv
+ON empenhos USING gin (historico_tsv);
+
+CREATE INDEX IF NOT EXISTS idx_empenhos_historico_trgm
+ON empenhos USING gin (historico gin_trgm_ops);
+
+ANALYZE empenhos;
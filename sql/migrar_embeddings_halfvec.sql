@@ -0,0 +1,42 @@
+-- ==================================================
+-- Migração: uma cópia normalizada de cada embedding
+--
+-- Antes cada vetor existia três vezes: embedding vector(384) e
+-- embedding_array float4[] em empenho_embeddings, e de novo na view
+-- materializada empenhos_por_ano. Depois desta migração fica só
+-- empenho_embeddings.embedding, normalizado (norma 1) e em halfvec:
+-- o cosseno vira produto interno (<#>) e o índice usa halfvec_ip_ops.
+--
+-- Requer pgvector >= 0.7 (halfvec e l2_normalize). Para manter float32,
+-- troque halfvec por vector e use armazenamento_embeddings.tipo = 'vector'
+-- no config.yaml.
+--
+-- Como rodar esse script
+-- psql -h localhost -U nemesis -d empenhos -f sql/migrar_embeddings_halfvec.sql
+-- e depois recrie a view (sem colunas de embedding):
+-- psql -h localhost -U nemesis -d empenhos -f sql/view_empenhos_por_ano.sql
+-- ==================================================
+
+BEGIN;
+
+-- a view depende de embedding/embedding_array
+DROP MATERIALIZED VIEW IF EXISTS empenhos_por_ano;
+DROP INDEX IF EXISTS idx_empenho_embeddings_cosine;
+
+-- reescreve a tabela (todas as partições) uma vez: normaliza, converte
+-- para float16 e descarta a cópia float4[]
+ALTER TABLE empenho_embeddings
+    DROP COLUMN embedding_array,
+    ALTER COLUMN embedding TYPE halfvec(384)
+        USING l2_normalize(embedding)::halfvec(384);
+
+COMMIT;
+
+SET maintenance_work_mem = '1GB';
+
+CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_cosine
+ON empenho_embeddings
+USING hnsw (embedding halfvec_ip_ops)
+WITH (m = 16, ef_construction = 64);
+
+ANALYZE empenho_embeddings;
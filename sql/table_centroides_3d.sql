@@ -0,0 +1,55 @@
+-- ==================================================
+-- Tabela centroides_3d
+--
+-- Rollup por (ente, unidade, elemdespesatce) das projeções 3D
+-- (empenho_embeddings.embedding_reduced), usado pela visão geral de
+-- /api/empenhos-3d. Guarda somas e somas de quadrados para permitir
+-- atualização incremental: centroide = soma / n e
+-- variância = soma_quadrados / n - centroide^2.
+--
+-- ente/unidade/elemdespesatce nulos são gravados como '': a restrição de
+-- unicidade funciona em qualquer versão do PostgreSQL, sem depender de
+-- UNIQUE NULLS NOT DISTINCT (15+).
+--
+-- generate_embeddings.py atualiza a tabela a cada lote inserido; este
+-- script faz a reconstrução completa.
+--
+-- Como rodar esse script
+-- psql -h localhost -U nemesis -d empenhos -f sql/table_centroides_3d.sql
+-- ==================================================
+
+CREATE TABLE IF NOT EXISTS centroides_3d (
+    ente            TEXT NOT NULL,
+    unidade         TEXT NOT NULL,
+    elemdespesatce  TEXT NOT NULL,
+    n               BIGINT NOT NULL,
+    soma_x          DOUBLE PRECISION NOT NULL,
+    soma_y          DOUBLE PRECISION NOT NULL,
+    soma_z          DOUBLE PRECISION NOT NULL,
+    soma_xx         DOUBLE PRECISION NOT NULL,
+    soma_yy         DOUBLE PRECISION NOT NULL,
+    soma_zz         DOUBLE PRECISION NOT NULL,
+    CONSTRAINT uq_centroides_3d UNIQUE (ente, unidade, elemdespesatce)
+);
+
+-- Reconstrução completa
+TRUNCATE centroides_3d;
+
+-- tabelas criadas pela versão anterior (colunas anuláveis)
+ALTER TABLE centroides_3d
+    ALTER COLUMN ente SET NOT NULL,
+    ALTER COLUMN unidade SET NOT NULL,
+    ALTER COLUMN elemdespesatce SET NOT NULL;
+
+INSERT INTO centroides_3d (ente, unidade, elemdespesatce, n,
+                           soma_x, soma_y, soma_z, soma_xx, soma_yy, soma_zz)
+SELECT COALESCE(e.ente, ''), COALESCE(e.unidade, ''), COALESCE(e.elemdespesatce, ''), COUNT(*),
+       SUM(p[1]), SUM(p[2]), SUM(p[3]),
+       SUM(p[1] * p[1]), SUM(p[2] * p[2]), SUM(p[3] * p[3])
+FROM empenho_embeddings ee
+JOIN empenhos e ON e.idempenho = ee.idempenho
+CROSS JOIN LATERAL (SELECT ee.embedding_reduced::real[]::float8[] AS p) proj
+WHERE ee.embedding_reduced IS NOT NULL
+GROUP BY 1, 2, 3;
+
+ANALYZE centroides_3d;
@@ -0,0 +1,48 @@
+-- ==================================================
+-- Embeddings endereçados por conteúdo
+--
+-- Muitos historicos se repetem (folha, fornecimentos recorrentes, textos
+-- padrão). generate_embeddings.py normaliza cada historico (regras em
+-- deduplicacao_textos no config.yaml), calcula a chave (hash) e só codifica
+-- textos cuja chave ainda não está em embeddings_texto. Cada linha de
+-- empenho_embeddings guarda a chave do seu texto em chave_texto.
+--
+-- embeddings_texto não guarda vetores: cada chave aponta para o empenho
+-- (ano, idempenho) cujo embedding é reaproveitado pelos demais textos iguais.
+-- O vetor fica só em empenho_embeddings.embedding, uma vez por empenho.
+--
+-- O modelo faz parte da chave primária: ao trocar de modelo, só os textos
+-- únicos são recodificados.
+--
+-- Mesma definição em routes/embeddings_texto.py (criada automaticamente por
+-- generate_embeddings.py). Linhas antigas de empenho_embeddings ficam com
+-- chave_texto nula.
+--
+-- Bases com a versão anterior (coluna embedding em embeddings_texto): apague
+-- a tabela antes (DROP TABLE embeddings_texto;). Ela é só um índice de
+-- reaproveitamento; os textos já vistos são recodificados uma vez.
+--
+-- Como rodar esse script
+-- psql -h localhost -U nemesis -d empenhos -f sql/table_embeddings_texto.sql
+-- ==================================================
+
+CREATE TABLE IF NOT EXISTS embeddings_texto (
+    modelo     text NOT NULL,
+    chave      char(32) NOT NULL,
+    -- empenho cujo vetor representa a chave (primeiro texto codificado)
+    ano        integer NOT NULL,
+    idempenho  varchar NOT NULL,
+    texto      text,
+    criado_em  timestamp NOT NULL DEFAULT now(),
+    PRIMARY KEY (modelo, chave)
+);
+
+ALTER TABLE empenho_embeddings
+ADD COLUMN IF NOT EXISTS chave_texto char(32);
+
+CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_chave_texto
+ON empenho_embeddings (chave_texto);
+
+-- Quanto a deduplicação economiza:
+-- SELECT count(*) AS empenhos, count(DISTINCT chave_texto) AS textos_unicos
+-- FROM empenho_embeddings WHERE chave_texto IS NOT NULL;
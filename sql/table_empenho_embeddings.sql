@@ -0,0 +1,77 @@
+-- ==================================================
+-- Tabela empenho_embeddings particionada por ano
+--
+-- ano e ente ficam junto do vetor. A tabela é particionada por LIST (ano),
+-- cada partição com seu próprio índice HNSW (herdado da tabela-mãe). Uma
+-- consulta com emb.ano = :ano só percorre a partição e o índice daquele ano.
+--
+-- Cada vetor é guardado uma única vez, normalizado (norma 1) e em halfvec
+-- (float16): o cosseno vira produto interno (<#>, índice halfvec_ip_ops).
+-- Com armazenamento_embeddings.tipo = 'vector' no config.yaml, troque
+-- halfvec por vector neste script.
+--
+-- generate_embeddings.py cria a tabela e as partições novas (mesma definição
+-- em routes/db_utils.py). Este script migra uma base existente com a tabela
+-- antiga (sem partições): copia os vetores com ano/ente vindos de empenhos.
+-- Bases já particionadas, com embedding vector + embedding_array: use
+-- sql/migrar_embeddings_halfvec.sql.
+--
+-- Como rodar esse script
+-- psql -h localhost -U nemesis -d empenhos -f sql/table_empenho_embeddings.sql
+-- ==================================================
+
+BEGIN;
+
+ALTER TABLE empenho_embeddings RENAME TO empenho_embeddings_antiga;
+ALTER INDEX IF EXISTS idx_empenho_embeddings_cosine RENAME TO idx_empenho_embeddings_antiga_cosine;
+
+CREATE TABLE empenho_embeddings (
+    idempenho         varchar NOT NULL,
+    ano               integer NOT NULL,
+    ente              text,
+    embedding         halfvec(384),
+    embedding_reduced vector(3),
+    -- marca d'água da atualização incremental do índice local (routes/indice_local.py)
+    criado_em         timestamp NOT NULL DEFAULT now(),
+    PRIMARY KEY (ano, idempenho)
+) PARTITION BY LIST (ano);
+
+-- uma partição por ano presente em empenhos (0 = ano desconhecido)
+DO $$
+DECLARE
+    a integer;
+BEGIN
+    FOR a IN SELECT DISTINCT COALESCE(ano, 0) FROM empenhos LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS empenho_embeddings_%s PARTITION OF empenho_embeddings FOR VALUES IN (%s)',
+            a, a
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO empenho_embeddings (idempenho, ano, ente, embedding, embedding_reduced)
+SELECT ant.idempenho, COALESCE(e.ano, 0), e.ente, l2_normalize(ant.embedding)::halfvec(384), ant.embedding_reduced
+FROM empenho_embeddings_antiga ant
+JOIN empenhos e ON e.idempenho = ant.idempenho;
+
+COMMIT;
+
+-- Índices criados depois da carga (mais rápido que manter durante o INSERT).
+-- O índice da tabela-mãe gera um índice HNSW por partição.
+SET maintenance_work_mem = '1GB';
+
+CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_cosine
+ON empenho_embeddings
+USING hnsw (embedding halfvec_ip_ops)
+WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_idempenho
+ON empenho_embeddings (idempenho);
+
+CREATE INDEX IF NOT EXISTS idx_empenho_embeddings_criado_em
+ON empenho_embeddings (criado_em);
+
+ANALYZE empenho_embeddings;
+
+-- Conferida a migração:
+-- DROP TABLE empenho_embeddings_antiga;
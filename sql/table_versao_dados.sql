@@ -0,0 +1,22 @@
+-- ==================================================
+-- Tabela versao_dados
+--
+-- Carimbo de versão dos dados, incrementado por cada etapa de carga
+-- (load_empenhos.py, generate_embeddings.py, sinalizar_fracionamento.py,
+-- refresh de views). A API consulta só esta linha para saber se precisa
+-- recarregar catálogos/caches em memória.
+--
+-- Como rodar esse script
+-- psql -h localhost -U nemesis -d empenhos -f sql/table_versao_dados.sql
+-- ==================================================
+
+CREATE TABLE IF NOT EXISTS versao_dados (
+    id            SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    versao        BIGINT NOT NULL DEFAULT 0,
+    origem        TEXT,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT now()
+);
+
+INSERT INTO versao_dados (id, versao, origem)
+VALUES (1, 0, 'criacao')
+ON CONFLICT (id) DO NOTHING;
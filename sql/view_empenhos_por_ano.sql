@@ -1,6 +1,7 @@
 -- ==================================================
 -- Criação de view materializada empenhos_por_ano
--- Integrando embeddings diretamente
+-- Os embeddings ficam só em empenho_embeddings (uma cópia de cada vetor):
+-- quem precisa do vetor faz JOIN por (ano, idempenho).
 --
 -- Como rodar esse script
 -- psql -h localhost -U nemesis -d empenhos -f sql/create_view_empenhos_por_ano.sql
@@ -13,7 +14,7 @@
 -- 1. Remove view materializada anterior
 DROP MATERIALIZED VIEW IF EXISTS empenhos_por_ano;
 
--- 2. Cria a nova view materializada, já unindo empenhos + embeddings
+-- 2. Cria a nova view materializada
 CREATE MATERIALIZED VIEW empenhos_por_ano AS
 SELECT 
     e.ano,
@@ -29,12 +30,8 @@ SELECT
     e.dtempenho,
     e.historico,
     e.nrlicitacao,
-    e.idcontrato,
-    emb.embedding,
-    emb.embedding_array
-FROM empenhos e
-LEFT JOIN empenho_embeddings emb
-    ON e.idempenho = emb.idempenho;
+    e.idcontrato
+FROM empenhos e;
 
 -- ==================================================
 -- Índices para otimização
@@ -66,3 +63,19 @@ ANALYZE empenhos_por_ano;
 ANALYZE empenho_embeddings;
 
 
+
+-- ==================================================
+-- Sinaliza para a API que os dados mudaram
+-- (mesma tabela de sql/table_versao_dados.sql, criada aqui se ainda não existir)
+-- ==================================================
+CREATE TABLE IF NOT EXISTS versao_dados (
+    id            SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    versao        BIGINT NOT NULL DEFAULT 0,
+    origem        TEXT,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT now()
+);
+
+INSERT INTO versao_dados (id, versao, origem)
+VALUES (1, 1, 'view_empenhos_por_ano')
+ON CONFLICT (id) DO UPDATE
+SET versao = versao_dados.versao + 1, origem = EXCLUDED.origem, atualizado_em = now();